@@ -139,6 +139,47 @@ DATABASES = {
 }
 
 
+# -------------------------------------------------------------------
+# CACHE
+# -------------------------------------------------------------------
+# "catalogue" : réponses des endpoints catalogue (gui/cache_catalogue.py).
+# Cache fichier par défaut pour qu'il soit partagé entre les workers ;
+# remplaçable par Redis/Memcached sans toucher au code.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalogue": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "catalogue",
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+CATALOGUE_CACHE_ALIAS = "catalogue"
+
+# Instantané précompressé de /api/chants/?all=1 (gui/instantane.py),
+# reconstruit en tâche de fond à chaque nouvelle version du catalogue.
+# La variante .br n'est produite que si le paquet "brotli" est installé.
+CATALOGUE_INSTANTANE_DIR = BASE_DIR / "cache" / "instantanes"
+CATALOGUE_INSTANTANE_ASYNC = True
+# Notes et pseudos (écritures fréquentes) ne reconstruisent pas l'instantané
+# à chaque fois : il les reprend au plus tard après ce délai (secondes).
+CATALOGUE_INSTANTANE_RETARD_MAX = 300
+
+# Bundles hors ligne (gui/bundle.py, /api/export/bundle/), construits en
+# tâche de fond à chaque nouvelle version de l'instantané
+CATALOGUE_BUNDLE_DIR = BASE_DIR / "cache" / "bundles"
+CATALOGUE_BUNDLE_ASYNC = True
+
+# Chants supprimés signalés à la synchronisation (/api/chants/changes/) :
+# gardés ce nombre de jours puis purgés par la commande
+# purger_chants_supprimes (à lancer chaque nuit). Un client dont le jeton
+# est plus ancien reçoit une 410 et resynchronise tout.
+SYNC_SUPPRESSIONS_RETENTION_JOURS = 90
+
+
 # -------------------------------------------------------------------
 # PASSWORD VALIDATION
 # -------------------------------------------------------------------
@@ -182,7 +223,41 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
-# Autorise des uploads jusqu'à 1000 Mo (1 Go) pour les fichiers volumineux
+# Médias adressés par contenu (SHA-256) et dédupliqués : voir gui/stockage.py
+STORAGES = {
+    "default": {"BACKEND": "gui.stockage.StockageDedup"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Emplacement interne nginx des médias (location internal de nginx.conf).
+# X-Accel-Redirect n'est utilisé que si nginx annonce "X-Media-Accel: 1" ;
+# sinon (runserver seul) gui/medias.py sert le fichier lui-même.
+MEDIA_X_ACCEL_PREFIX = "/_medias/"
+
+# Déclinaisons WebP/JPEG des illustrations (gui/images.py), générées en
+# tâche de fond après l'enregistrement
+IMAGES_DERIVES_ASYNC = True
+
+# Durée, débit... des MP3 (gui/audio.py), lus en tâche de fond après l'envoi
+AUDIO_ANALYSE_ASYNC = True
+
+# Pages, format et aperçu des PDF (gui/documents.py), en tâche de fond.
+# L'aperçu utilise PyMuPDF ou, à défaut, pdftoppm (poppler-utils).
+PDF_ANALYSE_ASYNC = True
+
+# Taille maximale d'un fichier envoyé (1000 Mo), par blocs via /api/uploads/
 UPLOAD_MAX_SIZE = 1000 * 1024 * 1024
-DATA_UPLOAD_MAX_MEMORY_SIZE = UPLOAD_MAX_SIZE
-FILE_UPLOAD_MAX_MEMORY_SIZE = UPLOAD_MAX_SIZE
+# Corps de requête hors fichiers (JSON, champs de formulaire) gardé en mémoire
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+# Au-delà, un fichier de formulaire est écrit dans un fichier temporaire
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)
+
+# Envois par blocs reprenables (gui/televersements.py). Un bloc doit passer
+# sous client_max_body_size de nginx.conf (50 Mo).
+TELEVERSEMENTS_DIR = BASE_DIR / "cache" / "televersements"
+TELEVERSEMENT_BLOC_MAX = 16 * 1024 * 1024
+
+# Nettoyage des médias orphelins (commande nettoyer_medias, à lancer
+# périodiquement) : un fichier non référencé n'est effacé qu'après ce délai,
+# tout comme un envoi par blocs resté inactif.
+MEDIAS_ORPHELINS_DELAI_HEURES = 24
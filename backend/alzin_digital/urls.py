@@ -17,13 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 
-from gui.views import api_root
+from gui.views import api_root, media_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("", api_root),
     path("api/", include("gui.urls")),
-
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path(settings.MEDIA_URL.lstrip("/") + "<path:chemin>", media_view),
+]
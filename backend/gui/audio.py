@@ -0,0 +1,203 @@
+"""
+Métadonnées des MP3 (durée, débit, fréquence, taille) sans décodage.
+
+Lecture des seuls en-têtes : tag ID3v2 (sauté d'après sa taille), tag ID3v1
+en fin de fichier, puis trames MPEG. Si la première trame porte un en-tête
+Xing/Info (VBR/CBR LAME) ou VBRI (Fraunhofer), le nombre de trames y est lu
+directement ; sinon on parcourt les en-têtes de trames de proche en proche
+(quelques octets lus par trame).
+
+analyser_mp3 ne touche pas à la base : elle peut tourner dans un processus
+du pool de la commande analyser_audios. L'analyse à l'envoi est déclenchée
+par un signal (gui/models.py) et s'exécute en tâche de fond.
+"""
+import os
+
+
+# Débits (kbit/s) par (version, couche) ; MPEG-2.5 partage la table MPEG-2
+DEBITS = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+FREQUENCES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+COUCHES = {0b01: 3, 0b10: 2, 0b11: 1}
+
+# Zone explorée pour trouver la première trame (après le tag ID3v2)
+RECHERCHE_SYNCHRO = 64 * 1024
+
+
+def lire_entete_trame(octets):
+    """
+    Décode un en-tête de trame MPEG (4 octets). Retourne
+    {"version", "couche", "debit", "frequence", "longueur", "echantillons", "mono"}
+    ou None si les octets ne forment pas un en-tête valide.
+    """
+    if len(octets) < 4 or octets[0] != 0xFF or (octets[1] & 0xE0) != 0xE0:
+        return None
+    version = VERSIONS.get((octets[1] >> 3) & 0b11)
+    couche = COUCHES.get((octets[1] >> 1) & 0b11)
+    indice_debit = octets[2] >> 4
+    indice_frequence = (octets[2] >> 2) & 0b11
+    if version is None or couche is None or indice_debit in (0, 15) or indice_frequence == 3:
+        return None
+
+    debit = DEBITS[(1 if version == 1 else 2, couche)][indice_debit]
+    frequence = FREQUENCES[version][indice_frequence]
+    remplissage = (octets[2] >> 1) & 1
+    if couche == 1:
+        echantillons = 384
+        longueur = (12 * debit * 1000 // frequence + remplissage) * 4
+    else:
+        echantillons = 1152 if couche == 2 or version == 1 else 576
+        longueur = echantillons // 8 * debit * 1000 // frequence + remplissage
+    return {
+        "version": version,
+        "couche": couche,
+        "debit": debit,
+        "frequence": frequence,
+        "longueur": longueur,
+        "echantillons": echantillons,
+        "mono": (octets[3] >> 6) == 0b11,
+    }
+
+
+def _taille_id3v2(entete):
+    if len(entete) < 10 or entete[:3] != b"ID3":
+        return 0
+    taille = 0
+    for octet in entete[6:10]:
+        taille = (taille << 7) | (octet & 0x7F)
+    pied = 10 if entete[5] & 0x10 else 0
+    return 10 + taille + pied
+
+
+def _premiere_trame(f, debut, fin):
+    """(position, en-tête) de la première trame confirmée par la suivante."""
+    f.seek(debut)
+    zone = f.read(min(RECHERCHE_SYNCHRO, fin - debut))
+    position = zone.find(b"\xff")
+    while position != -1 and position + 4 <= len(zone):
+        trame = lire_entete_trame(zone[position:position + 4])
+        if trame is not None and trame["longueur"] > 0:
+            f.seek(debut + position + trame["longueur"])
+            suivante = lire_entete_trame(f.read(4))
+            if debut + position + trame["longueur"] >= fin or (
+                suivante is not None and suivante["frequence"] == trame["frequence"]
+            ):
+                return debut + position, trame
+        position = zone.find(b"\xff", position + 1)
+    return None, None
+
+
+def _nb_trames_entete_vbr(f, position, trame):
+    """Nombre de trames annoncé par un en-tête Xing/Info ou VBRI, sinon None."""
+    if trame["version"] == 1:
+        decalage = 17 if trame["mono"] else 32
+    else:
+        decalage = 9 if trame["mono"] else 17
+    f.seek(position + 4 + decalage)
+    xing = f.read(12)
+    if xing[:4] in (b"Xing", b"Info") and int.from_bytes(xing[4:8], "big") & 0x1:
+        return int.from_bytes(xing[8:12], "big") or None
+
+    f.seek(position + 4 + 32)
+    vbri = f.read(18)
+    if vbri[:4] == b"VBRI":
+        return int.from_bytes(vbri[14:18], "big") or None
+    return None
+
+
+def _parcourir_trames(f, position, fin):
+    """(nb d'échantillons, octets audio) en sautant de trame en trame."""
+    echantillons = octets = 0
+    while position + 4 <= fin:
+        f.seek(position)
+        trame = lire_entete_trame(f.read(4))
+        if trame is None or trame["longueur"] <= 0:
+            break
+        echantillons += trame["echantillons"]
+        octets += trame["longueur"]
+        position += trame["longueur"]
+    return echantillons, octets
+
+
+def analyser_mp3(chemin):
+    """
+    Retourne {"duree" (s), "debit" (kbit/s, moyen), "frequence" (Hz),
+    "taille" (octets)} ou None si aucune trame MPEG n'est trouvée.
+    """
+    try:
+        taille = os.path.getsize(chemin)
+        with open(chemin, "rb") as f:
+            debut = _taille_id3v2(f.read(10))
+            fin = taille
+            if taille >= 128:
+                f.seek(taille - 128)
+                if f.read(3) == b"TAG":
+                    fin -= 128
+            if debut >= fin:
+                return None
+
+            position, trame = _premiere_trame(f, debut, fin)
+            if trame is None:
+                return None
+
+            nb_trames = _nb_trames_entete_vbr(f, position, trame)
+            if nb_trames is not None:
+                # La trame Xing/VBRI elle-même ne contient pas d'audio
+                echantillons = nb_trames * trame["echantillons"]
+                octets = fin - position - trame["longueur"]
+            else:
+                echantillons, octets = _parcourir_trames(f, position, fin)
+    except OSError:
+        return None
+
+    if not echantillons:
+        return None
+    duree = echantillons / trame["frequence"]
+    return {
+        "duree": round(duree, 3),
+        "debit": round(octets * 8 / duree / 1000),
+        "frequence": trame["frequence"],
+        "taille": taille,
+    }
+
+
+# ----------- Enregistrement (processus Django) -----------
+
+CHAMPS_AUDIO = ("duree", "debit", "frequence", "taille")
+
+
+def enregistrer_infos_audio(modele, pk, nom, infos):
+    """
+    Stocke `infos` sur la piste, sauf si son fichier a changé depuis.
+    Retourne True si la piste a été mise à jour.
+    """
+    from .models import enregistrer_et_invalider, piste_audio
+
+    mis_a_jour = modele.objects.filter(pk=pk, fichier_mp3=nom).update(**infos)
+    if mis_a_jour and modele is piste_audio:
+        enregistrer_et_invalider(piste_audio.objects.filter(pk=pk).values_list("chant_id", flat=True))
+    return bool(mis_a_jour)
+
+
+def analyser_piste(modele, pk, nom):
+    from django.core.files.storage import default_storage
+
+    infos = analyser_mp3(default_storage.path(nom))
+    if infos is not None:
+        enregistrer_infos_audio(modele, pk, nom, infos)
+
+
+def planifier_analyse(modele, pk, nom):
+    """Analyse en tâche de fond (AUDIO_ANALYSE_ASYNC) ou tout de suite."""
+    from .taches import lancer_en_tache_de_fond
+
+    lancer_en_tache_de_fond(
+        "analyse-audio", lambda: analyser_piste(modele, pk, nom), "AUDIO_ANALYSE_ASYNC"
+    )
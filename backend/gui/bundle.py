@@ -0,0 +1,238 @@
+"""
+Bundle hors ligne du chansonnier : une archive zip versionnée contenant
+tout le catalogue, pour les lieux de cantus sans réseau.
+
+    manifest.json        version du catalogue, date, nombre de chants
+    chants.json          liste compacte des chants (champs de serialize_chant)
+    miniatures/<id>.jpg  illustrations réduites (bundle "avec miniatures")
+
+Chaque chant porte sa révision : à la version suivante du catalogue, seuls
+les chants dont la révision a changé sont relus et resérialisés, le reste
+(JSON et miniatures) est repris du bundle précédent.
+
+Le bundle suit la version de l'instantané (gui/instantane.py) : les notes
+et les utilisateurs ne le font pas reconstruire à chaque écriture. Il est
+construit en tâche de fond, une construction à la fois par variante ;
+pendant ce temps les requêtes reçoivent le bundle précédent (voir
+obtenir_bundle).
+"""
+import io
+import json
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from .cache_catalogue import _cache, version_instantane
+from .models import chant
+from .taches import lancer_en_tache_de_fond
+
+
+FORMAT_BUNDLE = 1
+
+# Champs exportés : pas d'URL absolue, le bundle ne dépend pas de l'hôte
+CHAMPS_BUNDLE = (
+    "id",
+    "nom_chant",
+    "auteur",
+    "ville_origine",
+    "paroles",
+    "description",
+    "utilisateur_pseudo",
+    "categories",
+    "a_ete_modifie",
+)
+
+TAILLE_MINIATURE = (320, 320)
+QUALITE_MINIATURE = 75
+
+# Une seule construction à la fois par variante ; verrou libéré en fin de
+# construction (cette durée ne sert que si le processus meurt entre-temps)
+DUREE_VERROU = 600
+# Retry-After (s) conseillé quand aucun bundle n'est encore disponible
+DELAI_REESSAI_BUNDLE = 10
+
+
+def _racine():
+    return Path(getattr(settings, "CATALOGUE_BUNDLE_DIR", settings.BASE_DIR / "cache" / "bundles"))
+
+
+def nom_bundle(version, miniatures=False):
+    return f"alzin-bundle-{version}{'-miniatures' if miniatures else ''}.zip"
+
+
+def chemin_bundle(version, miniatures=False):
+    return _racine() / nom_bundle(version, miniatures)
+
+
+def _bundles_existants(miniatures):
+    suffixe = "-miniatures.zip" if miniatures else ".zip"
+    bundles = []
+    for chemin in _racine().glob("alzin-bundle-*.zip"):
+        version = chemin.name[len("alzin-bundle-"):-len(suffixe)]
+        if chemin.name.endswith(suffixe) and version.isdigit():
+            bundles.append((int(version), chemin))
+    return sorted(bundles)
+
+
+def _lire_precedent(chemin, miniatures):
+    """{id: (entrée JSON, octets de la miniature ou None)} du bundle `chemin`."""
+    if chemin is None:
+        return {}
+    try:
+        with zipfile.ZipFile(chemin) as archive:
+            if json.loads(archive.read("manifest.json")).get("format") != FORMAT_BUNDLE:
+                return {}
+            noms = set(archive.namelist())
+            precedent = {}
+            for entree in json.loads(archive.read("chants.json")):
+                nom_miniature = f"miniatures/{entree['id']}.jpg"
+                image = archive.read(nom_miniature) if miniatures and nom_miniature in noms else None
+                precedent[entree["id"]] = (entree, image)
+            return precedent
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return {}
+
+
+def _miniature(nom_fichier):
+    if not nom_fichier:
+        return None
+    try:
+        with default_storage.open(nom_fichier, "rb") as f, Image.open(f) as image:
+            image.thumbnail(TAILLE_MINIATURE)
+            sortie = io.BytesIO()
+            image.convert("RGB").save(sortie, "JPEG", quality=QUALITE_MINIATURE, optimize=True)
+            return sortie.getvalue()
+    except (OSError, UnidentifiedImageError):
+        return None
+
+
+def construire_bundle(version, miniatures=False):
+    """
+    Écrit le bundle de `version` (s'il n'existe pas déjà) et retourne
+    (chemin, nb_chants_resérialisés).
+    """
+    # Import local : views importe ce module
+    from .views import _chants_queryset, serialize_chant
+
+    chemin = chemin_bundle(version, miniatures)
+    if chemin.exists():
+        return chemin, 0
+    _racine().mkdir(parents=True, exist_ok=True)
+
+    anciens = [c for v, c in _bundles_existants(miniatures) if v < version]
+    precedent = _lire_precedent(anciens[-1] if anciens else None, miniatures)
+
+    revisions = list(chant.objects.order_by("nom_chant", "id").values_list("id", "revision"))
+    a_relire = [
+        chant_id for chant_id, revision in revisions
+        if chant_id not in precedent or precedent[chant_id][0].get("revision") != revision
+    ]
+
+    nouveaux = {}
+    if a_relire:
+        illustrations = {}
+        if miniatures:
+            illustrations = dict(
+                chant.objects.filter(id__in=a_relire)
+                .exclude(illustration_chant__isnull=True)
+                .exclude(illustration_chant="")
+                .values_list("id", "illustration_chant")
+            )
+        champs = list(CHAMPS_BUNDLE)
+        for c in _chants_queryset(champs).filter(id__in=a_relire):
+            nouveaux[c.id] = (
+                serialize_chant(None, c, champs),
+                _miniature(illustrations.get(c.id)),
+            )
+
+    entrees, images = [], {}
+    for chant_id, revision in revisions:
+        if chant_id in nouveaux:
+            entree, image = nouveaux[chant_id]
+            entree["revision"] = revision
+        elif chant_id in precedent:
+            entree, image = precedent[chant_id]
+        else:
+            # Supprimé entre les deux lectures
+            continue
+        entrees.append(entree)
+        if image:
+            images[chant_id] = image
+
+    manifest = {
+        "format": FORMAT_BUNDLE,
+        "version": str(version),
+        "genere_le": timezone.now().isoformat(),
+        "nb_chants": len(entrees),
+        "miniatures": miniatures,
+    }
+
+    fd, temporaire = tempfile.mkstemp(dir=_racine(), prefix=".tmp-", suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+            archive.writestr("manifest.json", json.dumps(manifest, separators=(",", ":")))
+            archive.writestr(
+                "chants.json",
+                json.dumps(entrees, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")),
+            )
+            for chant_id, image in images.items():
+                # JPEG déjà compressé : stocké tel quel
+                archive.writestr(f"miniatures/{chant_id}.jpg", image, compress_type=zipfile.ZIP_STORED)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+
+    # Seul le bundle précédent sert à la reconstruction suivante
+    for ancien in anciens:
+        ancien.unlink(missing_ok=True)
+
+    return chemin, len(nouveaux)
+
+
+def _planifier(miniatures):
+    """
+    Lance la construction du bundle de la version courante, sauf si une
+    construction de cette variante est déjà en cours : elle est alors
+    relancée une fois terminée, pour la dernière version.
+    """
+    verrou = f"catalogue:bundle:{'miniatures' if miniatures else 'simple'}"
+    relance = f"{verrou}:relance"
+    if not _cache().add(verrou, True, DUREE_VERROU):
+        _cache().set(relance, True, DUREE_VERROU)
+        return
+
+    def construire_derniere_version():
+        try:
+            while True:
+                _cache().delete(relance)
+                construire_bundle(version_instantane(), miniatures)
+                if not _cache().get(relance):
+                    return
+        finally:
+            _cache().delete(verrou)
+
+    lancer_en_tache_de_fond("bundle-hors-ligne", construire_derniere_version, "CATALOGUE_BUNDLE_ASYNC")
+
+
+def obtenir_bundle(version, miniatures=False):
+    """
+    (version, chemin) du bundle à servir : celui de `version` s'il existe ;
+    sinon sa construction est lancée en tâche de fond et le bundle précédent
+    est servi en attendant, ou None s'il n'en existe aucun.
+    """
+    chemin = chemin_bundle(version, miniatures)
+    if not chemin.exists():
+        _planifier(miniatures)
+    if chemin.exists():
+        return version, chemin
+
+    precedents = [(v, c) for v, c in _bundles_existants(miniatures) if v < version]
+    return precedents[-1] if precedents else None
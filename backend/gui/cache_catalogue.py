@@ -0,0 +1,188 @@
+"""
+Cache des réponses du catalogue (chants, catégories, templates, évènements).
+
+Les entrées sont indexées par un numéro de version du catalogue : toute
+écriture qui modifie le catalogue change la version, ce qui rend d'un coup
+toutes les anciennes entrées inaccessibles (elles expirent ensuite seules).
+Un hit ne touche ni l'ORM ni la base de données.
+
+Validation HTTP : les réponses portent ETag / Last-Modified et les requêtes
+conditionnelles (If-None-Match, If-Modified-Since) reçoivent une 304.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+
+CLE_VERSION = "catalogue:version"
+CLE_VERSION_INSTANTANE = "catalogue:version:instantane"
+# Date (ns) de la plus ancienne modification pas encore reprise par l'instantané
+CLE_INSTANTANE_EN_RETARD = "catalogue:version:instantane:retard"
+
+# En-têtes conservés avec le contenu d'une réponse mise en cache
+ENTETES_CONSERVES = ("ETag", "Last-Modified", "Cache-Control")
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOGUE_CACHE_ALIAS", "catalogue")]
+
+
+def _version_stable(cle):
+    version = _cache().get(cle)
+    if version is None:
+        # Version horodatée : ne réutilise jamais un numéro déjà servi,
+        # même si la clé a été évincée du cache.
+        _cache().add(cle, time.time_ns(), None)
+        version = _cache().get(cle)
+    return version
+
+
+def version_catalogue_stable():
+    """
+    Version partagée du catalogue, ou None si le cache ne conserve rien
+    (DummyCache) : la version ne peut alors pas servir de clé durable.
+    """
+    return _version_stable(CLE_VERSION)
+
+
+def version_instantane_stable():
+    """
+    Version de l'instantané de la liste complète (gui/instantane.py) : ne
+    change pas à chaque note ni modification d'utilisateur (voir
+    invalider_catalogue), mais au plus CATALOGUE_INSTANTANE_RETARD_MAX
+    secondes après la première qu'il n'a pas reprise.
+    """
+    retard = _cache().get(CLE_INSTANTANE_EN_RETARD)
+    delai = getattr(settings, "CATALOGUE_INSTANTANE_RETARD_MAX", 300)
+    if retard is not None and time.time_ns() - retard >= delai * 1_000_000_000:
+        # Un seul processus passe à la version suivante
+        if _cache().delete(CLE_INSTANTANE_EN_RETARD):
+            _cache().set(CLE_VERSION_INSTANTANE, time.time_ns(), None)
+    return _version_stable(CLE_VERSION_INSTANTANE)
+
+
+def version_catalogue():
+    version = version_catalogue_stable()
+    if version is None:
+        # Cache inactif : version jetable, jamais revalidée
+        version = time.time_ns()
+    return version
+
+
+def version_instantane():
+    version = version_instantane_stable()
+    if version is None:
+        # Cache inactif : version jetable, jamais revalidée
+        version = time.time_ns()
+    return version
+
+
+def _changer_version(instantane=True):
+    version = time.time_ns()
+    _cache().set(CLE_VERSION, version, None)
+    if instantane:
+        _cache().set(CLE_VERSION_INSTANTANE, version, None)
+        _cache().delete(CLE_INSTANTANE_EN_RETARD)
+    else:
+        _cache().add(CLE_INSTANTANE_EN_RETARD, version, None)
+
+
+def invalider_catalogue(instantane=True):
+    """
+    Change la version du catalogue après le commit de la transaction en cours
+    (immédiatement hors transaction), pour qu'aucune lecture concurrente ne
+    mette en cache des données non encore validées sous la nouvelle version.
+
+    instantane=False (notes, utilisateurs : écritures fréquentes) : le
+    cache des réponses est invalidé tout de suite, l'instantané de la liste
+    complète au plus CATALOGUE_INSTANTANE_RETARD_MAX secondes plus tard
+    (une reconstruction pour toute une rafale de notes).
+    """
+    transaction.on_commit(lambda: _changer_version(instantane))
+
+
+def _signature_requete(request):
+    return "&".join(f"{k}={v}" for k, v in sorted(request.GET.lists()))
+
+
+def validation_catalogue(request, version=None):
+    """
+    (etag, last_modified) d'une réponse qui dépend de tout le catalogue,
+    calculés sans accès à la base : la version est l'horodatage (ns) du
+    dernier changement.
+    """
+    if version is None:
+        version = version_catalogue()
+    empreinte = hashlib.sha1(_signature_requete(request).encode("utf-8")).hexdigest()[:12]
+    return f'"catalogue-{version}-{empreinte}"', version // 1_000_000_000
+
+
+def poser_entetes_validation(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # Le client (ou nginx) peut stocker mais doit revalider à chaque fois
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def reponse_conditionnelle(request, etag, last_modified):
+    """
+    Retourne une 304 (avec ETag) si le client possède déjà cette version,
+    sinon None : la vue construit alors la réponse complète.
+    """
+    entetes = poser_entetes_validation(HttpResponse(), etag, last_modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=entetes
+    )
+    return None if response is entetes else response
+
+
+def _cle(request, version):
+    brut = "|".join([
+        str(version),
+        request.scheme,
+        request.get_host(),
+        request.path,
+        _signature_requete(request),
+    ])
+    return "catalogue:reponse:" + hashlib.sha1(brut.encode("utf-8")).hexdigest()
+
+
+def cache_catalogue(vue):
+    """
+    Met en cache les réponses GET 200 de la vue pour la version courante du
+    catalogue. Les autres méthodes passent sans cache.
+    """
+    @wraps(vue)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return vue(request, *args, **kwargs)
+
+        cle = _cle(request, version_catalogue())
+        entree = _cache().get(cle)
+        if entree is not None:
+            contenu, content_type, entetes = entree
+            response = HttpResponse(contenu, content_type=content_type)
+            for nom, valeur in entetes.items():
+                response[nom] = valeur
+            return get_conditional_response(
+                request,
+                etag=response.get("ETag"),
+                last_modified=parse_http_date_safe(response.get("Last-Modified", "")),
+                response=response,
+            )
+
+        response = vue(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            entetes = {nom: response[nom] for nom in ENTETES_CONSERVES if response.has_header(nom)}
+            _cache().set(cle, (response.content, response["Content-Type"], entetes))
+        return response
+
+    return wrapper
@@ -0,0 +1,275 @@
+"""
+Nombre de pages, format et aperçu des PDF (paroles_pdf, partition).
+
+analyser_pdf lit la structure du fichier sans bibliothèque PDF : nœuds
+/Type /Pages (leur /Count), /MediaBox et /Rotate de la première page, y
+compris dans les flux d'objets compressés (/ObjStm, Flate) des PDF 1.5+.
+Le fichier est projeté en mémoire (mmap), jamais lu en entier.
+
+L'aperçu de la première page (JPEG basse résolution, sous derives/ et nommé
+comme les déclinaisons d'images : apercu.<signature>.jpg) demande un moteur de rendu : PyMuPDF s'il est
+installé, sinon l'outil pdftoppm (poppler) s'il est présent ; à défaut, pas
+d'aperçu.
+
+Les résultats sont gardés sur l'objet (champ pdf_infos, par champ fichier)
+et exposés par les sérialiseurs : aucun PDF n'est ouvert pendant une requête.
+"""
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import zlib
+
+from PIL import Image, UnidentifiedImageError
+
+from .images import FORMATS, _ecrire_image, nom_derive, signature_reglages
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # dépendance optionnelle : rendu par pdftoppm ou pas d'aperçu
+    fitz = None
+
+
+CHAMPS_PDF = ("paroles_pdf", "partition")
+
+LARGEUR_APERCU = 320
+RESOLUTION_RENDU = 72
+DELAI_RENDU = 30
+SIGNATURE_APERCU = signature_reglages(LARGEUR_APERCU, RESOLUTION_RENDU, FORMATS["jpeg"])
+
+POINT_EN_MM = 25.4 / 72
+# Distance maximale parcourue autour d'un /Type pour délimiter son dictionnaire
+FENETRE_DICTIONNAIRE = 4096
+# Total décompressé des flux d'objets (les arbres de pages y sont petits)
+FLUX_OBJETS_MAX = 16 * 1024 * 1024
+TAILLE_BLOC_FLUX = 1024 * 1024
+
+PAGES_RE = re.compile(rb"/Type\s*/Pages(?![A-Za-z])")
+PAGE_RE = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+MEDIABOX_RE = re.compile(rb"/MediaBox\s*\[\s*([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s*\]")
+ROTATE_RE = re.compile(rb"/Rotate\s+(-?\d+)")
+OBJSTM_RE = re.compile(rb"/Type\s*/ObjStm(?![A-Za-z])")
+STREAM_RE = re.compile(rb"stream\r?\n")
+
+
+def _dictionnaire_autour(texte, position):
+    """Le dictionnaire << ... >> qui contient `position` (dans FENETRE_DICTIONNAIRE)."""
+    limite = max(0, position - FENETRE_DICTIONNAIRE)
+    profondeur, i = 0, position
+    while i - 2 >= limite:
+        deux = texte[i - 2:i]
+        if deux == b">>":
+            profondeur += 1
+            i -= 2
+        elif deux == b"<<":
+            if profondeur == 0:
+                break
+            profondeur -= 1
+            i -= 2
+        else:
+            i -= 1
+    debut = max(i - 2, limite)
+
+    limite = min(len(texte), position + FENETRE_DICTIONNAIRE)
+    profondeur, j = 0, debut
+    while j < limite - 1:
+        deux = texte[j:j + 2]
+        if deux == b"<<":
+            profondeur += 1
+            j += 2
+        elif deux == b">>":
+            profondeur -= 1
+            j += 2
+            if profondeur <= 0:
+                break
+        else:
+            j += 1
+    return texte[debut:j]
+
+
+def _flux_objets(donnees):
+    """Contenu décompressé des flux d'objets (/ObjStm), FLUX_OBJETS_MAX au plus."""
+    reste = FLUX_OBJETS_MAX
+    for m in OBJSTM_RE.finditer(donnees):
+        flux = STREAM_RE.search(donnees, m.end())
+        if flux is None:
+            continue
+        fin = donnees.find(b"endstream", flux.end())
+        if fin == -1:
+            continue
+        decompression, morceaux = zlib.decompressobj(), []
+        position = flux.end()
+        try:
+            # Flux lu par blocs, sortie bornée à `reste`
+            while position < fin and reste > 0 and not decompression.eof:
+                morceau = decompression.decompress(donnees[position:min(position + TAILLE_BLOC_FLUX, fin)], reste)
+                morceaux.append(morceau)
+                reste -= len(morceau)
+                position += TAILLE_BLOC_FLUX
+        except zlib.error:
+            continue
+        contenu = b"".join(morceaux)
+        yield contenu
+        if reste <= 0:
+            return
+
+
+def analyser_pdf(chemin):
+    """
+    Retourne {"pages", "largeur_mm", "hauteur_mm"} (format de la première
+    page, rotation comprise ; None si inconnu) ou None si ce n'est pas un PDF
+    ou qu'aucun arbre de pages n'est trouvé.
+
+    Le fichier est projeté en mémoire (mmap) et non lu : seules les pages
+    touchées par les recherches sont chargées, et le noyau peut les libérer.
+    """
+    try:
+        with open(chemin, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as donnees:
+            return _analyser(donnees)
+    except (OSError, ValueError):
+        # ValueError : fichier vide (mmap de longueur nulle)
+        return None
+
+
+def _analyser(donnees):
+    if b"%PDF-" not in donnees[:1024]:
+        return None
+
+    textes = [donnees, *_flux_objets(donnees)]
+
+    # Racine de l'arbre : le nœud /Pages au plus grand /Count
+    pages, boite_pages = 0, None
+    for texte in textes:
+        for m in PAGES_RE.finditer(texte):
+            dico = _dictionnaire_autour(texte, m.start())
+            compte = COUNT_RE.search(dico)
+            if compte and int(compte.group(1)) > pages:
+                pages = int(compte.group(1))
+                boite_pages = MEDIABOX_RE.search(dico) or boite_pages
+    if not pages:
+        pages = sum(len(PAGE_RE.findall(texte)) for texte in textes)
+    if not pages:
+        return None
+
+    boite, rotation = None, 0
+    for texte in textes:
+        m = PAGE_RE.search(texte)
+        if m is not None:
+            dico = _dictionnaire_autour(texte, m.start())
+            boite = MEDIABOX_RE.search(dico)
+            rotation = ROTATE_RE.search(dico)
+            rotation = int(rotation.group(1)) if rotation else 0
+            break
+    boite = boite or boite_pages
+
+    largeur = hauteur = None
+    if boite is not None:
+        try:
+            x0, y0, x1, y1 = (float(v) for v in boite.groups())
+        except ValueError:
+            pass
+        else:
+            largeur = round(abs(x1 - x0) * POINT_EN_MM, 1)
+            hauteur = round(abs(y1 - y0) * POINT_EN_MM, 1)
+            if rotation % 180:
+                largeur, hauteur = hauteur, largeur
+    return {"pages": pages, "largeur_mm": largeur, "hauteur_mm": hauteur}
+
+
+def _rendre_premiere_page(chemin):
+    """Image PIL de la page 1, ou None sans moteur de rendu."""
+    if fitz is not None:
+        with fitz.open(chemin) as document:
+            pixmap = document[0].get_pixmap(dpi=RESOLUTION_RENDU)
+            return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+    pdftoppm = shutil.which("pdftoppm")
+    if pdftoppm is None:
+        return None
+    with tempfile.TemporaryDirectory() as dossier:
+        sortie = os.path.join(dossier, "page")
+        subprocess.run(
+            [pdftoppm, "-f", "1", "-l", "1", "-r", str(RESOLUTION_RENDU), "-png", "-singlefile", chemin, sortie],
+            check=True, capture_output=True, timeout=DELAI_RENDU,
+        )
+        with Image.open(sortie + ".png") as image:
+            image.load()
+            return image
+
+
+def generer_apercu(racine, nom):
+    """
+    Écrit l'aperçu de MEDIA_ROOT/`nom` (voir images.nom_derive) ; retourne
+    son nom relatif, ou None (pas de moteur de rendu, PDF illisible).
+    """
+    relatif = nom_derive(nom, "apercu", "jpg", SIGNATURE_APERCU)
+    cible = os.path.join(racine, relatif)
+    if os.path.exists(cible):
+        return relatif
+    try:
+        image = _rendre_premiere_page(os.path.join(racine, nom))
+    except (OSError, RuntimeError, ValueError, subprocess.SubprocessError, UnidentifiedImageError):
+        return None
+    if image is None:
+        return None
+
+    if image.width > LARGEUR_APERCU:
+        hauteur = max(1, round(image.height * LARGEUR_APERCU / image.width))
+        image = image.resize((LARGEUR_APERCU, hauteur), Image.LANCZOS)
+    _ecrire_image(image.convert("RGB"), cible, "jpeg")
+    return relatif
+
+
+def decrire_pdf(racine, nom):
+    """analyser_pdf + aperçu ; {"source", "pages", ..., "apercu"} ou None."""
+    infos = analyser_pdf(os.path.join(racine, nom))
+    if infos is None:
+        return None
+    return {"source": nom, **infos, "apercu": generer_apercu(racine, nom)}
+
+
+# ----------- Enregistrement (processus Django) -----------
+
+def enregistrer_infos_pdf(modele, pk, champ, infos):
+    """
+    Range `infos` sous pdf_infos[champ], sauf si le fichier a changé depuis.
+    Retourne True si l'objet a été mis à jour.
+    """
+    from django.db import transaction
+
+    from .models import chant, enregistrer_et_invalider
+
+    with transaction.atomic():
+        actuelles = (
+            modele.objects.select_for_update()
+            .filter(pk=pk, **{champ: infos["source"]})
+            .values_list("pdf_infos", flat=True)
+            .first()
+        )
+        if actuelles is None:
+            return False
+        modele.objects.filter(pk=pk).update(pdf_infos={**actuelles, champ: infos})
+    if modele is chant:
+        enregistrer_et_invalider([pk])
+    return True
+
+
+def decrire_pdfs(modele, pk, fichiers):
+    from django.conf import settings
+
+    for champ, nom in fichiers:
+        infos = decrire_pdf(str(settings.MEDIA_ROOT), nom)
+        if infos is not None:
+            enregistrer_infos_pdf(modele, pk, champ, infos)
+
+
+def planifier_description(modele, pk, fichiers):
+    """Analyse de [(champ, nom)] en tâche de fond (PDF_ANALYSE_ASYNC) ou tout de suite."""
+    from .taches import lancer_en_tache_de_fond
+
+    lancer_en_tache_de_fond(
+        "analyse-pdf", lambda: decrire_pdfs(modele, pk, fichiers), "PDF_ANALYSE_ASYNC"
+    )
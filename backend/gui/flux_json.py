@@ -0,0 +1,73 @@
+"""
+Réponses JSON en flux pour les grandes listes.
+
+Le tableau est écrit lot par lot : chaque lot est une requête SQL bornée,
+reprise après la dernière clé primaire lue (pagination par clé). La mémoire
+reste constante quelle que soit la taille de la table, y compris avec
+mysqlclient qui charge tout le résultat d'une requête côté client (ce que
+QuerySet.iterator ne peut éviter), et le premier octet part avant que la
+dernière ligne ne soit lue.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+# Lignes lues par aller-retour SQL et regroupées par écriture sur le socket
+TAILLE_LOT = 500
+
+
+def _lots(queryset, taille_lot):
+    """
+    Lots successifs du queryset, triés par clé primaire. Avec .values(), la
+    clé primaire doit faire partie des champs demandés.
+    """
+    attname = queryset.model._meta.pk.attname
+    queryset = queryset.order_by("pk")
+    dernier = None
+    while True:
+        qs = queryset if dernier is None else queryset.filter(pk__gt=dernier)
+        lot = list(qs[:taille_lot])
+        if not lot:
+            return
+        yield lot
+        if len(lot) < taille_lot:
+            return
+        fin = lot[-1]
+        dernier = fin[attname] if isinstance(fin, dict) else fin.pk
+
+
+def _morceaux(queryset, serialiser, taille_lot, entete, cle):
+    encodeur = DjangoJSONEncoder()
+
+    if entete is None:
+        yield "["
+    else:
+        champs = "".join(f"{encodeur.encode(k)}: {encodeur.encode(v)}, " for k, v in entete.items())
+        yield f"{{{champs}{encodeur.encode(cle)}: ["
+
+    separateur = ""
+    for lot in _lots(queryset, taille_lot):
+        yield separateur + ", ".join(encodeur.encode(serialiser(obj)) for obj in lot)
+        separateur = ", "
+
+    yield "]" if entete is None else "]}"
+
+
+class ReponseJsonFlux(StreamingHttpResponse):
+    """
+    Tableau JSON de `serialiser(obj)` pour chaque objet du queryset, dans
+    l'ordre des clés primaires.
+
+    Avec `entete` (dict) et `cle`, produit un objet
+    {**entete, cle: [...]} dont seul le tableau est écrit en flux.
+    """
+
+    def __init__(self, queryset, serialiser, entete=None, cle=None, taille_lot=TAILLE_LOT, **kwargs):
+        if (entete is None) != (cle is None):
+            raise TypeError("entete et cle vont de pair")
+        kwargs.setdefault("content_type", "application/json")
+        morceaux = (
+            m.encode("utf-8")
+            for m in _morceaux(queryset, serialiser, taille_lot, entete, cle)
+        )
+        super().__init__(morceaux, **kwargs)
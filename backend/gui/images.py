@@ -0,0 +1,202 @@
+"""
+Déclinaisons des illustrations (chant, template, chansonnier perso).
+
+Chaque illustration est réduite à plusieurs largeurs, en WebP et en JPEG,
+sous MEDIA_ROOT/derives/<clé>/<largeur>.<signature>.<ext>. La clé ne dépend
+que du nom du fichier source : avec le stockage dédupliqué, une même image
+envoyée plusieurs fois n'est déclinée qu'une fois. La signature résume les
+réglages (largeurs, formats, qualité) : pour une source cas/, le nom fixe
+le contenu, servi comme immuable, et de nouveaux réglages donnent de
+nouvelles URL. Une source à nom libre (fichier antérieur au stockage
+dédupliqué) garde <largeur>.<ext>, réécrit sur place.
+
+La liste des déclinaisons est gardée sur l'objet (champ illustration_derives)
+et exposée par serialize_chant (illustration_srcset). La génération a lieu
+en tâche de fond après chaque enregistrement qui change l'illustration
+(signal dans gui/models.py) ; la commande generer_derives_images traite
+l'existant dans un pool de processus.
+
+generer_derives ne touche pas à la base : elle peut tourner dans un
+processus du pool sans initialiser Django.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .stockage import est_contenu
+
+
+LARGEURS = (320, 640, 1280)
+DOSSIER_DERIVES = "derives"
+
+# Format : (extension, options de Image.save)
+FORMATS = {
+    "webp": ("webp", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+# <base>[.<signature>].<ext>, base = largeur ou "apercu" (gui/documents.py)
+NOM_DERIVE_RE = re.compile(r"^(\d+|apercu)(?:\.([0-9a-f]{8}))?\.(\w+)$")
+
+
+def signature_reglages(*reglages):
+    """Empreinte courte des réglages de génération, portée par les noms."""
+    return hashlib.sha256(repr(reglages).encode("utf-8")).hexdigest()[:8]
+
+
+SIGNATURE_DERIVES = signature_reglages(LARGEURS, FORMATS)
+
+
+def nom_derive(source, base, extension, signature):
+    """
+    derives/<clé>/<base>.<signature>.<ext> pour une source cas/, sinon
+    derives/<clé>/<base>.<ext> (voir le docstring du module).
+    """
+    suffixe = f".{signature}" if est_contenu(source) else ""
+    return f"{DOSSIER_DERIVES}/{cle_derives(source)}/{base}{suffixe}.{extension}"
+
+
+def derive_immuable(nom):
+    """Vrai si le nom de la déclinaison fixe son contenu (source cas/ et réglages)."""
+    parties = nom.split("/")
+    if len(parties) != 3 or parties[0] != DOSSIER_DERIVES:
+        return False
+    m = NOM_DERIVE_RE.match(parties[2])
+    return m is not None and m.group(2) is not None
+
+
+def formats_disponibles():
+    return [fmt for fmt in FORMATS if fmt != "webp" or features.check("webp")]
+
+
+def cle_derives(nom):
+    """Nom du dossier des déclinaisons de `nom` (empreinte du fichier cas/)."""
+    base = os.path.splitext(os.path.basename(nom))[0]
+    if nom.startswith("cas/") and len(base) == 64:
+        return base
+    return hashlib.sha256(nom.encode("utf-8")).hexdigest()
+
+
+def _ecrire_image(image, chemin, fmt):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(chemin), suffix=".tmp")
+    try:
+        with os.fdopen(descripteur, "wb") as sortie:
+            image.save(sortie, fmt.upper(), **FORMATS[fmt][1])
+        os.replace(temporaire, chemin)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+def _aplatir(image):
+    """RGB sur fond blanc (JPEG n'a pas de canal alpha)."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        fond = Image.new("RGB", image.size, (255, 255, 255))
+        fond.paste(image, mask=image.getchannel("A"))
+        return fond
+    return image.convert("RGB")
+
+
+def generer_derives(racine, nom, forcer=False):
+    """
+    Écrit les déclinaisons de MEDIA_ROOT/`nom` (racine = MEDIA_ROOT) et
+    retourne {"source", "largeur", "hauteur", <format>: {largeur: nom}}
+    ou None si le fichier n'est pas une image lisible.
+
+    Les déclinaisons déjà présentes sont gardées, sauf avec `forcer` : elles
+    sont réécrites et celles qui ne sont plus produites (largeurs, anciens
+    réglages) sont effacées.
+    """
+    try:
+        with Image.open(os.path.join(racine, nom)) as ouverte:
+            image = ImageOps.exif_transpose(ouverte)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return None
+
+    formats = formats_disponibles()
+    derives = {
+        "source": nom,
+        "reglages": SIGNATURE_DERIVES,
+        "largeur": image.width,
+        "hauteur": image.height,
+    }
+    for fmt in formats:
+        derives[fmt] = {}
+
+    # Jamais d'agrandissement ; une image plus petite que toutes les
+    # largeurs garde une seule déclinaison à sa taille (recompressée)
+    largeurs = [l for l in LARGEURS if l < image.width] or [image.width]
+    for largeur in largeurs:
+        hauteur = max(1, round(image.height * largeur / image.width))
+        reduite = None
+        for fmt in formats:
+            relatif = nom_derive(nom, largeur, FORMATS[fmt][0], SIGNATURE_DERIVES)
+            chemin = os.path.join(racine, relatif)
+            if forcer or not os.path.exists(chemin):
+                if reduite is None:
+                    reduite = image.resize((largeur, hauteur), Image.LANCZOS)
+                sortie = _aplatir(reduite) if fmt == "jpeg" else reduite
+                if fmt == "webp" and sortie.mode not in ("RGB", "RGBA"):
+                    sortie = sortie.convert("RGBA" if "A" in sortie.getbands() else "RGB")
+                _ecrire_image(sortie, chemin, fmt)
+            derives[fmt][str(largeur)] = relatif
+
+    if forcer:
+        _effacer_anciennes(os.path.join(racine, DOSSIER_DERIVES, cle_derives(nom)), derives, formats)
+    return derives
+
+
+def _effacer_anciennes(dossier, derives, formats):
+    """Efface les déclinaisons (largeurs, anciens réglages) de `dossier` absentes de `derives`."""
+    gardees = {os.path.basename(relatif) for fmt in formats for relatif in derives[fmt].values()}
+    for nom in os.listdir(dossier):
+        m = NOM_DERIVE_RE.match(nom)
+        if m is not None and m.group(1).isdigit() and nom not in gardees:
+            try:
+                os.remove(os.path.join(dossier, nom))
+            except FileNotFoundError:
+                pass
+
+
+# ----------- Enregistrement (processus Django) -----------
+
+def enregistrer_derives(modele, pk, champ, derives):
+    """
+    Stocke `derives` sur l'objet, sauf si son illustration a changé depuis.
+    Retourne True si l'objet a été mis à jour.
+    """
+    from .models import chant, enregistrer_et_invalider
+
+    mis_a_jour = modele.objects.filter(pk=pk, **{champ: derives["source"]}).update(
+        illustration_derives=derives
+    )
+    if mis_a_jour and modele is chant:
+        enregistrer_et_invalider([pk])
+    return bool(mis_a_jour)
+
+
+def decliner_illustration(modele, pk, champ, nom):
+    from django.conf import settings
+
+    derives = generer_derives(str(settings.MEDIA_ROOT), nom)
+    if derives is not None:
+        enregistrer_derives(modele, pk, champ, derives)
+
+
+def planifier_derives(modele, pk, champ, nom):
+    """Déclinaisons en tâche de fond (IMAGES_DERIVES_ASYNC) ou tout de suite."""
+    from .taches import lancer_en_tache_de_fond
+
+    lancer_en_tache_de_fond(
+        "derives-illustration",
+        lambda: decliner_illustration(modele, pk, champ, nom),
+        "IMAGES_DERIVES_ASYNC",
+    )
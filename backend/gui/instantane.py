@@ -0,0 +1,253 @@
+"""
+Instantané précompressé de la liste complète des chants (/api/chants/?all=1).
+
+La liste est sérialisée une seule fois par version de l'instantané (qui
+reprend les notes et les utilisateurs avec un retard borné, voir
+invalider_catalogue), en tâche de fond, puis écrite sur disque en trois variantes : chants.json, chants.json.gz
+et chants.json.br (si le module `brotli` est installé). Les requêtes
+reçoivent ensuite le fichier adapté à leur Accept-Encoding, sans ORM, sans
+sérialisation et sans compression à la volée.
+
+Arborescence : <CATALOGUE_INSTANTANE_DIR>/<hôte>/<version>/chants.json[.gz|.br]
+(les URLs des médias sont absolues, donc propres à chaque hôte).
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from functools import wraps
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+from .cache_catalogue import (
+    _cache,
+    poser_entetes_validation,
+    reponse_conditionnelle,
+    validation_catalogue,
+    version_instantane_stable,
+)
+from .taches import lancer_en_tache_de_fond
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle : pas de variante .br
+    brotli = None
+
+
+NOM_FICHIER = "chants.json"
+
+# Variantes compressées par ordre de préférence : (Content-Encoding, extension)
+VARIANTES = (("br", ".br"), ("gzip", ".gz"))
+
+# Une seule reconstruction à la fois par hôte ; verrou libéré en fin de
+# construction (cette durée ne sert que si le processus meurt entre-temps)
+DUREE_VERROU = 300
+# Attente avant une reconstruction en tâche de fond : une rafale de
+# modifications ne donne qu'une construction, de la dernière version
+DELAI_REGROUPEMENT = 2
+
+# Compression : maximale pour la commande construire_instantane, plus
+# légère pour les reconstructions à la volée (processus web)
+NIVEAUX_COMPRESSION = {
+    "commande": {"gzip": 9, "brotli": 11},
+    "a_la_volee": {"gzip": 6, "brotli": 5},
+}
+
+
+class RequeteHote:
+    """
+    Requête minimale (schéma + hôte) pour sérialiser le catalogue hors d'une
+    requête HTTP : tâche de fond, commande de gestion.
+    """
+
+    def __init__(self, base_url):
+        morceaux = urlsplit(base_url)
+        self.scheme = morceaux.scheme or "http"
+        self._hote = morceaux.netloc
+
+    def get_host(self):
+        return self._hote
+
+    def build_absolute_uri(self, location):
+        return urljoin(f"{self.scheme}://{self._hote}/", location)
+
+
+def _racine():
+    return Path(getattr(settings, "CATALOGUE_INSTANTANE_DIR", settings.BASE_DIR / "cache" / "instantanes"))
+
+
+def _cle_hote(request):
+    base = f"{request.scheme}://{request.get_host()}"
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()[:16]
+
+
+def _dossier(request, version):
+    return _racine() / _cle_hote(request) / str(version)
+
+
+def _ecrire(chemin, contenu):
+    # Écriture atomique : un lecteur ne voit jamais un fichier tronqué
+    fd, temporaire = tempfile.mkstemp(dir=chemin.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenu)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+
+
+def _purger(dossier, version):
+    # Supprime les instantanés des versions antérieures du même hôte
+    for autre in dossier.parent.iterdir():
+        if autre.is_dir() and autre.name.isdigit() and int(autre.name) < version:
+            shutil.rmtree(autre, ignore_errors=True)
+
+
+def construire_instantane(request, construire, version, niveaux="commande"):
+    """
+    Écrit l'instantané de `version` ; `construire(request)` renvoie le JSON
+    (bytes) de la liste complète. `niveaux` : clé de NIVEAUX_COMPRESSION.
+    """
+    dossier = _dossier(request, version)
+    dossier.mkdir(parents=True, exist_ok=True)
+    niveaux = NIVEAUX_COMPRESSION[niveaux]
+
+    contenu = construire(request)
+    _ecrire(dossier / f"{NOM_FICHIER}.gz", gzip.compress(contenu, compresslevel=niveaux["gzip"], mtime=0))
+    if brotli is not None:
+        _ecrire(dossier / f"{NOM_FICHIER}.br", brotli.compress(contenu, quality=niveaux["brotli"]))
+    # Le .json est écrit en dernier : sa présence signale un instantané complet
+    _ecrire(dossier / NOM_FICHIER, contenu)
+
+    _purger(dossier, version)
+    return dossier
+
+
+def _planifier(request, construire):
+    """
+    Lance la construction de l'instantané de la version courante, sauf si
+    une construction est déjà en cours pour cet hôte : elle est alors
+    relancée une fois terminée, pour la dernière version.
+    """
+    requete = RequeteHote(f"{request.scheme}://{request.get_host()}")
+    verrou = f"catalogue:instantane:{_cle_hote(request)}"
+    relance = f"{verrou}:relance"
+    if not _cache().add(verrou, True, DUREE_VERROU):
+        _cache().set(relance, True, DUREE_VERROU)
+        return
+
+    def construire_derniere_version():
+        try:
+            while True:
+                _cache().delete(relance)
+                version = version_instantane_stable()
+                if version is None:
+                    return
+                if not (_dossier(requete, version) / NOM_FICHIER).exists():
+                    construire_instantane(requete, construire, version, niveaux="a_la_volee")
+                if not _cache().get(relance):
+                    return
+        finally:
+            _cache().delete(verrou)
+
+    lancer_en_tache_de_fond(
+        "instantane-catalogue",
+        construire_derniere_version,
+        "CATALOGUE_INSTANTANE_ASYNC",
+        delai=DELAI_REGROUPEMENT,
+    )
+
+
+def _encodages_acceptes(request):
+    acceptes = set()
+    for morceau in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        nom, _, parametres = morceau.partition(";")
+        nom, parametres = nom.strip().lower(), parametres.strip()
+        q = 1.0
+        if parametres.startswith("q="):
+            try:
+                q = float(parametres[2:])
+            except ValueError:
+                q = 0.0
+        if nom and q > 0:
+            acceptes.add(nom)
+    return acceptes
+
+
+def _reponse_fichier(request, dossier, etag, last_modified):
+    acceptes = _encodages_acceptes(request)
+    chemin, encodage = dossier / NOM_FICHIER, None
+    for nom, extension in VARIANTES:
+        candidat = dossier / f"{NOM_FICHIER}{extension}"
+        if (nom in acceptes or "*" in acceptes) and candidat.exists():
+            chemin, encodage = candidat, nom
+            break
+
+    try:
+        fichier = open(chemin, "rb")
+    except FileNotFoundError:
+        # Purgé entre-temps par une version plus récente
+        return None
+
+    response = FileResponse(fichier, content_type="application/json")
+    if response.has_header("Content-Disposition"):
+        del response["Content-Disposition"]
+    if encodage:
+        response["Content-Encoding"] = encodage
+    return poser_entetes_validation(response, etag, last_modified)
+
+
+def _liste_complete(request, args, kwargs):
+    return (
+        request.method == "GET"
+        and not args
+        and not any(v is not None for v in kwargs.values())
+        and list(request.GET.keys()) == ["all"]
+        and request.GET.get("all") in ("1", "true")
+    )
+
+
+def instantane_catalogue(construire):
+    """
+    Sert la liste complète depuis l'instantané de la version courante du
+    catalogue. Tant qu'il n'existe pas, sa construction est lancée en tâche
+    de fond et la vue répond normalement.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def wrapper(request, *args, **kwargs):
+            if not _liste_complete(request, args, kwargs):
+                return vue(request, *args, **kwargs)
+
+            version = version_instantane_stable()
+            if version is None:
+                return vue(request, *args, **kwargs)
+            try:
+                dossier = _dossier(request, version)
+            except DisallowedHost:
+                return vue(request, *args, **kwargs)
+
+            if not (dossier / NOM_FICHIER).exists():
+                _planifier(request, construire)
+                if not (dossier / NOM_FICHIER).exists():
+                    return vue(request, *args, **kwargs)
+
+            etag, last_modified = validation_catalogue(request, version)
+            response = reponse_conditionnelle(request, etag, last_modified)
+            if response is None:
+                response = _reponse_fichier(request, dossier, etag, last_modified)
+            if response is None:
+                return vue(request, *args, **kwargs)
+            patch_vary_headers(response, ("Accept-Encoding",))
+            return response
+
+        return wrapper
+
+    return decorateur
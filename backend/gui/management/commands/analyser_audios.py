@@ -0,0 +1,58 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from gui.audio import analyser_mp3, enregistrer_infos_audio
+from gui.models import MODELES_AUDIO
+
+
+class Command(BaseCommand):
+    help = (
+        "Lit durée, débit, fréquence et taille des MP3 existants "
+        "(pistes et demandes) dans un pool de processus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processus",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Nombre de processus d'analyse (défaut : nombre de CPU).",
+        )
+        parser.add_argument(
+            "--tout",
+            action="store_true",
+            help="Réanalyser aussi les fichiers qui ont déjà leurs métadonnées.",
+        )
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+
+        # Une même source (fichier dédupliqué) n'est lue qu'une fois
+        cibles = {}
+        for modele in MODELES_AUDIO:
+            qs = modele.objects.exclude(fichier_mp3="")
+            if not options["tout"]:
+                qs = qs.filter(duree__isnull=True)
+            for pk, nom in qs.values_list("pk", "fichier_mp3").iterator():
+                cibles.setdefault(nom, []).append((modele, pk))
+
+        noms = list(cibles)
+        chemins = [default_storage.path(nom) for nom in noms]
+        mis_a_jour = echecs = 0
+        with ProcessPoolExecutor(max_workers=max(1, options["processus"])) as pool:
+            for nom, infos in zip(noms, pool.map(analyser_mp3, chemins, chunksize=16)):
+                if infos is None:
+                    echecs += 1
+                    continue
+                for modele, pk in cibles[nom]:
+                    mis_a_jour += enregistrer_infos_audio(modele, pk, nom, infos)
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(noms)} fichier(s) analysé(s), {mis_a_jour} piste(s) mise(s) à jour, "
+            f"{echecs} illisible(s) en {duree:.1f} s."
+        ))
@@ -0,0 +1,59 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gui.documents import CHAMPS_PDF, decrire_pdf, enregistrer_infos_pdf
+from gui.models import MODELES_PDF
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcule pages, format et aperçu des PDF existants "
+        "(chants et demandes) dans un pool de processus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processus",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Nombre de processus d'analyse (défaut : nombre de CPU).",
+        )
+        parser.add_argument(
+            "--tout",
+            action="store_true",
+            help="Réanalyser aussi les PDF déjà décrits.",
+        )
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        racine = str(settings.MEDIA_ROOT)
+
+        # Une même source (fichier dédupliqué) n'est lue qu'une fois
+        cibles = {}
+        for modele in MODELES_PDF:
+            for pk, pdf_infos, *noms in modele.objects.values_list("pk", "pdf_infos", *CHAMPS_PDF).iterator():
+                for champ, nom in zip(CHAMPS_PDF, noms):
+                    deja = (pdf_infos or {}).get(champ, {}).get("source") == nom
+                    if nom and (options["tout"] or not deja):
+                        cibles.setdefault(nom, []).append((modele, pk, champ))
+
+        noms = list(cibles)
+        mis_a_jour = echecs = 0
+        with ProcessPoolExecutor(max_workers=max(1, options["processus"])) as pool:
+            resultats = pool.map(decrire_pdf, [racine] * len(noms), noms, chunksize=8)
+            for nom, infos in zip(noms, resultats):
+                if infos is None:
+                    echecs += 1
+                    continue
+                for modele, pk, champ in cibles[nom]:
+                    mis_a_jour += enregistrer_infos_pdf(modele, pk, champ, infos)
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(noms)} PDF analysé(s), {mis_a_jour} objet(s) mis à jour, "
+            f"{echecs} illisible(s) en {duree:.1f} s."
+        ))
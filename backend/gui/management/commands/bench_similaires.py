@@ -0,0 +1,57 @@
+import random
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+
+from gui.recommandations import POPULAIRES_PAR_CATEGORIE, TOP_K, calculer_similaires
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le temps de calcul des recommandations sur des favoris "
+        "synthétiques (sans base de données)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--utilisateurs", type=int, default=10_000)
+        parser.add_argument("--chants", type=int, default=5_000)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--favoris-moyen", type=int, default=20, dest="favoris_moyen")
+        parser.add_argument("--graine", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["graine"])
+        nb_chants = options["chants"]
+
+        # Popularité en loi de puissance : quelques chants très demandés
+        poids = [1 / (rang + 1) ** 0.8 for rang in range(nb_chants)]
+        favoris_par_utilisateur = []
+        for _ in range(options["utilisateurs"]):
+            nb = min(nb_chants, 200, max(1, int(rng.expovariate(1 / options["favoris_moyen"]))))
+            favoris_par_utilisateur.append(set(rng.choices(range(nb_chants), weights=poids, k=nb)))
+
+        categories_par_chant = {
+            chant_id: frozenset(rng.sample(range(options["categories"]), rng.randint(1, 3)))
+            for chant_id in range(nb_chants)
+        }
+        nb_favoris = Counter(c for chants in favoris_par_utilisateur for c in chants)
+        populaires = defaultdict(list)
+        for chant_id, _ in nb_favoris.most_common():
+            for cat in categories_par_chant[chant_id]:
+                if len(populaires[cat]) < POPULAIRES_PAR_CATEGORIE:
+                    populaires[cat].append(chant_id)
+
+        nb_lignes = sum(len(chants) for chants in favoris_par_utilisateur)
+        self.stdout.write(
+            f"{options['utilisateurs']} utilisateurs × {nb_chants} chants, {nb_lignes} favoris"
+        )
+
+        debut = time.perf_counter()
+        resultats = calculer_similaires(favoris_par_utilisateur, categories_par_chant, populaires, TOP_K)
+        duree = time.perf_counter() - debut
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Calcul : {duree:.2f} s, {sum(len(v) for v in resultats.values())} recommandations "
+            f"pour {len(resultats)} chants (top {TOP_K})"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from gui.cache_catalogue import version_instantane_stable
+from gui.instantane import RequeteHote, construire_instantane
+from gui.views import _json_liste_chants
+
+
+class Command(BaseCommand):
+    help = "Construit l'instantané précompressé de /api/chants/?all=1 pour la version courante du catalogue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url",
+            action="append",
+            dest="bases",
+            required=True,
+            help="Origine publique de l'API, ex. https://alzin.example (option répétable).",
+        )
+
+    def handle(self, *args, **options):
+        version = version_instantane_stable()
+        if version is None:
+            self.stderr.write("Le cache du catalogue est désactivé : aucun instantané construit.")
+            return
+        for base in options["bases"]:
+            dossier = construire_instantane(RequeteHote(base), _json_liste_chants, version)
+            self.stdout.write(self.style.SUCCESS(f"Instantané écrit dans {dossier}"))
@@ -0,0 +1,77 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gui.cache_catalogue import invalider_catalogue
+from gui.models import chant, piste_audio, toucher_chants
+from gui.stockage import (
+    champs_fichiers,
+    est_contenu,
+    recalculer_references_medias,
+    referencer,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Range les médias antérieurs dans le stockage adressé par contenu "
+        "(MEDIA_ROOT/cas/) puis réconcilie fichier_media.nb_references."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recalculer",
+            action="store_true",
+            help="Ne migrer aucun fichier, seulement recalculer les références.",
+        )
+
+    def handle(self, *args, **options):
+        migres = 0
+        if not options["recalculer"]:
+            migres = self._migrer()
+        with transaction.atomic():
+            nb = recalculer_references_medias()
+        self.stdout.write(self.style.SUCCESS(
+            f"{migres} fichier(s) migré(s), {nb} compteur(s) mis à jour."
+        ))
+
+    def _migrer(self):
+        # Nom antérieur -> nom cas/..., pour ne hacher chaque fichier qu'une fois
+        deja = {}
+        anciens = set()
+        chants_touches = set()
+        migres = 0
+        for modele, nom_champ in champs_fichiers():
+            lignes = (
+                modele.objects.exclude(**{nom_champ: ""})
+                .exclude(**{f"{nom_champ}__isnull": True})
+                .values_list("pk", nom_champ)
+            )
+            for pk, nom in lignes.iterator():
+                if est_contenu(nom):
+                    continue
+                if nom in deja:
+                    referencer(deja[nom])
+                else:
+                    if not default_storage.exists(nom):
+                        continue
+                    with default_storage.open(nom, "rb") as f:
+                        deja[nom] = default_storage.save(nom, f)
+                    anciens.add(nom)
+                modele.objects.filter(pk=pk).update(**{nom_champ: deja[nom]})
+                migres += 1
+                if modele is chant:
+                    chants_touches.add(pk)
+                elif modele is piste_audio:
+                    chants_touches.add(
+                        piste_audio.objects.filter(pk=pk).values_list("chant_id", flat=True).first()
+                    )
+
+        # Les .update() ne déclenchent pas de signaux
+        toucher_chants(chants_touches)
+        invalider_catalogue()
+        for nom in anciens:
+            os.remove(default_storage.path(nom))
+        return migres
@@ -0,0 +1,28 @@
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from gui.bundle import construire_bundle
+from gui.cache_catalogue import version_instantane
+
+
+class Command(BaseCommand):
+    help = "Construit le bundle hors ligne (zip) du catalogue pour sa version courante."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--miniatures",
+            action="store_true",
+            help="Inclure les illustrations réduites des chants.",
+        )
+        parser.add_argument(
+            "--sortie",
+            help="Copier aussi le bundle vers ce fichier ou dossier.",
+        )
+
+    def handle(self, *args, **options):
+        chemin, nb = construire_bundle(version_instantane(), options["miniatures"])
+        self.stdout.write(self.style.SUCCESS(f"Bundle {chemin} ({nb} chant(s) resérialisé(s))."))
+        if options["sortie"]:
+            destination = shutil.copy(chemin, options["sortie"])
+            self.stdout.write(f"Copié vers {destination}")
@@ -0,0 +1,73 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gui.images import SIGNATURE_DERIVES, enregistrer_derives, generer_derives
+from gui.models import ILLUSTRATIONS
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les déclinaisons WebP/JPEG des illustrations existantes "
+        "(chants, templates, chansonniers) qui n'en ont pas ou dont les "
+        "réglages ont changé, dans un pool de processus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processus",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Nombre de processus de traitement d'images (défaut : nombre de CPU).",
+        )
+        parser.add_argument(
+            "--tout",
+            action="store_true",
+            help=(
+                "Retraiter aussi les illustrations qui ont déjà leurs déclinaisons, "
+                "en réécrivant les fichiers existants (nouveaux réglages)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        racine = str(settings.MEDIA_ROOT)
+
+        # Une même source (fichier dédupliqué) n'est traitée qu'une fois
+        cibles = {}
+        for modele, champ in ILLUSTRATIONS:
+            lignes = (
+                modele.objects.exclude(**{champ: ""})
+                .exclude(**{f"{champ}__isnull": True})
+                .values_list("pk", champ, "illustration_derives")
+            )
+            for pk, nom, derives in lignes.iterator():
+                derives = derives or {}
+                if (
+                    options["tout"]
+                    or derives.get("source") != nom
+                    or derives.get("reglages") != SIGNATURE_DERIVES
+                ):
+                    cibles.setdefault(nom, []).append((modele, pk, champ))
+
+        noms = list(cibles)
+        mis_a_jour = echecs = 0
+        with ProcessPoolExecutor(max_workers=max(1, options["processus"])) as pool:
+            resultats = pool.map(
+                generer_derives, [racine] * len(noms), noms, [options["tout"]] * len(noms), chunksize=8,
+            )
+            for nom, derives in zip(noms, resultats):
+                if derives is None:
+                    echecs += 1
+                    continue
+                for modele, pk, champ in cibles[nom]:
+                    mis_a_jour += enregistrer_derives(modele, pk, champ, derives)
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(noms)} image(s) traitée(s), {mis_a_jour} objet(s) mis à jour, "
+            f"{echecs} illisible(s) en {duree:.1f} s."
+        ))
@@ -0,0 +1,80 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from gui.orphelins import chercher_orphelins, noms_references, supprimer_orphelin
+from gui.televersements import expirer_televersements
+
+
+def _mo(octets):
+    return f"{octets / (1024 * 1024):.1f} Mo"
+
+
+class Command(BaseCommand):
+    help = (
+        "Efface les médias que plus aucun FileField ne référence (et les "
+        "envois par blocs abandonnés), passé un délai de grâce. "
+        "À lancer périodiquement, par exemple chaque nuit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--simulation",
+            action="store_true",
+            help="N'efface rien : affiche seulement ce qui serait récupéré.",
+        )
+        parser.add_argument(
+            "--delai",
+            type=float,
+            default=getattr(settings, "MEDIAS_ORPHELINS_DELAI_HEURES", 24),
+            help="Âge minimal (heures) d'un fichier orphelin avant effacement.",
+        )
+        parser.add_argument(
+            "--processus",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Nombre de processus de parcours (défaut : nombre de CPU).",
+        )
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        racine = str(settings.MEDIA_ROOT)
+        simulation = options["simulation"]
+        limite = timezone.now() - timedelta(hours=options["delai"])
+
+        # Références lues avant le parcours : un fichier arrivé depuis est
+        # plus récent que le délai de grâce
+        references = noms_references()
+        orphelins = chercher_orphelins(racine, references, limite, max(1, options["processus"]))
+
+        par_dossier = {}
+        gardes = 0
+        for nom, taille in orphelins:
+            if not supprimer_orphelin(racine, nom, limite, simulation):
+                gardes += 1
+                continue
+            dossier = nom.split("/")[0]
+            nb, octets = par_dossier.get(dossier, (0, 0))
+            par_dossier[dossier] = (nb + 1, octets + taille)
+
+        envois = expirer_televersements(limite, simulation=simulation)
+        if envois[0]:
+            par_dossier["(envois par blocs)"] = envois
+
+        verbe = "à effacer" if simulation else "effacé(s)"
+        for dossier, (nb, octets) in sorted(par_dossier.items()):
+            self.stdout.write(f"  {dossier} : {nb} fichier(s) {verbe}, {_mo(octets)}")
+        if gardes:
+            self.stdout.write(f"  {gardes} contenu(s) cas/ gardé(s) : référencé(s) récemment.")
+
+        total = sum(nb for nb, _ in par_dossier.values())
+        octets = sum(o for _, o in par_dossier.values())
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} fichier(s) {verbe}, {_mo(octets)} "
+            f"{'récupérables' if simulation else 'récupérés'} en {duree:.1f} s."
+        ))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gui.models import purger_chants_supprimes
+
+
+class Command(BaseCommand):
+    help = (
+        "Efface les chants supprimés (pierres tombales de /api/chants/changes/) "
+        "plus anciens que SYNC_SUPPRESSIONS_RETENTION_JOURS. À lancer "
+        "périodiquement, par exemple chaque nuit : un client dont le jeton est "
+        "plus ancien que la rétention doit de toute façon tout resynchroniser."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--simulation",
+            action="store_true",
+            help="N'efface rien : affiche seulement le nombre de lignes concernées.",
+        )
+
+    def handle(self, *args, **options):
+        nb = purger_chants_supprimes(simulation=options["simulation"])
+        jours = getattr(settings, "SYNC_SUPPRESSIONS_RETENTION_JOURS", 90)
+        verbe = "à effacer" if options["simulation"] else "effacé(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{nb} chant(s) supprimé(s) depuis plus de {jours} jour(s) {verbe}."
+        ))
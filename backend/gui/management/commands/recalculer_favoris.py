@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gui.models import recalculer_nb_favoris
+
+
+class Command(BaseCommand):
+    help = "Réconcilie les compteurs chant.nb_favoris avec la table favoris."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chant",
+            type=int,
+            action="append",
+            dest="chants",
+            help="Limiter le recalcul à un chant (option répétable).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            nb = recalculer_nb_favoris(options["chants"])
+        self.stdout.write(self.style.SUCCESS(f"{nb} chant(s) mis à jour."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gui.models import recalculer_stats_notes
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les agrégats nb_notes / somme_notes des pistes audio à partir de la table noter."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--piste",
+            type=int,
+            action="append",
+            dest="pistes",
+            help="Limiter le recalcul à une piste (option répétable).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            nb = recalculer_stats_notes(options["pistes"])
+        self.stdout.write(self.style.SUCCESS(f"{nb} piste(s) audio mise(s) à jour."))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gui.recommandations import TOP_K, recalculer_similaires
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les recommandations « aussi mis en favoris » (table chant_similaire)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--k",
+            type=int,
+            default=TOP_K,
+            help=f"Nombre de voisins conservés par chant (défaut : {TOP_K}).",
+        )
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        nb = recalculer_similaires(options["k"])
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(f"{nb} recommandation(s) écrite(s) en {duree:.1f} s."))
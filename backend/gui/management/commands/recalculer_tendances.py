@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from gui.tendances import recalculer_tendances
+
+
+class Command(BaseCommand):
+    help = (
+        "Met à jour le classement tendance des chants (tendance_chant). "
+        "À lancer périodiquement, par exemple toutes les heures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--complet",
+            action="store_true",
+            help="Tout recalculer au lieu de poursuivre depuis le dernier passage.",
+        )
+
+    def handle(self, *args, **options):
+        nb = recalculer_tendances(complet=options["complet"])
+        self.stdout.write(self.style.SUCCESS(f"{nb} chant(s) classé(s)."))
@@ -0,0 +1,147 @@
+"""
+Distribution des fichiers médias (/media/...).
+
+La vue vérifie le chemin demandé, répond aux requêtes conditionnelles puis :
+- derrière nginx (en-tête X-Media-Accel posé par nginx.conf), délègue l'envoi
+  via X-Accel-Redirect : nginx sert le fichier et gère lui-même Range ;
+- sinon (développement), sert le fichier en Python avec support d'une plage
+  d'octets (Range / If-Range, réponses 206 et 416).
+
+ETag au format de nginx ("<mtime hex>-<taille hex>") pour que les deux modes,
+et If-Range côté nginx, s'accordent. Les fichiers cas/ sont immuables (nom =
+SHA-256 du contenu), tout comme les déclinaisons dont le nom porte la
+signature des réglages (derives/, voir images.nom_derive) : cache d'un an.
+Les autres, dont les déclinaisons réécrites sur place, ont un cache d'un
+jour.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .images import derive_immuable
+from .stockage import PREFIXE_CAS, est_contenu
+
+
+TAILLE_BLOC = 64 * 1024
+CACHE_IMMUABLE = 365 * 24 * 3600
+CACHE_ANTERIEUR = 24 * 3600
+
+PLAGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def chemin_media(nom):
+    """Chemin absolu de `nom` sous MEDIA_ROOT, ou Http404."""
+    nom = nom.replace("\\", "/")
+    parties = nom.split("/")
+    if (
+        not nom
+        or nom.startswith("/")
+        or any(p in ("", ".", "..") or p.startswith(".") for p in parties)
+        or nom.startswith(f"{PREFIXE_CAS}/tmp/")
+    ):
+        raise Http404("Fichier introuvable")
+
+    racine = os.path.realpath(settings.MEDIA_ROOT)
+    chemin = os.path.realpath(os.path.join(racine, *parties))
+    if os.path.commonpath([racine, chemin]) != racine or not os.path.isfile(chemin):
+        raise Http404("Fichier introuvable")
+    return chemin
+
+
+def _etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def _poser_entetes(response, nom, etag, stat):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Accept-Ranges"] = "bytes"
+    if est_contenu(nom) or derive_immuable(nom):
+        patch_cache_control(response, public=True, max_age=CACHE_IMMUABLE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=CACHE_ANTERIEUR)
+    return response
+
+
+def lire_plage(entete, taille):
+    """
+    (debut, fin) inclusifs pour une plage unique, None si absente ou multiple
+    (réponse complète), "invalide" si non satisfaisable.
+    """
+    m = PLAGE_RE.match((entete or "").strip())
+    if m is None:
+        return None
+    debut, fin = m.groups()
+    if not debut and not fin:
+        return None
+    if taille == 0:
+        return "invalide"
+    if not debut:
+        # Suffixe : les n derniers octets
+        n = int(fin)
+        if n == 0:
+            return "invalide"
+        return max(0, taille - n), taille - 1
+    debut = int(debut)
+    fin = min(int(fin), taille - 1) if fin else taille - 1
+    if debut >= taille or fin < debut:
+        return "invalide"
+    return debut, fin
+
+
+def _lire_fichier(chemin, debut, longueur):
+    with open(chemin, "rb") as f:
+        f.seek(debut)
+        while longueur > 0:
+            bloc = f.read(min(TAILLE_BLOC, longueur))
+            if not bloc:
+                break
+            longueur -= len(bloc)
+            yield bloc
+
+
+def servir_media(request, nom):
+    chemin = chemin_media(nom)
+    stat = os.stat(chemin)
+    etag = _etag(stat)
+    type_contenu = mimetypes.guess_type(chemin)[0] or "application/octet-stream"
+
+    conditionnelle = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(stat.st_mtime),
+        response=_poser_entetes(HttpResponse(), nom, etag, stat),
+    )
+    if conditionnelle.status_code in (304, 412):
+        return conditionnelle
+
+    prefixe = getattr(settings, "MEDIA_X_ACCEL_PREFIX", None)
+    if prefixe and request.headers.get("X-Media-Accel") == "1":
+        response = HttpResponse(content_type=type_contenu)
+        response["X-Accel-Redirect"] = prefixe + quote(nom)
+        return _poser_entetes(response, nom, etag, stat)
+
+    taille = stat.st_size
+    plage = None
+    if request.headers.get("If-Range", etag) == etag:
+        plage = lire_plage(request.headers.get("Range"), taille)
+
+    if plage == "invalide":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{taille}"
+        return _poser_entetes(response, nom, etag, stat)
+
+    debut, fin = plage or (0, taille - 1)
+    longueur = fin - debut + 1 if taille else 0
+    corps = _lire_fichier(chemin, debut, longueur) if request.method != "HEAD" else ()
+    response = StreamingHttpResponse(corps, content_type=type_contenu, status=206 if plage else 200)
+    response["Content-Length"] = str(longueur)
+    if plage:
+        response["Content-Range"] = f"bytes {debut}-{fin}/{taille}"
+    return _poser_entetes(response, nom, etag, stat)
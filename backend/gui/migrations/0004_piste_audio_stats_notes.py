@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+def remplir_stats_notes(apps, schema_editor):
+    piste_audio = apps.get_model("gui", "piste_audio")
+    noter = apps.get_model("gui", "noter")
+
+    agregats = (
+        noter.objects.values("piste_audio_id")
+        .annotate(nb=models.Count("id"), somme=models.Sum("valeur_note"))
+    )
+    for row in agregats:
+        piste_audio.objects.filter(id=row["piste_audio_id"]).update(
+            nb_notes=row["nb"],
+            somme_notes=row["somme"] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0003_remove_demande_chant_categories_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='piste_audio',
+            name='nb_notes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='piste_audio',
+            name='somme_notes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(remplir_stats_notes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+
+MYSQL_CREATION = [
+    "CREATE FULLTEXT INDEX chant_ft ON chant (nom_chant, auteur, ville_origine, paroles)",
+    "CREATE FULLTEXT INDEX chant_ft_nom ON chant (nom_chant)",
+]
+MYSQL_SUPPRESSION = [
+    "DROP INDEX chant_ft_nom ON chant",
+    "DROP INDEX chant_ft ON chant",
+]
+
+# Table FTS5 autonome, synchronisée par les signaux de gui.models : des
+# triggers sur chant disparaîtraient à chaque reconstruction de la table
+# par une migration SQLite (AddField...).
+SQLITE_CREATION = [
+    """
+    CREATE VIRTUAL TABLE chant_fts USING fts5(
+        nom_chant, auteur, ville_origine, paroles,
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO chant_fts(rowid, nom_chant, auteur, ville_origine, paroles)
+    SELECT id, nom_chant, COALESCE(auteur, ''), COALESCE(ville_origine, ''), paroles FROM chant
+    """,
+]
+SQLITE_SUPPRESSION = [
+    "DROP TABLE IF EXISTS chant_fts",
+]
+
+
+def _executer(schema_editor, requetes):
+    for sql in requetes:
+        schema_editor.execute(sql)
+
+
+def creer_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        _executer(schema_editor, MYSQL_CREATION)
+    elif vendor == "sqlite":
+        _executer(schema_editor, SQLITE_CREATION)
+
+
+def supprimer_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        _executer(schema_editor, MYSQL_SUPPRESSION)
+    elif vendor == "sqlite":
+        _executer(schema_editor, SQLITE_SUPPRESSION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0004_piste_audio_stats_notes'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from gui.normalisation import normaliser_nom, trigrammes
+
+
+def remplir_noms_normalises(apps, schema_editor):
+    chant = apps.get_model("gui", "chant")
+    demande_chant = apps.get_model("gui", "demande_chant")
+    trigramme_chant = apps.get_model("gui", "trigramme_chant")
+
+    for model in (chant, demande_chant):
+        objets = list(model.objects.only("id", "nom_chant"))
+        for obj in objets:
+            obj.nom_normalise = normaliser_nom(obj.nom_chant)
+        model.objects.bulk_update(objets, ["nom_normalise"], batch_size=500)
+
+    trigramme_chant.objects.bulk_create(
+        [
+            trigramme_chant(trigramme=t, chant_id=c.id)
+            for c in chant.objects.only("id", "nom_normalise")
+            for t in trigrammes(c.nom_normalise)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0005_chant_recherche_plein_texte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chant',
+            name='nom_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='demande_chant',
+            name='nom_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='trigramme_chant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigramme', models.CharField(max_length=3)),
+                ('chant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrammes', to='gui.chant')),
+            ],
+            options={
+                'db_table': 'trigramme_chant',
+                'unique_together': {('trigramme', 'chant')},
+            },
+        ),
+        migrations.RunPython(remplir_noms_normalises, migrations.RunPython.noop),
+    ]
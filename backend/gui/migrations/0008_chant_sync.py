@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0007_chant_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='chant_supprime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chant_id', models.BigIntegerField()),
+                ('date_suppression', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'chant_supprime',
+            },
+        ),
+        migrations.AlterField(
+            model_name='chant',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
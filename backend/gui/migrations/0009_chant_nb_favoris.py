@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+def remplir_nb_favoris(apps, schema_editor):
+    chant = apps.get_model("gui", "chant")
+    favoris = apps.get_model("gui", "favoris")
+
+    comptes = favoris.objects.values("chant_id").annotate(nb=models.Count("id"))
+    for row in comptes:
+        chant.objects.filter(id=row["chant_id"]).update(nb_favoris=row["nb"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0008_chant_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chant',
+            name='nb_favoris',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chant',
+            index=models.Index(fields=['-nb_favoris', 'id'], name='chant_top_favoris_idx'),
+        ),
+        migrations.RunPython(remplir_nb_favoris, migrations.RunPython.noop),
+    ]
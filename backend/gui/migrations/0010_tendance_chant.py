@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0009_chant_nb_favoris'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='tendance_chant',
+            fields=[
+                ('chant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tendance', serialize=False, to='gui.chant')),
+                ('score_base', models.FloatField(default=0)),
+                ('score', models.FloatField(db_index=True, default=0)),
+                ('date_reference', models.DateField()),
+            ],
+            options={
+                'db_table': 'tendance_chant',
+            },
+        ),
+        migrations.AlterField(
+            model_name='commentaire',
+            name='date_comment',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='favoris',
+            name='date_favori',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='noter',
+            name='date_rating',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0010_tendance_chant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='chant_similaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rang', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('chant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similaires', to='gui.chant')),
+                ('similaire', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gui.chant')),
+            ],
+            options={
+                'db_table': 'chant_similaire',
+                'unique_together': {('chant', 'rang')},
+            },
+        ),
+    ]
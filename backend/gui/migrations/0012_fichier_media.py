@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0011_chant_similaire'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='fichier_media',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('taille', models.PositiveBigIntegerField(default=0)),
+                ('nb_references', models.PositiveIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'fichier_media',
+            },
+        ),
+    ]
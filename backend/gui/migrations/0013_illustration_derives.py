@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0012_fichier_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chansonnier_perso',
+            name='illustration_derives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chant',
+            name='illustration_derives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='template_chansonnier',
+            name='illustration_derives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
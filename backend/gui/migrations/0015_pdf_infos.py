@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0014_audio_metadonnees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chant',
+            name='pdf_infos',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='demande_chant',
+            name='pdf_infos',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='demande_modification_chant',
+            name='pdf_infos',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
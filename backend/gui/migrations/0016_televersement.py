@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0015_pdf_infos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='televersement',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('cible', models.CharField(choices=[('piste_audio', 'Piste audio'), ('demande_chant_audio', "Audio d'une demande de chant"), ('demande_piste_audio', 'Demande de piste audio'), ('piece_jointe_support', 'Pièce jointe support')], max_length=30)),
+                ('parametres', models.JSONField(blank=True, default=dict)),
+                ('nom_fichier', models.CharField(max_length=255)),
+                ('taille', models.PositiveBigIntegerField()),
+                ('recu', models.PositiveBigIntegerField(default=0)),
+                ('sha256', models.CharField(max_length=64)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_modification', models.DateTimeField(auto_now=True, db_index=True)),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='televersements', to='gui.utilisateur')),
+            ],
+            options={
+                'db_table': 'televersement',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gui', '0016_televersement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fichier_media',
+            name='date_reference',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,6 +1,37 @@
 
 # Create your models here.
-from django.db import models
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .audio import planifier_analyse
+from .cache_catalogue import invalider_catalogue
+from .documents import CHAMPS_PDF, planifier_description
+from .images import planifier_derives
+from .normalisation import normaliser_nom, trigrammes
+from .stockage import supprimer_fichier
+
+
+# ================================================================================
+# MODÈLES À FICHIERS
+# ================================================================================
+
+class modele_fichiers(models.Model):
+    """
+    Modèle portant des FileField : save() en transaction, pour que la
+    référence posée par StockageDedup pendant l'enregistrement soit annulée
+    si l'écriture de la ligne échoue (gui/stockage.py).
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 # ================================================================================
@@ -42,8 +73,10 @@ class utilisateur(models.Model):
 # CHANT (+ relation avec utilisateur et catégories)
 # ================================================================================
 
-class chant(models.Model):
+class chant(modele_fichiers):
     nom_chant = models.CharField(max_length=100, db_index=True)
+    # Sans accents, minuscules, sans ponctuation (maintenu à l'enregistrement)
+    nom_normalise = models.CharField(max_length=100, db_index=True, editable=False, default="")
     auteur = models.CharField(max_length=100, blank=True, null=True)
     ville_origine = models.CharField(max_length=100, blank=True, null=True)
     paroles = models.TextField()
@@ -52,6 +85,10 @@ class chant(models.Model):
     illustration_chant = models.ImageField(upload_to="illustrations/", null=True, blank=True)
     paroles_pdf = models.FileField(upload_to="paroles_pdf/", null=True, blank=True)
     partition = models.FileField(upload_to="partitions/", null=True, blank=True)
+    # Pages, format et aperçu de chaque PDF, par champ (gui/documents.py)
+    pdf_infos = models.JSONField(default=dict, blank=True, editable=False)
+    # Déclinaisons WebP/JPEG de l'illustration (gui/images.py)
+    illustration_derives = models.JSONField(default=dict, blank=True, editable=False)
 
     utilisateur = models.ForeignKey(
         "utilisateur",
@@ -60,11 +97,77 @@ class chant(models.Model):
         blank=True
     )
 
+    # Révision du chant sérialisé : incrémentée à chaque modification du chant
+    # ou de ses relations (catégories, pistes, notes...). Sert aux ETag et à
+    # la synchronisation incrémentale (/api/chants/changes/).
+    revision = models.PositiveIntegerField(default=0)
+    date_modification = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Nombre de favoris (dénormalisé, maintenu par favoris_api)
+    nb_favoris = models.PositiveIntegerField(default=0)
+
     class Meta:
         db_table = "chant"
+        indexes = [
+            # Classement /api/chants/top/ : lecture de l'index dans l'ordre
+            models.Index(fields=["-nb_favoris", "id"], name="chant_top_favoris_idx"),
+        ]
 
     def __str__(self):
         return self.nom_chant
+
+
+class trigramme_chant(models.Model):
+    """
+    Index inversé des trigrammes de chant.nom_normalise (autocomplétion
+    approximative et détection de doublons).
+    """
+    trigramme = models.CharField(max_length=3)
+    chant = models.ForeignKey(
+        chant,
+        on_delete=models.CASCADE,
+        related_name="trigrammes",
+    )
+
+    class Meta:
+        db_table = "trigramme_chant"
+        unique_together = (('trigramme', 'chant'),)
+
+    def __str__(self):
+        return f"{self.trigramme!r} -> {self.chant_id}"
+
+
+class chant_supprime(models.Model):
+    """
+    Pierre tombale d'un chant supprimé, pour que les clients hors ligne
+    retirent le chant lors de leur prochaine synchronisation.
+    """
+    chant_id = models.BigIntegerField()
+    date_suppression = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "chant_supprime"
+
+    def __str__(self):
+        return f"Chant {self.chant_id} supprimé le {self.date_suppression:%Y-%m-%d %H:%M}"
+
+
+def horizon_chants_supprimes():
+    """
+    Date avant laquelle les pierres tombales peuvent avoir été purgées : un
+    jeton de synchronisation plus ancien impose une resynchronisation complète.
+    """
+    return timezone.now() - timedelta(days=getattr(settings, "SYNC_SUPPRESSIONS_RETENTION_JOURS", 90))
+
+
+def purger_chants_supprimes(simulation=False):
+    """Efface les pierres tombales plus anciennes que la rétention ; retourne leur nombre."""
+    qs = chant_supprime.objects.filter(date_suppression__lt=horizon_chants_supprimes())
+    if simulation:
+        return qs.count()
+    return qs.delete()[0]
+
+
 # ================================================================================
 # CATÉGORIE & APPARTENIR
 # ================================================================================
@@ -111,8 +214,17 @@ class appartenir(models.Model):
 # PISTE AUDIO & NOTER
 # ================================================================================
 
-class piste_audio(models.Model):
+class piste_audio(modele_fichiers):
     fichier_mp3 = models.FileField(upload_to="pistes_audio/")
+    # Métadonnées lues dans les en-têtes MP3 (gui/audio.py)
+    duree = models.FloatField(null=True, blank=True, editable=False)
+    debit = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    frequence = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    taille = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
+    # Agrégats des notes dénormalisés (maintenus par noter_api)
+    nb_notes = models.PositiveIntegerField(default=0)
+    somme_notes = models.PositiveIntegerField(default=0)
 
     utilisateur = models.ForeignKey(
         "utilisateur",
@@ -131,13 +243,19 @@ class piste_audio(models.Model):
     class Meta:
         db_table = "piste_audio"
 
+    @property
+    def note_moyenne(self):
+        if not self.nb_notes:
+            return 0.0
+        return self.somme_notes / self.nb_notes
+
     def __str__(self):
         return f"Audio {self.id} - {self.chant.nom_chant} ajouté par {self.utilisateur.pseudo if self.utilisateur else 'inconnu'}"
 #-------------------------------------------------------------------------------
                                 # DEMANDES
 #-------------------------------------------------------------------------------
 
-class demande_chant(models.Model):
+class demande_chant(modele_fichiers):
     STATUTS = (
         ("EN_ATTENTE", "En attente"),
         ("ACCEPTEE", "Acceptée"),
@@ -151,6 +269,7 @@ class demande_chant(models.Model):
     )
 
     nom_chant = models.CharField(max_length=100)
+    nom_normalise = models.CharField(max_length=100, db_index=True, editable=False, default="")
     auteur = models.CharField(max_length=100, blank=True, null=True)
     ville_origine = models.CharField(max_length=100, blank=True, null=True)
     paroles = models.TextField(blank=True)
@@ -159,6 +278,8 @@ class demande_chant(models.Model):
     illustration_chant = models.ImageField(upload_to="illustrations/", null=True, blank=True)
     paroles_pdf = models.FileField(upload_to="paroles_pdf/", null=True, blank=True)
     partition = models.FileField(upload_to="partitions/", null=True, blank=True)
+    # Pages, format et aperçu de chaque PDF, par champ (gui/documents.py)
+    pdf_infos = models.JSONField(default=dict, blank=True, editable=False)
 
     categorie = models.ForeignKey(
         categorie,
@@ -181,13 +302,18 @@ class demande_chant(models.Model):
         return f"Demande #{self.id} - {self.nom_chant} ({self.get_statut_display()})"
 
 
-class demande_chant_audio(models.Model):
+class demande_chant_audio(modele_fichiers):
     demande = models.ForeignKey(
         demande_chant,
         on_delete=models.CASCADE,
         related_name="pistes_audio",
     )
     fichier_mp3 = models.FileField(upload_to="demandes_chants_audio/")
+    # Métadonnées lues dans les en-têtes MP3 (gui/audio.py)
+    duree = models.FloatField(null=True, blank=True, editable=False)
+    debit = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    frequence = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    taille = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -197,7 +323,7 @@ class demande_chant_audio(models.Model):
         return f"Audio demande #{self.demande_id} - {self.fichier_mp3.name}"
 
 
-class demande_modification_chant(models.Model):
+class demande_modification_chant(modele_fichiers):
     STATUTS = (
         ("EN_ATTENTE", "En attente"),
         ("ACCEPTEE", "Acceptée"),
@@ -224,6 +350,8 @@ class demande_modification_chant(models.Model):
     illustration_chant = models.ImageField(upload_to="illustrations/", null=True, blank=True)
     paroles_pdf = models.FileField(upload_to="paroles_pdf/", null=True, blank=True)
     partition = models.FileField(upload_to="partitions/", null=True, blank=True)
+    # Pages, format et aperçu de chaque PDF, par champ (gui/documents.py)
+    pdf_infos = models.JSONField(default=dict, blank=True, editable=False)
 
     categories = models.JSONField(default=list, blank=True)
 
@@ -240,7 +368,7 @@ class demande_modification_chant(models.Model):
         return f"Modification #{self.id} pour {self.chant.nom_chant} ({self.get_statut_display()})"
 
 
-class demande_piste_audio(models.Model):
+class demande_piste_audio(modele_fichiers):
     STATUTS = (
         ("EN_ATTENTE", "En attente"),
         ("ACCEPTEE", "Acceptée"),
@@ -258,6 +386,11 @@ class demande_piste_audio(models.Model):
         related_name="demandes_pistes",
     )
     fichier_mp3 = models.FileField(upload_to="demandes_pistes_audio/")
+    # Métadonnées lues dans les en-têtes MP3 (gui/audio.py)
+    duree = models.FloatField(null=True, blank=True, editable=False)
+    debit = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    frequence = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    taille = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
     statut = models.CharField(max_length=20, choices=STATUTS, default="EN_ATTENTE")
     justification_refus = models.TextField(blank=True, null=True)
     date_creation = models.DateTimeField(auto_now_add=True)
@@ -279,7 +412,7 @@ class noter(models.Model):
         piste_audio,
         on_delete=models.CASCADE
     )
-    date_rating = models.DateField(auto_now_add=True)
+    date_rating = models.DateField(auto_now_add=True, db_index=True)
     valeur_note = models.PositiveSmallIntegerField()
 
     class Meta:
@@ -290,6 +423,34 @@ class noter(models.Model):
         return f"{self.utilisateur} note {self.piste_audio} le {self.date_rating} : {self.valeur_note}/5"
 
 
+def recalculer_stats_notes(pistes_ids=None):
+    """
+    Recalcule nb_notes / somme_notes de piste_audio à partir de la table noter.
+    Sans argument, toutes les pistes sont reconstruites.
+    """
+    qs = piste_audio.objects.all()
+    if pistes_ids is not None:
+        qs = qs.filter(id__in=pistes_ids)
+
+    agregats = {
+        row["piste_audio_id"]: (row["nb"], row["somme"] or 0)
+        for row in noter.objects.filter(piste_audio__in=qs)
+            .values("piste_audio_id")
+            .annotate(nb=models.Count("id"), somme=models.Sum("valeur_note"))
+    }
+
+    modifiees = []
+    for pa in qs.only("id", "nb_notes", "somme_notes"):
+        nb, somme = agregats.get(pa.id, (0, 0))
+        if pa.nb_notes != nb or pa.somme_notes != somme:
+            pa.nb_notes = nb
+            pa.somme_notes = somme
+            modifiees.append(pa)
+
+    piste_audio.objects.bulk_update(modifiees, ["nb_notes", "somme_notes"], batch_size=500)
+    return len(modifiees)
+
+
 # ================================================================================
 # FAVORIS
 # ================================================================================
@@ -305,7 +466,7 @@ class favoris(models.Model):
         on_delete=models.CASCADE,
         db_index=True
     )
-    date_favori = models.DateField(auto_now_add=True)
+    date_favori = models.DateField(auto_now_add=True, db_index=True)
 
     class Meta:
         db_table = 'favoris'
@@ -315,6 +476,33 @@ class favoris(models.Model):
         return f"{self.utilisateur} favoris {self.chant} le {self.date_favori}"
 
 
+def recalculer_nb_favoris(chants_ids=None):
+    """
+    Recalcule chant.nb_favoris à partir de la table favoris.
+    Sans argument, tous les chants sont reconstruits.
+    """
+    qs = chant.objects.all()
+    if chants_ids is not None:
+        qs = qs.filter(id__in=chants_ids)
+
+    comptes = dict(
+        favoris.objects.filter(chant__in=qs)
+        .values("chant_id")
+        .annotate(nb=models.Count("id"))
+        .values_list("chant_id", "nb")
+    )
+
+    modifies = []
+    for c in qs.only("id", "nb_favoris"):
+        nb = comptes.get(c.id, 0)
+        if c.nb_favoris != nb:
+            c.nb_favoris = nb
+            modifies.append(c)
+
+    chant.objects.bulk_update(modifies, ["nb_favoris"], batch_size=500)
+    return len(modifies)
+
+
 # ================================================================================
 # COMMENTAIRE
 # ================================================================================
@@ -328,7 +516,7 @@ class commentaire(models.Model):
         chant,
         on_delete=models.CASCADE,
     )
-    date_comment = models.DateField(auto_now_add=True)
+    date_comment = models.DateField(auto_now_add=True, db_index=True)
     texte = models.CharField(max_length=255)
 
     class Meta:
@@ -339,14 +527,64 @@ class commentaire(models.Model):
         return f"Comment by {self.utilisateur} on {self.chant} at {self.date_comment}"
 
 
+# ================================================================================
+# RECOMMANDATIONS (« aussi mis en favoris », calculé par gui/recommandations.py)
+# ================================================================================
+class chant_similaire(models.Model):
+    chant = models.ForeignKey(
+        chant,
+        on_delete=models.CASCADE,
+        related_name="similaires",
+    )
+    similaire = models.ForeignKey(
+        "chant",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    rang = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        db_table = "chant_similaire"
+        # Lecture en ligne : WHERE chant_id = ? ORDER BY rang LIMIT k
+        unique_together = (('chant', 'rang'),)
+
+    def __str__(self):
+        return f"{self.chant_id} -> {self.similaire_id} (#{self.rang}, {self.score:.3f})"
+
+
+# ================================================================================
+# TENDANCES (score décroissant dans le temps, calculé par gui/tendances.py)
+# ================================================================================
+class tendance_chant(models.Model):
+    chant = models.OneToOneField(
+        chant,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="tendance",
+    )
+    # Contribution décroissante des jours antérieurs à date_reference
+    score_base = models.FloatField(default=0)
+    # score_base + évènements du jour de référence : valeur classée
+    score = models.FloatField(default=0, db_index=True)
+    date_reference = models.DateField()
+
+    class Meta:
+        db_table = "tendance_chant"
+
+    def __str__(self):
+        return f"Tendance {self.chant_id} : {self.score:.2f} ({self.date_reference})"
+
+
 # ================================================================================
 # CHANSONNIER (+ relations : contenir, fournir)
 # ================================================================================
-class template_chansonnier(models.Model):
+class template_chansonnier(modele_fichiers):
     nom_template = models.CharField(max_length = 100)
     description = models.CharField(max_length = 255)
     couleur = models.CharField(max_length = 50)
     illustration_template = models.FileField(upload_to='illustrations_template/',null=True, blank=True)
+    illustration_derives = models.JSONField(default=dict, blank=True, editable=False)
     type_papier = models.CharField(max_length = 100)
     
     class Meta:
@@ -357,10 +595,11 @@ class template_chansonnier(models.Model):
     
 
 
-class chansonnier_perso(models.Model):
+class chansonnier_perso(modele_fichiers):
     nom_chansonnier_perso = models.CharField(max_length = 100)
     couleur = models.CharField(max_length = 50)
     illustration_chansonnier = models.FileField(upload_to='illustrations_chansonnier/',null=True, blank=True)
+    illustration_derives = models.JSONField(default=dict, blank=True, editable=False)
     type_papier = models.CharField(max_length = 100)
     date_creation = models.DateField()
     utilisateur = models.ForeignKey(
@@ -547,36 +786,262 @@ class maitre_chant(models.Model):
         return self.nom
 
 
+# ================================================================================
+#                                 FICHIERS MÉDIAS
+# ================================================================================
+
+class fichier_media(models.Model):
+    """
+    Contenu stocké une seule fois sous MEDIA_ROOT/cas/ (gui.stockage.StockageDedup)
+    et nombre de FileField qui le référencent.
+    """
+    nom = models.CharField(max_length=100, unique=True)
+    taille = models.PositiveBigIntegerField(default=0)
+    nb_references = models.PositiveIntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    # Dernière référence ajoutée (gui.orphelins : délai de grâce)
+    date_reference = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "fichier_media"
+
+    def __str__(self):
+        return f"{self.nom} ({self.nb_references})"
+
 
-from django.db.models.signals import post_delete
+
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-import os
+
 
 # ----------------------------
-# Suppression fichiers chant
+# Invalidation du cache catalogue
 # ----------------------------
-@receiver(post_delete, sender=chant)
-def delete_chant_files(sender, instance, **kwargs):
-    if instance.illustration_chant:
-        if os.path.isfile(instance.illustration_chant.path):
-            os.remove(instance.illustration_chant.path)
+# Toute écriture ORM sur un modèle exposé par les endpoints catalogue change
+# la version du cache. Les .update() sur queryset ne déclenchent pas de
+# signaux : les vues qui en font appellent invalider_catalogue() elles-mêmes.
+MODELES_CATALOGUE = (
+    chant,
+    appartenir,
+    categorie,
+    piste_audio,
+    noter,
+    demande_modification_chant,
+    template_chansonnier,
+    contenir_chant_template,
+    evenement,
+    chanter,
+    utilisateur,
+)
+
+
+# Écritures fréquentes (notes, profils) : reconstruction différée de
+# l'instantané de la liste complète (voir invalider_catalogue)
+MODELES_HORS_INSTANTANE = (noter, utilisateur)
+
+
+def invalider_catalogue_signal(sender, **kwargs):
+    invalider_catalogue(instantane=sender not in MODELES_HORS_INSTANTANE)
+
 
-    if instance.paroles_pdf:
-        if os.path.isfile(instance.paroles_pdf.path):
-            os.remove(instance.paroles_pdf.path)
+for _modele in MODELES_CATALOGUE:
+    post_save.connect(invalider_catalogue_signal, sender=_modele, dispatch_uid=f"catalogue_save_{_modele.__name__}")
+    post_delete.connect(invalider_catalogue_signal, sender=_modele, dispatch_uid=f"catalogue_delete_{_modele.__name__}")
 
-    if instance.partition:
-        if os.path.isfile(instance.partition.path):
-            os.remove(instance.partition.path)
 
 # ----------------------------
-# Suppression MP3 quand piste_audio supprimée
+# Révision des chants (ETag / Last-Modified)
 # ----------------------------
+def toucher_chants(chant_ids):
+    """
+    Marque des chants comme modifiés sans passer par save() (pas de signaux).
+    """
+    chant_ids = [cid for cid in chant_ids if cid]
+    if chant_ids:
+        chant.objects.filter(id__in=chant_ids).update(
+            revision=models.F("revision") + 1,
+            date_modification=timezone.now(),
+        )
+
+
+def enregistrer_et_invalider(chant_ids):
+    """
+    À appeler après des .update() touchant des chants (ou ce qu'ils
+    exposent), qui ne déclenchent pas les signaux de révision / cache :
+    nouvelle révision des chants et invalidation du catalogue.
+    """
+    toucher_chants(chant_ids)
+    invalider_catalogue()
+
+
+@receiver(pre_save, sender=chant)
+def incrementer_revision_chant(sender, instance, **kwargs):
+    instance.revision = (instance.revision or 0) + 1
+
+
+@receiver(post_save, sender=appartenir)
+@receiver(post_delete, sender=appartenir)
+@receiver(post_save, sender=piste_audio)
 @receiver(post_delete, sender=piste_audio)
-def delete_audio_file(sender, instance, **kwargs):
-    if instance.fichier_mp3:
-        if os.path.isfile(instance.fichier_mp3.path):
-            os.remove(instance.fichier_mp3.path)
+def toucher_chant_relation(sender, instance, **kwargs):
+    toucher_chants([instance.chant_id])
+
+
+@receiver(post_save, sender=noter)
+@receiver(post_delete, sender=noter)
+def toucher_chant_note(sender, instance, **kwargs):
+    toucher_chants(piste_audio.objects.filter(id=instance.piste_audio_id).values_list("chant_id", flat=True))
+
+
+@receiver(post_save, sender=demande_modification_chant)
+def toucher_chant_modification(sender, instance, **kwargs):
+    # Le drapeau a_ete_modifie dépend des modifications acceptées
+    if instance.statut == "ACCEPTEE":
+        toucher_chants([instance.chant_id])
+
+
+@receiver(post_save, sender=categorie)
+def toucher_chants_categorie(sender, instance, created, **kwargs):
+    # Renommage : le nom de la catégorie est sérialisé avec chaque chant
+    if created:
+        return
+    toucher_chants(appartenir.objects.filter(categorie=instance).values_list("chant_id", flat=True))
+
+
+@receiver(post_save, sender=utilisateur)
+def toucher_chants_utilisateur(sender, instance, created, **kwargs):
+    # Le pseudo de l'auteur / des contributeurs audio est sérialisé
+    if created:
+        return
+    chant_ids = set(chant.objects.filter(utilisateur=instance).values_list("id", flat=True))
+    chant_ids.update(piste_audio.objects.filter(utilisateur=instance).values_list("chant_id", flat=True))
+    toucher_chants(chant_ids)
+
+
+# ----------------------------
+# Nom normalisé + trigrammes
+# ----------------------------
+@receiver(pre_save, sender=chant)
+@receiver(pre_save, sender=demande_chant)
+def normaliser_nom_chant(sender, instance, **kwargs):
+    instance.nom_normalise = normaliser_nom(instance.nom_chant)
+
+
+def indexer_trigrammes_chant(chant_obj):
+    trigramme_chant.objects.filter(chant=chant_obj).delete()
+    trigramme_chant.objects.bulk_create([
+        trigramme_chant(trigramme=t, chant=chant_obj)
+        for t in trigrammes(chant_obj.nom_normalise)
+    ])
+
+
+@receiver(post_save, sender=chant)
+def maj_trigrammes_chant(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and "nom_chant" not in update_fields:
+        return
+    indexer_trigrammes_chant(instance)
+
+
+# ----------------------------
+# Index plein texte SQLite (FTS5)
+# ----------------------------
+# Sous MySQL l'index FULLTEXT est maintenu par le moteur. Sous SQLite, la
+# table chant_fts (migration 0005) est autonome et synchronisée ici.
+@receiver(post_save, sender=chant)
+def maj_index_plein_texte(sender, instance, update_fields=None, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    if update_fields is not None and not {"nom_chant", "auteur", "ville_origine", "paroles"} & set(update_fields):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM chant_fts WHERE rowid = %s", [instance.id])
+        cursor.execute(
+            "INSERT INTO chant_fts(rowid, nom_chant, auteur, ville_origine, paroles) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [instance.id, instance.nom_chant, instance.auteur or "", instance.ville_origine or "", instance.paroles or ""],
+        )
+
+
+@receiver(post_delete, sender=chant)
+def supprimer_index_plein_texte(sender, instance, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM chant_fts WHERE rowid = %s", [instance.id])
+
+
+@receiver(post_delete, sender=chant)
+def enregistrer_chant_supprime(sender, instance, **kwargs):
+    chant_supprime.objects.create(chant_id=instance.id)
+
+
+# ----------------------------
+# Déclinaisons des illustrations (gui/images.py)
+# ----------------------------
+ILLUSTRATIONS = (
+    (chant, "illustration_chant"),
+    (template_chansonnier, "illustration_template"),
+    (chansonnier_perso, "illustration_chansonnier"),
+)
+
+
+def decliner_illustration_signal(sender, instance, **kwargs):
+    champ = dict(ILLUSTRATIONS)[sender]
+    nom = getattr(instance, champ).name or ""
+    if (instance.illustration_derives or {}).get("source", "") == nom:
+        return
+    if not nom:
+        sender.objects.filter(pk=instance.pk).update(illustration_derives={})
+        return
+    transaction.on_commit(lambda: planifier_derives(sender, instance.pk, champ, nom))
+
+
+for _modele, _champ in ILLUSTRATIONS:
+    post_save.connect(decliner_illustration_signal, sender=_modele, dispatch_uid=f"derives_{_modele.__name__}")
+
+
+# ----------------------------
+# Métadonnées des MP3 (gui/audio.py)
+# ----------------------------
+MODELES_AUDIO = (piste_audio, demande_chant_audio, demande_piste_audio)
+
+
+def analyser_audio_signal(sender, instance, created, **kwargs):
+    # Les pistes promues reprennent les valeurs de la demande
+    if created and instance.fichier_mp3 and instance.duree is None:
+        nom = instance.fichier_mp3.name
+        transaction.on_commit(lambda: planifier_analyse(sender, instance.pk, nom))
+
+
+for _modele in MODELES_AUDIO:
+    post_save.connect(analyser_audio_signal, sender=_modele, dispatch_uid=f"audio_{_modele.__name__}")
+
+
+# ----------------------------
+# Pages et aperçu des PDF (gui/documents.py)
+# ----------------------------
+MODELES_PDF = (chant, demande_chant, demande_modification_chant)
+
+
+def decrire_pdfs_signal(sender, instance, **kwargs):
+    infos = dict(instance.pdf_infos or {})
+    a_decrire = []
+    for champ in CHAMPS_PDF:
+        nom = getattr(instance, champ).name or ""
+        if not nom:
+            infos.pop(champ, None)
+        elif infos.get(champ, {}).get("source") != nom:
+            a_decrire.append((champ, nom))
+    if infos != (instance.pdf_infos or {}):
+        # Fichier retiré : ses infos disparaissent
+        sender.objects.filter(pk=instance.pk).update(pdf_infos=infos)
+        instance.pdf_infos = infos
+    if a_decrire:
+        transaction.on_commit(lambda: planifier_description(sender, instance.pk, a_decrire))
+
+
+for _modele in MODELES_PDF:
+    post_save.connect(decrire_pdfs_signal, sender=_modele, dispatch_uid=f"pdf_{_modele.__name__}")
 
 
 # ================================================================================
@@ -608,7 +1073,7 @@ class demande_support(models.Model):
         return f"[{self.utilisateur.pseudo}] {self.objet}"
 
 
-class piece_jointe_support(models.Model):
+class piece_jointe_support(modele_fichiers):
     demande = models.ForeignKey(
         demande_support,
         on_delete=models.CASCADE,
@@ -619,3 +1084,95 @@ class piece_jointe_support(models.Model):
 
     def __str__(self):
         return f"PJ #{self.id} pour demande #{self.demande_id}"
+
+
+# ================================================================================
+#                         ENVOIS PAR BLOCS (REPRISE POSSIBLE)
+# ================================================================================
+
+class televersement(models.Model):
+    """Envoi par blocs d'un gros fichier, repris à `recu` (gui/televersements.py)."""
+    CIBLES = (
+        ("piste_audio", "Piste audio"),
+        ("demande_chant_audio", "Audio d'une demande de chant"),
+        ("demande_piste_audio", "Demande de piste audio"),
+        ("piece_jointe_support", "Pièce jointe support"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    utilisateur = models.ForeignKey(
+        "utilisateur",
+        on_delete=models.CASCADE,
+        related_name="televersements",
+    )
+    cible = models.CharField(max_length=30, choices=CIBLES)
+    # chant_id / demande_id selon la cible
+    parametres = models.JSONField(default=dict, blank=True)
+    nom_fichier = models.CharField(max_length=255)
+    taille = models.PositiveBigIntegerField()
+    recu = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = "televersement"
+
+    def __str__(self):
+        return f"Envoi {self.id} ({self.recu}/{self.taille})"
+
+
+# ----------------------------
+# Fichier remplacé : l'ancien est libéré (gui/stockage.py)
+# ----------------------------
+MODELES_FICHIERS = (
+    chant,
+    piste_audio,
+    demande_chant,
+    demande_chant_audio,
+    demande_modification_chant,
+    demande_piste_audio,
+    template_chansonnier,
+    chansonnier_perso,
+    piece_jointe_support,
+)
+
+
+def _champs_fichiers(modele, update_fields=None):
+    return [
+        champ.attname
+        for champ in modele._meta.concrete_fields
+        if isinstance(champ, models.FileField)
+        and (update_fields is None or champ.name in update_fields)
+    ]
+
+
+def memoriser_fichiers_signal(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._fichiers_avant = {}
+    champs = _champs_fichiers(sender, update_fields)
+    if raw or not champs or instance._state.adding or instance.pk is None:
+        return
+    instance._fichiers_avant = sender.objects.filter(pk=instance.pk).values(*champs).first() or {}
+
+
+def liberer_fichiers_signal(sender, instance, raw=False, **kwargs):
+    for champ, ancien in getattr(instance, "_fichiers_avant", {}).items():
+        if ancien and ancien != (getattr(instance, champ).name or ""):
+            storage = sender._meta.get_field(champ).storage
+            # Après validation : un enregistrement annulé garde son fichier
+            transaction.on_commit(lambda storage=storage, ancien=ancien: storage.delete(ancien))
+    instance._fichiers_avant = {}
+
+
+def supprimer_fichiers_signal(sender, instance, **kwargs):
+    # Le fichier n'est effacé que s'il n'est plus référencé (gui/stockage.py)
+    for champ in _champs_fichiers(sender):
+        supprimer_fichier(getattr(instance, champ))
+
+
+for _modele in MODELES_FICHIERS:
+    pre_save.connect(memoriser_fichiers_signal, sender=_modele, dispatch_uid=f"fichiers_avant_{_modele.__name__}")
+    post_save.connect(liberer_fichiers_signal, sender=_modele, dispatch_uid=f"fichiers_apres_{_modele.__name__}")
+    post_delete.connect(
+        supprimer_fichiers_signal, sender=_modele, dispatch_uid=f"fichiers_supprimes_{_modele.__name__}"
+    )
@@ -0,0 +1,49 @@
+"""
+Normalisation des noms de chants (accents, casse, ponctuation) et trigrammes
+utilisés pour l'autocomplétion et la détection de doublons.
+"""
+import re
+import unicodedata
+
+
+NON_ALPHANUM_RE = re.compile(r"[^0-9a-z]+")
+
+
+def replier(texte):
+    """
+    Minuscules sans accents, caractère par caractère : la chaîne repliée a
+    la même longueur que l'originale, ce qui permet de reporter les positions.
+    """
+    return "".join(unicodedata.normalize("NFD", ch)[0].lower() for ch in texte)
+
+
+def normaliser_nom(nom):
+    """
+    « L'Chant des Étudiants ! » -> « l chant des etudiants »
+    """
+    return " ".join(NON_ALPHANUM_RE.split(replier(nom or ""))).strip()
+
+
+def trigrammes(nom_normalise, prefixe=False):
+    """
+    Trigrammes à la manière de pg_trgm : chaque mot est complété par deux
+    espaces devant et un derrière. Avec `prefixe`, le dernier mot est
+    considéré comme incomplet (saisie en cours) et n'est pas fermé.
+    """
+    resultat = set()
+    mots = nom_normalise.split()
+    for i, mot in enumerate(mots):
+        fin = "" if prefixe and i == len(mots) - 1 else " "
+        mot = f"  {mot}{fin}"
+        for j in range(len(mot) - 2):
+            resultat.add(mot[j:j + 3])
+    return resultat
+
+
+def similarite(a, b):
+    """
+    Indice de Jaccard entre deux ensembles de trigrammes.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,155 @@
+"""
+Ramasse-miettes des médias orphelins.
+
+Un fichier reste sous MEDIA_ROOT quand l'objet qui le référençait disparaît
+sans passer par les signaux (suppression en masse, demande refusée,
+processus interrompu...). Le nettoyage part des FileField de l'application : tout
+fichier des dossiers gérés (upload_to des champs, cas/, derives/) que plus
+aucune ligne ne référence, et plus ancien que le délai de grâce, est effacé.
+
+- cas/ : la ligne fichier_media est relue sous verrou juste avant
+  l'effacement ; un contenu référencé depuis moins que le délai (envoi en
+  cours, pas encore enregistré) est gardé, sinon ligne et fichier partent
+  même si le compteur était resté positif ;
+- derives/<clé>/ : gardé tant que la source de cette clé est référencée ;
+- cas/tmp/ : restes d'écritures interrompues, effacés après le délai.
+
+L'âge d'un fichier est max(mtime, ctime) : un lien physique ou un
+déplacement récent (promouvoir_fichier, envoi par blocs) le rajeunit.
+
+parcourir ne touche pas à la base : le parcours des gros dossiers se fait
+dans un pool de processus (commande nettoyer_medias).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.db import transaction
+
+from .images import DOSSIER_DERIVES, cle_derives
+from .stockage import PREFIXE_CAS, champs_fichiers, est_contenu
+
+
+def parcourir(racine, dossier, recursif=True):
+    """[(nom relatif, taille, date)] des fichiers de racine/`dossier`."""
+    fichiers = []
+    base = os.path.join(racine, dossier)
+    for parent, sous_dossiers, noms in os.walk(base):
+        if not recursif:
+            sous_dossiers.clear()
+        sous_dossiers[:] = [d for d in sous_dossiers if not d.startswith(".")]
+        for nom in noms:
+            if nom.startswith("."):
+                continue
+            chemin = os.path.join(parent, nom)
+            try:
+                stat = os.lstat(chemin)
+            except OSError:
+                continue
+            relatif = os.path.relpath(chemin, racine).replace(os.sep, "/")
+            fichiers.append((relatif, stat.st_size, max(stat.st_mtime, stat.st_ctime)))
+    return fichiers
+
+
+def dossiers_geres():
+    """Dossiers de premier niveau de MEDIA_ROOT alimentés par les FileField."""
+    dossiers = {PREFIXE_CAS, DOSSIER_DERIVES}
+    for modele, nom_champ in champs_fichiers():
+        upload_to = modele._meta.get_field(nom_champ).upload_to
+        if isinstance(upload_to, str) and upload_to.strip("/"):
+            dossiers.add(upload_to.strip("/").split("/")[0])
+    return sorted(dossiers)
+
+
+def noms_references():
+    """Tous les noms de fichiers présents dans un FileField."""
+    noms = set()
+    for modele, nom_champ in champs_fichiers():
+        noms.update(
+            modele.objects.exclude(**{nom_champ: ""})
+            .exclude(**{f"{nom_champ}__isnull": True})
+            .values_list(nom_champ, flat=True)
+            .iterator()
+        )
+    return noms
+
+
+def _unites(racine, dossiers):
+    """Découpe du parcours : (dossier, récursif), un par sous-dossier."""
+    unites = []
+    for dossier in dossiers:
+        base = os.path.join(racine, dossier)
+        if not os.path.isdir(base):
+            continue
+        unites.append((dossier, False))
+        with os.scandir(base) as entrees:
+            for entree in entrees:
+                if entree.is_dir(follow_symlinks=False) and not entree.name.startswith("."):
+                    unites.append((f"{dossier}/{entree.name}", True))
+    return unites
+
+
+def chercher_orphelins(racine, references, limite, processus=1):
+    """
+    [(nom, taille)] des fichiers non référencés et plus anciens que `limite`
+    (datetime).
+    """
+    limite = limite.timestamp()
+    cles = {cle_derives(nom) for nom in references}
+    unites = _unites(racine, dossiers_geres())
+
+    if processus > 1 and len(unites) > 1:
+        with ProcessPoolExecutor(max_workers=processus) as pool:
+            listes = list(pool.map(
+                parcourir, [racine] * len(unites), *zip(*unites), chunksize=16,
+            ))
+    else:
+        listes = [parcourir(racine, dossier, recursif) for dossier, recursif in unites]
+
+    orphelins = []
+    for fichiers in listes:
+        for nom, taille, date in fichiers:
+            if date >= limite or nom in references:
+                continue
+            if nom.startswith(f"{DOSSIER_DERIVES}/") and nom.split("/")[1] in cles:
+                continue
+            orphelins.append((nom, taille))
+    return orphelins
+
+
+def supprimer_orphelin(racine, nom, limite, simulation=False):
+    """
+    Efface `nom` (non référencé par les FileField) ; retourne False s'il est
+    gardé : contenu cas/ référencé depuis `limite` (envoi en cours).
+    """
+    if not est_contenu(nom):
+        if not simulation:
+            _effacer(racine, nom)
+        return True
+
+    fichier_media = apps.get_model("gui", "fichier_media")
+    with transaction.atomic():
+        lignes = fichier_media.objects.filter(nom=nom)
+        ligne = (lignes if simulation else lignes.select_for_update()).first()
+        if ligne is not None and ligne.date_reference >= limite:
+            return False
+        if not simulation:
+            # Compteur resté positif (libération perdue) : faux
+            if ligne is not None:
+                ligne.delete()
+            _effacer(racine, nom)
+    return True
+
+
+def _effacer(racine, nom):
+    chemin = os.path.join(racine, *nom.split("/"))
+    try:
+        os.remove(chemin)
+    except FileNotFoundError:
+        return
+    if nom.startswith(f"{DOSSIER_DERIVES}/"):
+        # Dossier de déclinaisons vidé : retiré aussi
+        try:
+            os.rmdir(os.path.dirname(chemin))
+        except OSError:
+            pass
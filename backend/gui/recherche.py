@@ -0,0 +1,288 @@
+"""
+Recherche plein texte dans le catalogue des chants.
+
+- MySQL  : index FULLTEXT sur chant (migration 0005) + MATCH ... AGAINST.
+- SQLite : table virtuelle FTS5 `chant_fts` (index inversé) tenue à jour
+           par les signaux de gui.models (migration 0005).
+- Autre  : repli sur des filtres icontains (sans index).
+
+Autocomplétion et doublons : préfixe sur chant.nom_normalise (index B-tree)
++ correspondances approchées via l'index de trigrammes `trigramme_chant`.
+"""
+import html
+import math
+import re
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import chant, demande_chant, trigramme_chant
+from .normalisation import normaliser_nom, replier, similarite, trigrammes
+
+
+MOTS_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TERMES = 10
+
+# Longueur minimale indexée par InnoDB (innodb_ft_min_token_size)
+MYSQL_TAILLE_MIN_TERME = 3
+
+# Nombre maximum de candidats lus dans l'index de trigrammes
+TRIGRAMMES_CANDIDATS_MAX = 200
+# Part minimale des trigrammes de la saisie présents dans le nom
+SEUIL_AUTOCOMPLETION = 0.5
+# Similarité (Jaccard) au-delà de laquelle deux noms sont des doublons
+SEUIL_DOUBLON = 0.75
+
+# Poids des colonnes : nom_chant, auteur, ville_origine, paroles
+POIDS_FTS5 = (10.0, 3.0, 3.0, 1.0)
+POIDS_MYSQL_NOM = 4
+
+
+def extraire_termes(q):
+    termes = []
+    for mot in MOTS_RE.findall(replier(q or "")):
+        if mot not in termes:
+            termes.append(mot)
+    return termes[:MAX_TERMES]
+
+
+def _filtre_categories(categories, colonne):
+    if not categories:
+        return "", []
+    marqueurs = ", ".join(["%s"] * len(categories))
+    sql = (
+        f" AND {colonne} IN ("
+        "SELECT a.chant_id FROM appartenir a "
+        "INNER JOIN categories cat ON cat.id = a.categorie_id "
+        f"WHERE cat.nom_categorie IN ({marqueurs}))"
+    )
+    return sql, list(categories)
+
+
+def _rechercher_mysql(termes, categories, limite, decalage):
+    termes = [t for t in termes if len(t) >= MYSQL_TAILLE_MIN_TERME]
+    if not termes:
+        return []
+    requete = " ".join(f"+{t}*" for t in termes)
+    filtre, params_filtre = _filtre_categories(categories, "c.id")
+    sql = (
+        "SELECT c.id, "
+        f"{POIDS_MYSQL_NOM} * MATCH(c.nom_chant) AGAINST (%s IN BOOLEAN MODE) "
+        "+ MATCH(c.nom_chant, c.auteur, c.ville_origine, c.paroles) AGAINST (%s IN BOOLEAN MODE) AS score "
+        "FROM chant c "
+        "WHERE MATCH(c.nom_chant, c.auteur, c.ville_origine, c.paroles) AGAINST (%s IN BOOLEAN MODE)"
+        f"{filtre} "
+        "ORDER BY score DESC, c.id "
+        "LIMIT %s OFFSET %s"
+    )
+    params = [requete, requete, requete, *params_filtre, limite, decalage]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row[0], float(row[1])) for row in cursor.fetchall()]
+
+
+def _rechercher_sqlite(termes, categories, limite, decalage):
+    # Chaque terme est cité pour neutraliser la syntaxe FTS5, "*" = préfixe
+    requete = " ".join('"{}"*'.format(t.replace('"', '""')) for t in termes)
+    poids = ", ".join(str(p) for p in POIDS_FTS5)
+    filtre, params_filtre = _filtre_categories(categories, "chant_fts.rowid")
+    sql = (
+        f"SELECT chant_fts.rowid, bm25(chant_fts, {poids}) AS score "
+        "FROM chant_fts WHERE chant_fts MATCH %s"
+        f"{filtre} "
+        "ORDER BY score, chant_fts.rowid "
+        "LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [requete, *params_filtre, limite, decalage])
+        # bm25 : plus petit = plus pertinent
+        return [(row[0], -float(row[1])) for row in cursor.fetchall()]
+
+
+def _rechercher_generique(termes, categories, limite, decalage):
+    qs = chant.objects.all()
+    for terme in termes:
+        qs = qs.filter(
+            Q(nom_chant__icontains=terme)
+            | Q(auteur__icontains=terme)
+            | Q(ville_origine__icontains=terme)
+            | Q(paroles__icontains=terme)
+        )
+    if categories:
+        qs = qs.filter(categories_associees__categorie__nom_categorie__in=categories).distinct()
+    ids = qs.order_by("nom_chant", "id").values_list("id", flat=True)[decalage:decalage + limite]
+    return [(chant_id, 1.0) for chant_id in ids]
+
+
+def rechercher_chants(termes, categories=None, limite=20, decalage=0):
+    """
+    Retourne une liste [(chant_id, score)] triée par pertinence décroissante.
+    """
+    if not termes:
+        return []
+    if connection.vendor == "mysql":
+        return _rechercher_mysql(termes, categories, limite, decalage)
+    if connection.vendor == "sqlite":
+        return _rechercher_sqlite(termes, categories, limite, decalage)
+    return _rechercher_generique(termes, categories, limite, decalage)
+
+
+def extrait_surligne(texte, termes, largeur=160):
+    """
+    Extrait de `texte` centré sur la première occurrence d'un terme, échappé
+    en HTML, avec les occurrences entourées de <mark>.
+    """
+    if not texte:
+        return ""
+    if not termes:
+        return html.escape(texte[:largeur])
+
+    motif = re.compile(r"\b(?:" + "|".join(re.escape(t) for t in termes) + r")\w*")
+    replie = replier(texte)
+    premier = motif.search(replie)
+
+    debut = 0
+    if premier is not None:
+        debut = max(0, premier.start() - largeur // 3)
+        # Ne pas couper un mot en début d'extrait
+        espace = texte.rfind(" ", 0, debut)
+        if debut and espace != -1 and debut - espace < 20:
+            debut = espace + 1
+    fin = min(len(texte), debut + largeur)
+
+    morceaux = []
+    position = debut
+    for m in motif.finditer(replie, debut, fin):
+        morceaux.append(html.escape(texte[position:m.start()]))
+        morceaux.append(f"<mark>{html.escape(texte[m.start():m.end()])}</mark>")
+        position = m.end()
+    morceaux.append(html.escape(texte[position:fin]))
+
+    extrait = "".join(morceaux).replace("\n", " ")
+    if debut > 0:
+        extrait = "…" + extrait
+    if fin < len(texte):
+        extrait += "…"
+    return extrait
+
+
+# ----------- Autocomplétion / doublons -----------
+
+def _candidats_trigrammes(trigrammes_requete, communs_min):
+    """
+    {chant_id: nb de trigrammes communs} pour les chants partageant au moins
+    `communs_min` trigrammes avec la requête.
+    """
+    lignes = (
+        trigramme_chant.objects
+        .filter(trigramme__in=trigrammes_requete)
+        .values("chant_id")
+        .annotate(communs=Count("id"))
+        .filter(communs__gte=max(1, communs_min))
+        .order_by("-communs", "chant_id")[:TRIGRAMMES_CANDIDATS_MAX]
+    )
+    return {ligne["chant_id"]: ligne["communs"] for ligne in lignes}
+
+
+def autocompleter_chants(q, limite=10):
+    """
+    Retourne [{"id", "nom_chant", "correspondance", "score"}] : d'abord les
+    noms qui commencent par la saisie, puis les correspondances approchées.
+    """
+    nom = normaliser_nom(q)
+    if not nom:
+        return []
+
+    resultats = [
+        {"id": chant_id, "nom_chant": nom_chant, "correspondance": "prefixe", "score": 1.0}
+        for chant_id, nom_chant in (
+            chant.objects.filter(nom_normalise__startswith=nom)
+            .order_by("nom_normalise", "id")
+            .values_list("id", "nom_chant")[:limite]
+        )
+    ]
+    if len(resultats) >= limite:
+        return resultats
+
+    requete = trigrammes(nom, prefixe=True)
+    candidats = _candidats_trigrammes(requete, math.ceil(SEUIL_AUTOCOMPLETION * len(requete)))
+    deja = {r["id"] for r in resultats}
+    approches = []
+    for chant_id, nom_chant in chant.objects.filter(id__in=candidats).values_list("id", "nom_chant"):
+        if chant_id in deja:
+            continue
+        score = candidats[chant_id] / len(requete)
+        if score >= SEUIL_AUTOCOMPLETION:
+            approches.append((score, nom_chant, chant_id))
+    approches.sort(key=lambda a: (-a[0], a[1], a[2]))
+
+    for score, nom_chant, chant_id in approches[:limite - len(resultats)]:
+        resultats.append({
+            "id": chant_id,
+            "nom_chant": nom_chant,
+            "correspondance": "approx",
+            "score": round(score, 3),
+        })
+    return resultats
+
+
+def _plus_proche(requete, objets):
+    """Objet de `objets` le plus similaire à `requete` au-delà du seuil, sinon None."""
+    meilleur, meilleur_score = None, 0.0
+    for objet in objets:
+        score = similarite(requete, trigrammes(objet.nom_normalise))
+        if score >= SEUIL_DOUBLON and score > meilleur_score:
+            meilleur, meilleur_score = objet, score
+    return meilleur
+
+
+def _communs_min_doublon(requete):
+    # Jaccard >= seuil impose au moins seuil * |requête| trigrammes communs
+    return math.ceil(SEUIL_DOUBLON * len(requete))
+
+
+def trouver_doublon_chant(nom_chant, exclure_id=None):
+    """
+    Chant existant dont le nom normalisé est identique ou quasi identique
+    (fautes de frappe, accents, ponctuation) à `nom_chant`, sinon None.
+    """
+    nom = normaliser_nom(nom_chant)
+    if not nom:
+        return None
+
+    qs = chant.objects.all()
+    if exclure_id is not None:
+        qs = qs.exclude(id=exclure_id)
+
+    exact = qs.filter(nom_normalise=nom).only("id", "nom_chant").first()
+    if exact is not None:
+        return exact
+
+    requete = trigrammes(nom)
+    candidats = _candidats_trigrammes(requete, _communs_min_doublon(requete))
+    return _plus_proche(requete, qs.filter(id__in=candidats).only("id", "nom_chant", "nom_normalise"))
+
+
+def trouver_doublon_demande(nom_chant):
+    """
+    Demande en attente dont le nom est identique ou quasi identique à
+    `nom_chant`, sinon None. Même critère que trouver_doublon_chant ; les
+    demandes en attente, peu nombreuses, n'ont pas d'index de trigrammes :
+    le préfiltre sur le nombre de trigrammes communs se fait ici.
+    """
+    nom = normaliser_nom(nom_chant)
+    if not nom:
+        return None
+
+    qs = demande_chant.objects.filter(statut="EN_ATTENTE").order_by("id")
+    exact = qs.filter(nom_normalise=nom).only("id", "nom_chant").first()
+    if exact is not None:
+        return exact
+
+    requete = trigrammes(nom)
+    communs_min = _communs_min_doublon(requete)
+    candidats = [
+        d for d in qs.only("id", "nom_chant", "nom_normalise").iterator()
+        if len(requete & trigrammes(d.nom_normalise)) >= communs_min
+    ]
+    return _plus_proche(requete, candidats)
@@ -0,0 +1,132 @@
+"""
+Recommandations « ceux qui ont mis ce chant en favori ont aussi aimé »,
+complétées par le recouvrement des catégories (appartenir).
+
+Calcul hors ligne (commande recalculer_similaires) : matrice de
+co-occurrence creuse des favoris, stockée comme {chant: Counter(chant)},
+puis les TOP_K meilleurs voisins de chaque chant sont écrits dans
+chant_similaire. La lecture en ligne est une seule requête indexée.
+
+score = POIDS_FAVORIS * cosinus(favoris) + POIDS_CATEGORIES * jaccard(catégories)
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import appartenir, chant, chant_similaire, favoris
+
+
+TOP_K = 20
+POIDS_FAVORIS = 0.8
+POIDS_CATEGORIES = 0.2
+
+# Chants les plus mis en favoris de chaque catégorie, proposés comme
+# candidats aux chants qui ont peu (ou pas) de co-occurrences
+POPULAIRES_PAR_CATEGORIE = 50
+
+
+def calculer_similaires(favoris_par_utilisateur, categories_par_chant, populaires_par_categorie, k=TOP_K):
+    """
+    Calcul pur (sans base de données), aussi utilisé par le benchmark.
+
+    favoris_par_utilisateur  : itérable de collections de chant_id
+    categories_par_chant     : {chant_id: frozenset(categorie_id)}
+    populaires_par_categorie : {categorie_id: [chant_id, ...]}
+    Retourne {chant_id: [(score, similaire_id), ...]} trié par score décroissant.
+    """
+    # Ligne a de la matrice : Counter.update compte tous les favoris de
+    # l'utilisateur en C ; la diagonale [a][a] est le nombre de favoris de a.
+    cooccurrences = defaultdict(Counter)
+    for chants in favoris_par_utilisateur:
+        chants = set(chants)
+        for a in chants:
+            cooccurrences[a].update(chants)
+    normes = {a: math.sqrt(ligne[a]) for a, ligne in cooccurrences.items()}
+
+    # Catégories en masque de bits : jaccard = popcount(a & b) / popcount(a | b)
+    bits = {}
+    masques = {
+        chant_id: sum(1 << bits.setdefault(cat, len(bits)) for cat in cats)
+        for chant_id, cats in categories_par_chant.items()
+    }
+
+    vide = frozenset()
+    resultats = {}
+    for chant_id in set(categories_par_chant) | set(cooccurrences):
+        voisins = cooccurrences.get(chant_id, {})
+        cats = categories_par_chant.get(chant_id, vide)
+        masque = masques.get(chant_id, 0)
+
+        candidats = set(voisins)
+        for cat in cats:
+            candidats.update(populaires_par_categorie.get(cat, ()))
+        candidats.discard(chant_id)
+
+        norme = normes.get(chant_id)
+        scores = []
+        for autre in candidats:
+            cos = 0.0
+            commun = voisins.get(autre)
+            if commun:
+                cos = commun / (norme * normes[autre])
+            jaccard = 0.0
+            autre_masque = masques.get(autre, 0)
+            if masque and autre_masque:
+                jaccard = (masque & autre_masque).bit_count() / (masque | autre_masque).bit_count()
+            score = POIDS_FAVORIS * cos + POIDS_CATEGORIES * jaccard
+            if score > 0:
+                # Égalités départagées par l'id (résultat déterministe)
+                scores.append((score, -autre))
+
+        if scores:
+            resultats[chant_id] = [(score, -moins_id) for score, moins_id in heapq.nlargest(k, scores)]
+    return resultats
+
+
+def _charger():
+    favoris_par_utilisateur = defaultdict(list)
+    for utilisateur_id, chant_id in favoris.objects.values_list("utilisateur_id", "chant_id").iterator(chunk_size=5000):
+        favoris_par_utilisateur[utilisateur_id].append(chant_id)
+
+    categories = defaultdict(set)
+    for chant_id, categorie_id in appartenir.objects.values_list("chant_id", "categorie_id").iterator(chunk_size=5000):
+        categories[chant_id].add(categorie_id)
+    categories_par_chant = {chant_id: frozenset(cats) for chant_id, cats in categories.items()}
+
+    populaires = defaultdict(list)
+    lignes = (
+        appartenir.objects.filter(chant__nb_favoris__gt=0)
+        .order_by("categorie_id", "-chant__nb_favoris", "chant_id")
+        .values_list("categorie_id", "chant_id")
+    )
+    for categorie_id, chant_id in lignes.iterator(chunk_size=5000):
+        if len(populaires[categorie_id]) < POPULAIRES_PAR_CATEGORIE and chant_id not in populaires[categorie_id]:
+            populaires[categorie_id].append(chant_id)
+
+    return favoris_par_utilisateur.values(), categories_par_chant, populaires
+
+
+def recalculer_similaires(k=TOP_K):
+    """
+    Reconstruit entièrement chant_similaire. Retourne le nombre de lignes.
+    """
+    resultats = calculer_similaires(*_charger(), k=k)
+
+    with transaction.atomic():
+        # Ignore les chants supprimés pendant le calcul
+        existants = set(chant.objects.values_list("id", flat=True))
+        lignes = []
+        for chant_id, voisins in resultats.items():
+            if chant_id not in existants:
+                continue
+            voisins = [(score, autre) for score, autre in voisins if autre in existants]
+            lignes.extend(
+                chant_similaire(chant_id=chant_id, similaire_id=autre, rang=rang, score=score)
+                for rang, (score, autre) in enumerate(voisins, start=1)
+            )
+
+        chant_similaire.objects.all().delete()
+        chant_similaire.objects.bulk_create(lignes, batch_size=1000)
+    return len(lignes)
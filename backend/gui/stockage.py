@@ -0,0 +1,302 @@
+"""
+Gestion des fichiers médias (FileField) côté stockage.
+
+StockageDedup : stockage par défaut (settings.STORAGES). Chaque fichier est
+enregistré une seule fois sous MEDIA_ROOT/cas/<aa>/<sha256><ext>, quel que
+soit le champ qui l'envoie ; la table fichier_media compte les références.
+Un même MP3 envoyé comme demande puis comme piste n'occupe qu'une place, et
+le fichier n'est effacé qu'à la disparition de sa dernière référence.
+
+promouvoir_fichier : attache à un objet du catalogue le fichier d'une
+demande acceptée sans le relire en mémoire. Avec StockageDedup c'est une
+simple référence de plus ; sinon lien physique (même inode) et, à défaut
+(stockage distant, autre système de fichiers), copie par blocs.
+"""
+import hashlib
+import os
+import tempfile
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+
+PREFIXE_CAS = "cas"
+
+# Tentatives si un autre processus prend le même nom entre-temps
+ESSAIS_NOM_LIBRE = 5
+TAILLE_BLOC_HACHAGE = 1024 * 1024
+
+
+def est_contenu(nom):
+    """Vrai si `nom` désigne un fichier adressé par son contenu."""
+    return bool(nom) and nom.startswith(PREFIXE_CAS + "/")
+
+
+def nom_contenu(empreinte, nom_original):
+    extension = os.path.splitext(nom_original or "")[1].lower()[:10]
+    return f"{PREFIXE_CAS}/{empreinte[:2]}/{empreinte}{extension}"
+
+
+def referencer(nom, taille=0):
+    """
+    Ajoute une référence au contenu `nom` (crée la ligne au besoin). Appelée
+    pendant save() : la référence est validée ou annulée avec la ligne
+    propriétaire (les modèles à fichiers enregistrent en transaction).
+    """
+    fichier_media = apps.get_model("gui", "fichier_media")
+    # Mise à jour d'abord : attend le verrou d'un effacement en cours
+    # (_effacer_si_orphelin) ; si la ligne a disparu, elle est recréée
+    for _ in range(ESSAIS_NOM_LIBRE):
+        if fichier_media.objects.filter(nom=nom).update(
+            nb_references=models.F("nb_references") + 1, date_reference=timezone.now()
+        ):
+            return
+        try:
+            with transaction.atomic():
+                fichier_media.objects.create(nom=nom, taille=taille, nb_references=1)
+            return
+        except IntegrityError:
+            # Créée entre-temps par un envoi concurrent : on l'incrémente
+            continue
+    raise IntegrityError(f"Référence impossible à poser sur {nom}")
+
+
+class StockageDedup(FileSystemStorage):
+    """
+    FileSystemStorage adressé par contenu (SHA-256) avec comptage des
+    références. Les noms hors de cas/ (fichiers antérieurs) restent servis
+    et supprimés comme avant.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu : choisi par _save
+        return name
+
+    def _save(self, name, content):
+        if hasattr(content, "temporary_file_path"):
+            return self._save_fichier_temporaire(name, content)
+
+        dossier_tmp = self.path(f"{PREFIXE_CAS}/tmp")
+        os.makedirs(dossier_tmp, exist_ok=True)
+        descripteur, temporaire = tempfile.mkstemp(dir=dossier_tmp)
+        try:
+            empreinte = hashlib.sha256()
+            taille = 0
+            with os.fdopen(descripteur, "wb") as sortie:
+                for bloc in content.chunks():
+                    empreinte.update(bloc)
+                    sortie.write(bloc)
+                    taille += len(bloc)
+
+            nom = nom_contenu(empreinte.hexdigest(), name)
+            # Référence posée avant l'écriture : une suppression concurrente
+            # du même contenu voit la ligne et garde le fichier
+            referencer(nom, taille)
+            cible = self.path(nom)
+            if os.path.exists(cible):
+                os.remove(temporaire)
+            else:
+                os.makedirs(os.path.dirname(cible), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporaire, self.file_permissions_mode)
+                os.replace(temporaire, cible)
+        except BaseException:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+            raise
+        return nom
+
+    def _save_fichier_temporaire(self, name, content):
+        """
+        Fichier déjà sur disque (envoi au-delà de FILE_UPLOAD_MAX_MEMORY_SIZE,
+        envoi par blocs) : empreinte par simple lecture (ou fournie par
+        `content.sha256`), puis déplacement, sans recopie.
+        """
+        source = content.temporary_file_path()
+        empreinte = getattr(content, "sha256", None)
+        if empreinte is None:
+            calcul = hashlib.sha256()
+            with open(source, "rb") as f:
+                for bloc in iter(lambda: f.read(TAILLE_BLOC_HACHAGE), b""):
+                    calcul.update(bloc)
+            empreinte = calcul.hexdigest()
+
+        nom = nom_contenu(empreinte, name)
+        referencer(nom, os.path.getsize(source))
+        cible = self.path(nom)
+        if not os.path.exists(cible):
+            os.makedirs(os.path.dirname(cible), exist_ok=True)
+            try:
+                file_move_safe(source, cible)
+            except FileExistsError:
+                # Même contenu déposé entre-temps par une autre requête
+                return nom
+            if self.file_permissions_mode is not None:
+                os.chmod(cible, self.file_permissions_mode)
+        return nom
+
+    def delete(self, name):
+        if not est_contenu(name):
+            return super().delete(name)
+
+        fichier_media = apps.get_model("gui", "fichier_media")
+        with transaction.atomic():
+            ligne = fichier_media.objects.select_for_update().filter(nom=name).first()
+            if ligne is None:
+                # Contenu inconnu : laissé à recalculer_references_medias
+                return
+            fichier_media.objects.filter(pk=ligne.pk).update(
+                nb_references=models.F("nb_references") - 1
+            )
+            if ligne.nb_references > 1:
+                return
+        # Ligne gardée à 0 jusqu'à l'effacement : un envoi du même contenu
+        # d'ici là la reprend (referencer) et le fichier reste
+        transaction.on_commit(lambda: self._effacer_si_orphelin(name))
+
+    def _effacer_si_orphelin(self, name):
+        fichier_media = apps.get_model("gui", "fichier_media")
+        with transaction.atomic():
+            ligne = fichier_media.objects.select_for_update().filter(nom=name).first()
+            if ligne is None or ligne.nb_references > 0:
+                return
+            ligne.delete()
+            # Sous verrou : un referencer concurrent attend puis recrée la
+            # ligne, et _save réécrit le fichier absent
+            super().delete(name)
+
+
+def supprimer_fichier(field_file):
+    """Libère le fichier d'un FileField (retire une référence si dédupliqué)."""
+    if field_file and field_file.name:
+        field_file.storage.delete(field_file.name)
+
+
+def _chemin_local(storage, nom):
+    if not isinstance(storage, FileSystemStorage):
+        return None
+    try:
+        return storage.path(nom)
+    except NotImplementedError:
+        return None
+
+
+def _lier(source, storage, nom, max_length):
+    """Crée un lien physique ; retourne le nom enregistré ou None."""
+    for _ in range(ESSAIS_NOM_LIBRE):
+        nom_libre = storage.get_available_name(nom, max_length=max_length)
+        cible = storage.path(nom_libre)
+        os.makedirs(os.path.dirname(cible), exist_ok=True)
+        try:
+            os.link(source, cible)
+        except FileExistsError:
+            continue
+        except OSError:
+            # Autre système de fichiers, liens non supportés...
+            return None
+        if storage.file_permissions_mode is not None:
+            os.chmod(cible, storage.file_permissions_mode)
+        return nom_libre
+    return None
+
+
+def promouvoir_fichier(field_file, instance, nom_champ):
+    """
+    Attache le fichier de `field_file` au champ `nom_champ` de `instance`
+    (sans sauvegarder l'instance). Mémoire constante : référence partagée,
+    lien physique ou copie en flux par blocs. Retourne False si la source
+    est vide ou absente.
+    """
+    if not field_file or not field_file.name:
+        return False
+
+    champ = instance._meta.get_field(nom_champ)
+    storage = champ.storage
+    dedup = isinstance(storage, StockageDedup)
+
+    if dedup and est_contenu(field_file.name) and isinstance(field_file.storage, StockageDedup):
+        if not storage.exists(field_file.name):
+            return False
+        referencer(field_file.name)
+        setattr(instance, nom_champ, field_file.name)
+        return True
+
+    nom = champ.generate_filename(instance, os.path.basename(field_file.name))
+    source = _chemin_local(field_file.storage, field_file.name)
+    if not dedup and source is not None and _chemin_local(storage, nom) is not None:
+        if not os.path.exists(source):
+            return False
+        nom_lie = _lier(source, storage, nom, champ.max_length)
+        if nom_lie is not None:
+            setattr(instance, nom_champ, nom_lie)
+            return True
+
+    try:
+        field_file.open("rb")
+    except FileNotFoundError:
+        return False
+    try:
+        # storage.save lit le fichier par blocs (File.chunks)
+        nom_copie = storage.save(nom, field_file, max_length=champ.max_length)
+    finally:
+        field_file.close()
+    setattr(instance, nom_champ, nom_copie)
+    return True
+
+
+# ----------- Réconciliation -----------
+
+def champs_fichiers():
+    """[(modèle, nom du champ)] pour tous les FileField de l'application gui."""
+    return [
+        (modele, champ.name)
+        for modele in apps.get_app_config("gui").get_models()
+        for champ in modele._meta.get_fields()
+        if isinstance(champ, models.FileField)
+    ]
+
+
+def compter_references():
+    """Counter {nom cas/...: nombre de FileField qui le référencent}."""
+    comptes = Counter()
+    for modele, nom_champ in champs_fichiers():
+        comptes.update(
+            modele.objects.filter(**{f"{nom_champ}__startswith": PREFIXE_CAS + "/"})
+            .values_list(nom_champ, flat=True)
+        )
+    return comptes
+
+
+def recalculer_references_medias():
+    """
+    Recalcule fichier_media.nb_references à partir des FileField.
+    Les contenus sans référence restent à 0 (nettoyés à part).
+    """
+    fichier_media = apps.get_model("gui", "fichier_media")
+    comptes = compter_references()
+
+    modifies = []
+    connus = set()
+    for ligne in fichier_media.objects.only("id", "nom", "nb_references"):
+        connus.add(ligne.nom)
+        nb = comptes.get(ligne.nom, 0)
+        if ligne.nb_references != nb:
+            ligne.nb_references = nb
+            modifies.append(ligne)
+    fichier_media.objects.bulk_update(modifies, ["nb_references"], batch_size=500)
+
+    nouveaux = [
+        fichier_media(
+            nom=nom,
+            nb_references=nb,
+            taille=default_storage.size(nom) if default_storage.exists(nom) else 0,
+        )
+        for nom, nb in comptes.items()
+        if nom not in connus
+    ]
+    fichier_media.objects.bulk_create(nouveaux, batch_size=500)
+    return len(modifies) + len(nouveaux)
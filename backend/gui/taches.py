@@ -0,0 +1,39 @@
+"""
+Tâches de fond (analyses de médias, instantané et bundle du catalogue).
+
+Un thread démon par tâche, lancé par le processus web lui-même : pas de
+file ni de worker externe. Chaque type de tâche a son réglage *_ASYNC ; à
+False (tests, commandes), la tâche s'exécute tout de suite dans l'appelant.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+def lancer_en_tache_de_fond(nom, fn, reglage, delai=0):
+    """
+    Exécute fn() dans un thread démon `nom`, ou tout de suite si le réglage
+    `reglage` vaut False. En tâche de fond : attente de `delai` secondes
+    (regroupement), exceptions journalisées, connexions du thread fermées.
+    """
+    if not getattr(settings, reglage, True):
+        fn()
+        return
+
+    def tache():
+        try:
+            if delai:
+                time.sleep(delai)
+            fn()
+        except Exception:
+            logger.exception("Échec de la tâche de fond %s", nom)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=tache, name=nom, daemon=True).start()
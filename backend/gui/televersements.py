@@ -0,0 +1,254 @@
+"""
+Envois par blocs reprenables des gros médias (/api/uploads/).
+
+1. POST /api/uploads/ déclare le fichier (nom, taille, SHA-256, cible) ;
+2. PATCH /api/uploads/<id>/ avec l'en-tête Upload-Offset ajoute un bloc
+   (corps brut) au fichier partiel <TELEVERSEMENTS_DIR>/<id>.part ;
+3. GET /api/uploads/<id>/ donne l'offset reçu : après une coupure, le client
+   reprend à cet offset au lieu de tout renvoyer.
+
+Le corps est recopié sur disque par morceaux, jamais gardé en mémoire. Au
+dernier bloc, l'empreinte est vérifiée puis le fichier est déplacé (sans
+copie) dans le stockage et rattaché à sa cible.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import models, transaction
+
+from .models import (
+    chant,
+    demande_chant,
+    demande_chant_audio,
+    demande_piste_audio,
+    demande_support,
+    piece_jointe_support,
+    piste_audio,
+    televersement,
+)
+
+
+TAILLE_LECTURE = 64 * 1024
+
+
+class ErreurTeleversement(Exception):
+    """Erreur présentée au client : message et statut HTTP."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class FichierTeleverse(File):
+    """Fichier partiel complet : StockageDedup le déplace sans le relire."""
+
+    def __init__(self, chemin, nom, sha256):
+        super().__init__(open(chemin, "rb"), name=nom)
+        self.chemin = chemin
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.chemin
+
+
+def _racine():
+    return Path(getattr(settings, "TELEVERSEMENTS_DIR", settings.BASE_DIR / "cache" / "televersements"))
+
+
+def chemin_partiel(envoi):
+    return _racine() / f"{envoi.id}.part"
+
+
+# ----------- Cibles -----------
+
+def _chant(parametres):
+    try:
+        return chant.objects.get(id=int(parametres.get("chant_id")))
+    except (TypeError, ValueError, chant.DoesNotExist):
+        raise ErreurTeleversement("Chant introuvable", status=404)
+
+
+def _demande_chant(parametres, user):
+    try:
+        return demande_chant.objects.get(
+            id=int(parametres.get("demande_id")), utilisateur=user, statut="EN_ATTENTE"
+        )
+    except (TypeError, ValueError, demande_chant.DoesNotExist):
+        raise ErreurTeleversement("Demande introuvable", status=404)
+
+
+def _demande_support(parametres, user):
+    try:
+        return demande_support.objects.get(id=int(parametres.get("demande_id")), utilisateur=user)
+    except (TypeError, ValueError, demande_support.DoesNotExist):
+        raise ErreurTeleversement("Demande introuvable", status=404)
+
+
+# cible -> (vérification des paramètres, création de l'objet avec le fichier)
+CIBLES = {
+    "piste_audio": (
+        lambda p, user: _chant(p),
+        lambda p, user, f: piste_audio.objects.create(chant=_chant(p), utilisateur=user, fichier_mp3=f),
+    ),
+    "demande_chant_audio": (
+        _demande_chant,
+        lambda p, user, f: demande_chant_audio.objects.create(demande=_demande_chant(p, user), fichier_mp3=f),
+    ),
+    "demande_piste_audio": (
+        lambda p, user: _chant(p),
+        lambda p, user, f: demande_piste_audio.objects.create(chant=_chant(p), utilisateur=user, fichier_mp3=f),
+    ),
+    "piece_jointe_support": (
+        _demande_support,
+        lambda p, user, f: piece_jointe_support.objects.create(demande=_demande_support(p, user), fichier=f),
+    ),
+}
+
+
+# ----------- Étapes -----------
+
+def creer_televersement(user, donnees):
+    cible = donnees.get("cible")
+    if cible not in CIBLES:
+        raise ErreurTeleversement(f"cible invalide (attendu : {', '.join(CIBLES)})")
+
+    nom_fichier = os.path.basename(str(donnees.get("nom_fichier") or "")).strip()
+    if not nom_fichier:
+        raise ErreurTeleversement("nom_fichier requis")
+    try:
+        taille = int(donnees.get("taille"))
+    except (TypeError, ValueError):
+        raise ErreurTeleversement("taille requise")
+    if taille <= 0:
+        raise ErreurTeleversement("taille invalide")
+    if taille > settings.UPLOAD_MAX_SIZE:
+        raise ErreurTeleversement("Fichier trop volumineux", status=413)
+    sha256 = str(donnees.get("sha256") or "").lower()
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise ErreurTeleversement("sha256 invalide")
+
+    parametres = {
+        cle: donnees[cle] for cle in ("chant_id", "demande_id") if donnees.get(cle) is not None
+    }
+    CIBLES[cible][0](parametres, user)
+
+    envoi = televersement.objects.create(
+        utilisateur=user,
+        cible=cible,
+        parametres=parametres,
+        nom_fichier=nom_fichier[:255],
+        taille=taille,
+        sha256=sha256,
+    )
+    _racine().mkdir(parents=True, exist_ok=True)
+    chemin_partiel(envoi).touch()
+    return envoi
+
+
+def ajouter_bloc(envoi_id, user, flux, offset, longueur):
+    """
+    Écrit `longueur` octets lus dans `flux` à partir de `offset` (qui doit
+    être l'offset déjà reçu). Retourne (envoi, objet créé ou None).
+    """
+    bloc_max = getattr(settings, "TELEVERSEMENT_BLOC_MAX", 16 * 1024 * 1024)
+    if longueur > bloc_max:
+        raise ErreurTeleversement(f"Bloc trop volumineux (max {bloc_max} octets)", status=413)
+
+    with transaction.atomic():
+        # Un seul bloc à la fois par envoi
+        envoi = televersement.objects.select_for_update().filter(id=envoi_id, utilisateur=user).first()
+        if envoi is None:
+            raise ErreurTeleversement("Envoi introuvable", status=404)
+        if offset != envoi.recu:
+            raise ErreurTeleversement("Offset incorrect", status=409)
+        if offset + longueur > envoi.taille:
+            raise ErreurTeleversement("Le bloc dépasse la taille annoncée", status=413)
+
+        ecrits = 0
+        chemin = chemin_partiel(envoi)
+        with open(chemin, "r+b" if chemin.exists() else "wb") as sortie:
+            # Octets d'un bloc interrompu au-delà de `recu` : écrasés
+            sortie.seek(envoi.recu)
+            sortie.truncate()
+            while ecrits < longueur:
+                morceau = flux.read(min(TAILLE_LECTURE, longueur - ecrits))
+                if not morceau:
+                    break
+                sortie.write(morceau)
+                ecrits += len(morceau)
+
+        # Ce qui est arrivé est gardé, même si la connexion a coupé
+        televersement.objects.filter(id=envoi.id).update(recu=models.F("recu") + ecrits)
+        envoi.refresh_from_db()
+
+    if envoi.recu < envoi.taille:
+        return envoi, None
+    return envoi, finaliser(envoi)
+
+
+def _empreinte(chemin):
+    calcul = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for morceau in iter(lambda: f.read(1024 * 1024), b""):
+            calcul.update(morceau)
+    return calcul.hexdigest()
+
+
+def finaliser(envoi):
+    """Vérifie l'empreinte et rattache le fichier à sa cible."""
+    chemin = chemin_partiel(envoi)
+    if _empreinte(chemin) != envoi.sha256:
+        supprimer_televersement(envoi)
+        raise ErreurTeleversement("Empreinte SHA-256 différente : envoi annulé", status=422)
+
+    fichier = FichierTeleverse(str(chemin), envoi.nom_fichier, envoi.sha256)
+    try:
+        with transaction.atomic():
+            objet = CIBLES[envoi.cible][1](envoi.parametres, envoi.utilisateur, fichier)
+    except ErreurTeleversement:
+        # Cible disparue entre-temps (chant ou demande supprimés)
+        envoi.delete()
+        raise
+    finally:
+        fichier.close()
+        # Contenu déjà présent dans le stockage : le partiel n'a pas été déplacé
+        chemin.unlink(missing_ok=True)
+    envoi.delete()
+    return objet
+
+
+def supprimer_televersement(envoi):
+    chemin_partiel(envoi).unlink(missing_ok=True)
+    envoi.delete()
+
+
+def expirer_televersements(limite, simulation=False):
+    """
+    Abandonne les envois inactifs depuis `limite` (datetime) et efface les
+    fichiers partiels sans envoi. Retourne (nombre de fichiers, octets).
+    """
+    nb = octets = 0
+    for envoi in televersement.objects.filter(date_modification__lt=limite):
+        chemin = chemin_partiel(envoi)
+        if chemin.exists():
+            nb += 1
+            octets += chemin.stat().st_size
+        if not simulation:
+            supprimer_televersement(envoi)
+
+    racine = _racine()
+    if not racine.is_dir():
+        return nb, octets
+    actifs = {str(i) for i in televersement.objects.values_list("id", flat=True)}
+    for chemin in racine.glob("*.part"):
+        stat = chemin.stat()
+        if chemin.stem in actifs or stat.st_mtime >= limite.timestamp():
+            continue
+        nb += 1
+        octets += stat.st_size
+        if not simulation:
+            chemin.unlink(missing_ok=True)
+    return nb, octets
@@ -0,0 +1,111 @@
+"""
+Classement « tendance » des chants : chaque évènement (favori, note,
+commentaire) compte pour un poids qui décroît de moitié tous les
+DEMI_VIE_JOURS jours.
+
+Le calcul est fait hors requête par la commande recalculer_tendances
+(tâche périodique) et stocké dans tendance_chant. Il est incrémental : le
+score des jours déjà intégrés est seulement multiplié par le facteur de
+décroissance, et seuls les évènements datés depuis le dernier passage sont
+relus (dates indexées).
+
+Les dates des évènements sont des jours : les évènements du jour courant
+sont recomptés à chaque passage (score) et n'entrent dans score_base
+qu'une fois la journée terminée.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import commentaire, favoris, noter, tendance_chant
+
+
+DEMI_VIE_JOURS = 7
+
+# Recalcul complet : les évènements plus anciens pèsent moins de 1/2^12
+FENETRE_JOURS = 12 * DEMI_VIE_JOURS
+
+# En dessous, la ligne est supprimée (la table reste creuse)
+SCORE_MIN = 1e-3
+
+# (queryset, champ date, champ chant, poids)
+SOURCES = (
+    (favoris.objects, "date_favori", "chant_id", 3.0),
+    (commentaire.objects, "date_comment", "chant_id", 2.0),
+    (noter.objects, "date_rating", "piste_audio__chant_id", 1.0),
+)
+
+
+def decroissance(jours):
+    return math.exp(-math.log(2) * jours / DEMI_VIE_JOURS)
+
+
+def _evenements(depuis, jusqu_a):
+    """{chant_id: {date: poids cumulé}} des évènements datés dans [depuis, jusqu_a]."""
+    evenements = defaultdict(lambda: defaultdict(float))
+    for manager, champ_date, champ_chant, poids in SOURCES:
+        lignes = (
+            manager.filter(**{f"{champ_date}__gte": depuis, f"{champ_date}__lte": jusqu_a})
+            .values_list(champ_chant, champ_date)
+            .annotate(nb=Count("pk"))
+            .order_by()
+        )
+        for chant_id, jour, nb in lignes:
+            evenements[chant_id][jour] += poids * nb
+    return evenements
+
+
+@transaction.atomic
+def recalculer_tendances(aujourd_hui=None, complet=False):
+    """
+    Met tendance_chant à jour pour `aujourd_hui` (date locale par défaut).
+    Retourne le nombre de chants classés.
+    """
+    aujourd_hui = aujourd_hui or timezone.localdate()
+    lignes = {t.chant_id: t for t in tendance_chant.objects.select_for_update()}
+
+    reference = None
+    if lignes and not complet:
+        reference = max(t.date_reference for t in lignes.values())
+    if reference is None or reference > aujourd_hui:
+        # Recalcul complet sur la fenêtre
+        tendance_chant.objects.all().delete()
+        lignes = {}
+        reference = aujourd_hui - timedelta(days=FENETRE_JOURS)
+
+    facteur = decroissance((aujourd_hui - reference).days)
+    evenements = _evenements(reference, aujourd_hui)
+
+    a_creer, a_modifier, a_supprimer = [], [], []
+    for chant_id in set(lignes) | set(evenements):
+        base = lignes[chant_id].score_base * facteur if chant_id in lignes else 0.0
+        du_jour = 0.0
+        for jour, poids in evenements.get(chant_id, {}).items():
+            if jour < aujourd_hui:
+                base += poids * decroissance((aujourd_hui - jour).days)
+            else:
+                du_jour += poids
+
+        score = base + du_jour
+        if score < SCORE_MIN:
+            if chant_id in lignes:
+                a_supprimer.append(chant_id)
+            continue
+
+        if chant_id in lignes:
+            t = lignes[chant_id]
+            t.score_base, t.score, t.date_reference = base, score, aujourd_hui
+            a_modifier.append(t)
+        else:
+            a_creer.append(tendance_chant(
+                chant_id=chant_id, score_base=base, score=score, date_reference=aujourd_hui
+            ))
+
+    tendance_chant.objects.filter(chant_id__in=a_supprimer).delete()
+    tendance_chant.objects.bulk_update(a_modifier, ["score_base", "score", "date_reference"], batch_size=500)
+    tendance_chant.objects.bulk_create(a_creer, batch_size=500)
+    return len(a_creer) + len(a_modifier)
@@ -1,3 +1,1581 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+import zlib
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .audio import analyser_mp3
+from .bundle import chemin_bundle, construire_bundle
+from .documents import analyser_pdf
+from .cache_catalogue import (
+    version_catalogue,
+    version_catalogue_stable,
+    version_instantane,
+    version_instantane_stable,
+)
+from .flux_json import ReponseJsonFlux
+from .images import SIGNATURE_DERIVES, cle_derives
+from .instantane import _cle_hote, _planifier
+from .models import (
+    appartenir,
+    categorie,
+    chant,
+    chant_supprime,
+    chanter,
+    commentaire,
+    demande_chant,
+    demande_chant_audio,
+    evenement,
+    favoris,
+    fichier_media,
+    noter,
+    recalculer_nb_favoris,
+    piste_audio,
+    role,
+    televersement,
+    tendance_chant,
+    utilisateur,
+)
+from .recommandations import calculer_similaires, recalculer_similaires
+from .stockage import nom_contenu, supprimer_fichier
+from .tendances import recalculer_tendances
+from .views import _cleanup_user_relations, _create_chant_from_demande, _encode_jeton_sync
+
+
+# Cache catalogue désactivé (les tests mesurent le travail réel des vues)
+SANS_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalogue": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+CACHE_MEMOIRE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalogue": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-catalogue"},
+}
+
+
+@override_settings(CACHES=SANS_CACHE)
+class CatalogueQueryBudgetTests(TestCase):
+    """
+    Le nombre de requêtes SQL des vues catalogue ne doit pas dépendre du
+    nombre de chants, de pistes audio ou de catégories.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role_user = role.objects.create(nom_role="user")
+        cls.evenement = evenement.objects.create(
+            date_evenement="2025-10-01",
+            lieu="Mons",
+            nom_evenement="Cantus",
+            annonce_fil_actu="",
+            histoire="",
+        )
+        cls.categories = [
+            categorie.objects.create(nom_categorie=nom) for nom in ("Autre", "Folklore")
+        ]
+        cls.nb_utilisateurs = 0
+
+    def _creer_utilisateur(self):
+        type(self).nb_utilisateurs += 1
+        n = self.nb_utilisateurs
+        return utilisateur.objects.create(
+            email=f"user{n}@alzin.test",
+            nom=f"Nom{n}",
+            prenom=f"Prenom{n}",
+            pseudo=f"pseudo{n}",
+            password="x",
+            ville="Mons",
+            role=self.role_user,
+        )
+
+    def _creer_chants(self, nombre):
+        for i in range(nombre):
+            auteur = self._creer_utilisateur()
+            c = chant.objects.create(
+                nom_chant=f"Chant {chant.objects.count()}",
+                paroles="la la la",
+                utilisateur=auteur,
+            )
+            for cat in self.categories:
+                appartenir.objects.create(chant=c, categorie=cat, utilisateur=auteur)
+            for _ in range(2):
+                piste_audio.objects.create(
+                    chant=c,
+                    utilisateur=self._creer_utilisateur(),
+                    fichier_mp3="pistes_audio/test.mp3",
+                    nb_notes=1,
+                    somme_notes=4,
+                )
+            chanter.objects.create(chant=c, evenement=self.evenement)
+
+    def _compter_requetes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_liste_chants_nombre_constant_de_requetes(self):
+        self._creer_chants(1)
+        petit = self._compter_requetes("/api/chants/?all=1")
+        self._creer_chants(5)
+        grand = self._compter_requetes("/api/chants/?all=1")
+        self.assertEqual(petit, grand)
+
+    def test_detail_chant_nombre_constant_de_requetes(self):
+        self._creer_chants(1)
+        c = chant.objects.get()
+        petit = self._compter_requetes(f"/api/chants/{c.id}/")
+        for _ in range(4):
+            piste_audio.objects.create(
+                chant=c,
+                utilisateur=self._creer_utilisateur(),
+                fichier_mp3="pistes_audio/test.mp3",
+            )
+        grand = self._compter_requetes(f"/api/chants/{c.id}/")
+        self.assertEqual(petit, grand)
+
+    def test_detail_evenement_nombre_constant_de_requetes(self):
+        self._creer_chants(1)
+        url = f"/api/evenements/{self.evenement.id}/"
+        petit = self._compter_requetes(url)
+        self._creer_chants(5)
+        grand = self._compter_requetes(url)
+        self.assertEqual(petit, grand)
+
+    def test_liste_chants_budget(self):
+        self._creer_chants(3)
+        # chants + utilisateur, pistes + utilisateur, catégories, modifications
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/chants/?all=1")
+        self.assertEqual(len(response.json()), 3)
+        premiere_piste = response.json()[0]["pistes_audio"][0]
+        self.assertEqual(premiere_piste["nb_notes"], 1)
+        self.assertIsNotNone(premiere_piste["utilisateur_pseudo"])
+
+
+class StatsNotesTests(TestCase):
+    def setUp(self):
+        role_user = role.objects.create(nom_role="user")
+        self.u1, self.u2 = (
+            utilisateur.objects.create(
+                email=f"note{i}@alzin.test", nom="N", prenom="P", pseudo=f"note{i}",
+                password="x", ville="Mons", role=role_user,
+            )
+            for i in range(2)
+        )
+        c = chant.objects.create(nom_chant="Noté", paroles="...")
+        self.p1, self.p2 = (
+            piste_audio.objects.create(chant=c, fichier_mp3="pistes_audio/test.mp3") for _ in range(2)
+        )
+
+    def _noter(self, u, piste, valeur):
+        return self.client.post(
+            "/api/noter/",
+            {"utilisateur_id": u.id, "piste_audio_id": piste.id, "valeur_note": valeur},
+            content_type="application/json",
+        )
+
+    def _stats(self, piste):
+        piste.refresh_from_db()
+        return piste.nb_notes, piste.somme_notes
+
+    def test_premiere_note_concurrente(self):
+        # Une autre requête crée la note entre la lecture et update_or_create
+        update_or_create = noter.objects.update_or_create
+
+        def concurrente(**kwargs):
+            noter.objects.create(utilisateur=self.u1, piste_audio=self.p1, valeur_note=2)
+            return update_or_create(**kwargs)
+
+        with mock.patch.object(noter.objects, "update_or_create", side_effect=concurrente):
+            response = self._noter(self.u1, self.p1, 5)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._stats(self.p1), (1, 5))
+
+    def test_nettoyage_utilisateur_agrege(self):
+        for u, piste, valeur in ((self.u1, self.p1, 4), (self.u1, self.p2, 3), (self.u2, self.p1, 5)):
+            self.assertEqual(self._noter(u, piste, valeur).status_code, 201)
+
+        with CaptureQueriesContext(connection) as ctx:
+            _cleanup_user_relations(self.u1)
+        maj_stats = [q for q in ctx.captured_queries if "nb_notes" in q["sql"] and q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(maj_stats), 2)
+        self.assertEqual(self._stats(self.p1), (1, 5))
+        self.assertEqual(self._stats(self.p2), (0, 0))
+
+
+@override_settings(CACHES=SANS_CACHE)
+class ChantsPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Doublons de nom volontaires pour vérifier le départage par id
+        for nom in ("Bière", "Alouette", "Cantus", "Alouette", "Digue", "Étudiants", "Bière"):
+            chant.objects.create(nom_chant=nom, paroles="...")
+        cls.attendu = list(chant.objects.order_by("nom_chant", "id").values_list("id", flat=True))
+
+    def _page(self, **params):
+        response = self.client.get("/api/chants/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_parcours_avant_puis_arriere(self):
+        vus = []
+        pages = []
+        page = self._page(limit=3)
+        self.assertIsNone(page["prev"])
+        while True:
+            pages.append(page)
+            vus.extend(c["id"] for c in page["results"])
+            if not page["next"]:
+                break
+            page = self._page(limit=3, cursor=page["next"])
+        self.assertEqual(vus, self.attendu)
+
+        precedente = self._page(limit=3, cursor=pages[-1]["prev"])
+        self.assertEqual(
+            [c["id"] for c in precedente["results"]],
+            [c["id"] for c in pages[-2]["results"]],
+        )
+
+    def test_curseur_et_limite_invalides(self):
+        self.assertEqual(self.client.get("/api/chants/", {"cursor": "xxx"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/chants/", {"limit": "0"}).status_code, 400)
+
+
+@override_settings(CACHES=SANS_CACHE)
+class ChantsProjectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = categorie.objects.create(nom_categorie="Folklore")
+        c = chant.objects.create(nom_chant="Le Doudou", paroles="x" * 5000, description="desc")
+        appartenir.objects.create(chant=c, categorie=cat)
+
+    def test_vue_lite_ne_lit_pas_les_paroles(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/chants/", {"view": "lite", "all": "1"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            list(data[0].keys()),
+            ["id", "nom_chant", "auteur", "ville_origine", "categories", "a_ete_modifie"],
+        )
+        self.assertEqual(data[0]["categories"], ["Folklore"])
+        self.assertFalse(any('"paroles"' in q["sql"] for q in ctx.captured_queries))
+
+    def test_fields(self):
+        response = self.client.get("/api/chants/", {"fields": "id,nom_chant,utilisateur_pseudo"})
+        self.assertEqual(
+            list(response.json()["results"][0].keys()),
+            ["id", "nom_chant", "utilisateur_pseudo"],
+        )
+        self.assertEqual(self.client.get("/api/chants/", {"fields": "id,inconnu"}).status_code, 400)
+
+
+@override_settings(CACHES=SANS_CACHE)
+class ChantsRechercheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        folklore = categorie.objects.create(nom_categorie="Folklore")
+        cls.etudiants = chant.objects.create(
+            nom_chant="Le chant des étudiants wallons",
+            paroles="Amis, chantons la Wallonie\nEt buvons à la santé des étudiants.",
+        )
+        cls.doudou = chant.objects.create(
+            nom_chant="Le Doudou",
+            auteur="Traditionnel",
+            ville_origine="Mons",
+            paroles="C'est l'doudou, c'est l'mama, les étudiants sont là.",
+        )
+        appartenir.objects.create(chant=cls.doudou, categorie=folklore)
+        chant.objects.create(nom_chant="Sans rapport", paroles="rien à voir")
+
+    def test_classement_et_extrait(self):
+        response = self.client.get("/api/chants/search/", {"q": "etudiant"})
+        self.assertEqual(response.status_code, 200)
+        ids = [r["id"] for r in response.json()["results"]]
+        # Le terme dans le titre pèse plus que dans les paroles
+        self.assertEqual(ids, [self.etudiants.id, self.doudou.id])
+        self.assertIn("<mark>étudiants</mark>", response.json()["results"][0]["extrait"])
+
+    def test_filtre_categorie_et_mise_a_jour(self):
+        response = self.client.get("/api/chants/search/", {"q": "étudiants", "categorie": "Folklore"})
+        self.assertEqual([r["id"] for r in response.json()["results"]], [self.doudou.id])
+
+        self.doudou.paroles = "plus de correspondance"
+        self.doudou.save()
+        response = self.client.get("/api/chants/search/", {"q": "mons"})
+        self.assertEqual([r["id"] for r in response.json()["results"]], [self.doudou.id])
+        response = self.client.get("/api/chants/search/", {"q": "mama"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_q_requis(self):
+        self.assertEqual(self.client.get("/api/chants/search/").status_code, 400)
+
+
+@override_settings(CACHES=SANS_CACHE)
+class ChantsAutocompletionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wallons = chant.objects.create(nom_chant="Le Chant des Étudiants wallons", paroles="...")
+        cls.doudou = chant.objects.create(nom_chant="L'Doudou", paroles="...")
+        chant.objects.create(nom_chant="Vive le vin", paroles="...")
+        cls.utilisateur = utilisateur.objects.create(
+            email="demandeur@alzin.test",
+            nom="Nom",
+            prenom="Prenom",
+            pseudo="demandeur",
+            password="x",
+            ville="Mons",
+            role=role.objects.create(nom_role="user"),
+        )
+
+    def test_prefixe_puis_approche(self):
+        response = self.client.get("/api/chants/autocomplete/", {"q": "le chant des etu"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["id"], self.wallons.id)
+        self.assertEqual(response.json()[0]["correspondance"], "prefixe")
+
+        response = self.client.get("/api/chants/autocomplete/", {"q": "etudiant walons"})
+        self.assertEqual([r["id"] for r in response.json()], [self.wallons.id])
+        self.assertEqual(response.json()[0]["correspondance"], "approx")
+
+    def test_nom_normalise_maintenu(self):
+        self.doudou.nom_chant = "Le Doudou !"
+        self.doudou.save()
+        self.doudou.refresh_from_db()
+        self.assertEqual(self.doudou.nom_normalise, "le doudou")
+        response = self.client.get("/api/chants/autocomplete/", {"q": "doudou"})
+        self.assertEqual([r["id"] for r in response.json()], [self.doudou.id])
+
+    def test_doublon_approche_refuse(self):
+        response = self.client.post(
+            "/api/demandes-chants/",
+            {"nom_chant": "Le chant des etudiant wallons"},
+            HTTP_X_USER_EMAIL=self.utilisateur.email,
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["chant_existant"]["id"], self.wallons.id)
+
+        response = self.client.post(
+            "/api/demandes-chants/",
+            {"nom_chant": "Vive le vent"},
+            HTTP_X_USER_EMAIL=self.utilisateur.email,
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(
+            "/api/demandes-chants/",
+            {"nom_chant": "VIVE LE VENT !"},
+            HTTP_X_USER_EMAIL=self.utilisateur.email,
+        )
+        self.assertEqual(response.status_code, 409)
+        # Demande en attente au nom proche : même seuil que pour les chants
+        response = self.client.post(
+            "/api/demandes-chants/",
+            {"nom_chant": "Vive le vents"},
+            HTTP_X_USER_EMAIL=self.utilisateur.email,
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("demande_existante", response.json())
+
+    def test_doublon_force(self):
+        response = self.client.post(
+            "/api/demandes-chants/",
+            {"nom_chant": "Le chant des etudiant wallons", "forcer": "1"},
+            HTTP_X_USER_EMAIL=self.utilisateur.email,
+        )
+        self.assertEqual(response.status_code, 201)
+
+        admin = utilisateur.objects.create(
+            email="admin@alzin.test", nom="Admin", prenom="A", pseudo="admin", password="x",
+            ville="Mons", role=role.objects.create(nom_role="admin"),
+        )
+        url = f"/api/admin/demandes-chants/{response.json()['id']}/"
+
+        def accepter(**extra):
+            return self.client.patch(
+                url, json.dumps({"action": "accepter", **extra}),
+                content_type="application/json", HTTP_X_USER_EMAIL=admin.email,
+            )
+
+        response = accepter()
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()["forcer_possible"])
+        response = accepter(forcer=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(chant.objects.filter(nom_normalise="le chant des etudiant wallons").count(), 1)
+
+
+@override_settings(CACHES=SANS_CACHE)
+class ChantsBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chants = [
+            chant.objects.create(nom_chant=nom, paroles="...")
+            for nom in ("Les Moines de Saint-Bernardin", "Le Petit Cheval", "La Brabançonne")
+        ]
+
+    def test_ordre_de_la_demande_et_ids_inconnus(self):
+        a, b, c = (x.id for x in self.chants)
+        response = self.client.get("/api/chants/batch/", {"ids": f"{c},999,{a},{c}", "view": "lite"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([x["id"] for x in data["results"]], [c, a])
+        self.assertEqual(data["missing"], [999])
+
+    def test_post_et_nombre_de_requetes(self):
+        ids = [x.id for x in self.chants]
+        # chant + pistes + catégories + modifications acceptées
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                "/api/chants/batch/", {"ids": ids[::-1]}, content_type="application/json"
+            )
+        self.assertEqual([x["nom_chant"] for x in response.json()["results"]][0], "La Brabançonne")
+
+    def test_ids_invalides(self):
+        self.assertEqual(self.client.get("/api/chants/batch/").status_code, 400)
+        self.assertEqual(self.client.get("/api/chants/batch/", {"ids": "1,x"}).status_code, 400)
+
+    def test_trop_d_identifiants_meme_en_double(self):
+        ids = [self.chants[0].id] * 501
+        with self.assertNumQueries(0):
+            response = self.client.post("/api/chants/batch/", {"ids": ids}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=CACHE_MEMOIRE)
+class CacheCatalogueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chant = chant.objects.create(nom_chant="Le Doudou", paroles="...")
+
+    def test_hit_sans_requete_puis_invalidation(self):
+        # view=lite : réponse hors instantané, servie par le cache seul
+        premiere = self.client.get("/api/chants/", {"all": "1", "view": "lite"})
+        with self.assertNumQueries(0):
+            seconde = self.client.get("/api/chants/", {"all": "1", "view": "lite"})
+        self.assertEqual(premiere.content, seconde.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/appartenir/",
+                {"chant_id": self.chant.id, "nom_categorie": "Folklore"},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+        apres = self.client.get("/api/chants/", {"all": "1", "view": "lite"})
+        self.assertEqual(apres.json()[0]["categories"], ["Folklore"])
+
+
+@override_settings(CACHES=CACHE_MEMOIRE)
+class RevalidationChantsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chant = chant.objects.create(nom_chant="Les Trois Matelots", paroles="...")
+
+    def test_detail_304_puis_etag_change_apres_ajout_categorie(self):
+        url = f"/api/chants/{self.chant.id}/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        # Réponse en cache : la 304 est servie sans requête SQL
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        revision = self.chant.revision
+        with self.captureOnCommitCallbacks(execute=True):
+            appartenir.objects.create(
+                chant=self.chant, categorie=categorie.objects.create(nom_categorie="Marins")
+            )
+        self.chant.refresh_from_db()
+        self.assertEqual(self.chant.revision, revision + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_liste_304_sans_requete(self):
+        etag = self.client.get("/api/chants/")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/chants/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(CACHES=CACHE_MEMOIRE, CATALOGUE_INSTANTANE_ASYNC=False)
+class InstantaneCatalogueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chant = chant.objects.create(nom_chant="Le P'tit Quinquin", paroles="...")
+
+    def setUp(self):
+        self.dossier = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(CATALOGUE_INSTANTANE_DIR=self.dossier))
+        caches["catalogue"].clear()
+
+    def _lire(self, response):
+        self.assertTrue(response.streaming)
+        contenu = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") == "gzip":
+            contenu = gzip.decompress(contenu)
+        return json.loads(contenu)
+
+    def test_fichier_precompresse_puis_nouvelle_version(self):
+        # Première requête : construction de l'instantané
+        self._lire(self.client.get("/api/chants/", {"all": "1"}))
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/chants/", {"all": "1"}, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(self._lire(response)[0]["nom_chant"], "Le P'tit Quinquin")
+
+        brut = self.client.get("/api/chants/", {"all": "1"}, HTTP_ACCEPT_ENCODING="identity")
+        self.assertFalse(brut.has_header("Content-Encoding"))
+        self.assertEqual(self._lire(brut)[0]["categories"], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appartenir.objects.create(
+                chant=self.chant, categorie=categorie.objects.create(nom_categorie="Nord")
+            )
+        response = self.client.get("/api/chants/", {"all": "1"}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(self._lire(response)[0]["categories"], ["Nord"])
+        # L'instantané de l'ancienne version est purgé
+        self.assertEqual(len([d for hote in self.dossier.iterdir() for d in hote.iterdir()]), 1)
+
+    def test_304_sur_instantane(self):
+        self.client.get("/api/chants/", {"all": "1"})
+        etag = self.client.get("/api/chants/", {"all": "1"})["ETag"]
+        response = self.client.get("/api/chants/", {"all": "1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_note_sans_reconstruction(self):
+        u = utilisateur.objects.create(
+            email="note@alzin.test", nom="N", prenom="P", pseudo="note", password="x",
+            ville="Mons", role=role.objects.create(nom_role="user"),
+        )
+        piste = piste_audio.objects.create(chant=self.chant, fichier_mp3="pistes_audio/n.mp3")
+        catalogue, instantane = version_catalogue_stable(), version_instantane_stable()
+        with self.captureOnCommitCallbacks(execute=True):
+            noter.objects.create(utilisateur=u, piste_audio=piste, valeur_note=4)
+        self.assertNotEqual(version_catalogue_stable(), catalogue)
+        self.assertEqual(version_instantane_stable(), instantane)
+
+    def test_note_reprise_apres_le_delai(self):
+        u = utilisateur.objects.create(
+            email="retard@alzin.test", nom="N", prenom="P", pseudo="retard", password="x",
+            ville="Mons", role=role.objects.create(nom_role="user"),
+        )
+        piste_audio.objects.create(chant=self.chant, fichier_mp3="pistes_audio/r.mp3")
+
+        def pistes():
+            return self._lire(self.client.get("/api/chants/", {"all": "1"}))[0]["pistes_audio"]
+
+        self.assertEqual(pistes()[0]["nb_notes"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/noter/",
+                json.dumps({"utilisateur_id": u.id, "piste_audio_id": pistes()[0]["id"], "valeur_note": 5}),
+                content_type="application/json",
+            )
+        self.assertEqual(pistes()[0]["nb_notes"], 0)
+        with override_settings(CATALOGUE_INSTANTANE_RETARD_MAX=0):
+            self.assertEqual(pistes()[0]["nb_notes"], 1)
+
+    def test_reconstructions_regroupees(self):
+        request = self.client.get("/api/chants/").wsgi_request
+        construire = mock.Mock(return_value=b"[]")
+        verrou = f"catalogue:instantane:{_cle_hote(request)}"
+        caches["catalogue"].add(verrou, True)
+        # Construction déjà en cours pour l'hôte : simple demande de relance
+        _planifier(request, construire)
+        _planifier(request, construire)
+        construire.assert_not_called()
+        self.assertTrue(caches["catalogue"].get(f"{verrou}:relance"))
+
+        caches["catalogue"].delete(verrou)
+        _planifier(request, construire)
+        self.assertEqual(construire.call_count, 1)
+        self.assertIsNone(caches["catalogue"].get(verrou))
+
+
+class ReponseJsonFluxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role_user = role.objects.create(nom_role="user")
+        cls.utilisateurs = [
+            utilisateur.objects.create(
+                email=f"flux{i}@alzin.test", nom=f"Nom{i}", prenom="P",
+                pseudo=f"flux{i}", password="x", ville="Mons", role=role_user,
+            )
+            for i in range(3)
+        ]
+        c = chant.objects.create(nom_chant="Les Bruxellois", paroles="...")
+        cls.piste = piste_audio.objects.create(chant=c, fichier_mp3="pistes_audio/test.mp3")
+        for u, valeur in zip(cls.utilisateurs, (3, 4, 5)):
+            noter.objects.create(utilisateur=u, piste_audio=cls.piste, valeur_note=valeur)
+
+    def _lire(self, response):
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_liste_utilisateurs(self):
+        data = self._lire(self.client.get("/api/utilisateurs/"))
+        self.assertEqual([u["pseudo"] for u in data], ["flux0", "flux1", "flux2"])
+        self.assertNotIn("password", data[0])
+
+    def test_notes_avec_entete(self):
+        data = self._lire(self.client.get("/api/noter/", {"piste_id": self.piste.id}))
+        self.assertEqual(data["nb_notes"], 3)
+        self.assertEqual(data["moyenne"], 4)
+        self.assertEqual([n["valeur_note"] for n in data["notes"]], [3, 4, 5])
+
+    def test_liste_vide_et_lots(self):
+        self.assertEqual(self._lire(ReponseJsonFlux(chanter.objects.values("id"), dict)), [])
+        response = ReponseJsonFlux(utilisateur.objects.order_by("id"), lambda u: u.id, taille_lot=2)
+        with self.assertNumQueries(2):
+            self.assertEqual(self._lire(response), [u.id for u in self.utilisateurs])
+        # Une requête bornée par lot, reprise après la dernière clé lue
+        response = ReponseJsonFlux(utilisateur.objects.values("id", "pseudo"), dict, taille_lot=1)
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual([u["pseudo"] for u in self._lire(response)], ["flux0", "flux1", "flux2"])
+        self.assertEqual(len(requetes), 4)
+        self.assertNotIn(">", requetes[0]["sql"])
+        self.assertTrue(all(">" in r["sql"] and "LIMIT 1" in r["sql"] for r in requetes[1:]))
+
+
+class ChantsChangementsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.garde = chant.objects.create(nom_chant="Le Chant des Wallons", paroles="...")
+        cls.supprime = chant.objects.create(nom_chant="La Pavée", paroles="...")
+
+    def _depuis(self, jeton):
+        response = self.client.get("/api/chants/changes/", {"since": jeton, "view": "lite"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_synchronisation_complete_puis_incrementale(self):
+        complet = self.client.get("/api/chants/changes/", {"view": "lite"}).json()
+        self.assertTrue(complet["full"])
+        self.assertEqual(len(complet["changed"]), 2)
+
+        # Rien n'a changé depuis un instant postérieur aux écritures
+        plus_tard = _encode_jeton_sync(timezone.now())
+        self.assertEqual(self._depuis(plus_tard)["changed"], [])
+
+        appartenir.objects.create(
+            chant=self.garde, categorie=categorie.objects.create(nom_categorie="Wallonie")
+        )
+        supprime_id = self.supprime.id
+        self.supprime.delete()
+        data = self._depuis(plus_tard)
+        self.assertFalse(data["full"])
+        self.assertEqual([c["id"] for c in data["changed"]], [self.garde.id])
+        self.assertEqual(data["changed"][0]["categories"], ["Wallonie"])
+        self.assertEqual(data["deleted"], [supprime_id])
+        self.assertTrue(chant_supprime.objects.filter(chant_id=supprime_id).exists())
+
+    def test_jeton_invalide(self):
+        response = self.client.get("/api/chants/changes/", {"since": "pas-un-jeton"})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(SYNC_SUPPRESSIONS_RETENTION_JOURS=30)
+    def test_retention_des_suppressions(self):
+        ancienne = chant_supprime.objects.create(
+            chant_id=9001, date_suppression=timezone.now() - timedelta(days=31)
+        )
+        recente = chant_supprime.objects.create(chant_id=9002)
+        call_command("purger_chants_supprimes", simulation=True, stdout=io.StringIO())
+        self.assertTrue(chant_supprime.objects.filter(id=ancienne.id).exists())
+        call_command("purger_chants_supprimes", stdout=io.StringIO())
+        self.assertFalse(chant_supprime.objects.filter(id=ancienne.id).exists())
+        self.assertTrue(chant_supprime.objects.filter(id=recente.id).exists())
+
+        # Jeton antérieur à la rétention : suppressions peut-être perdues
+        perime = _encode_jeton_sync(timezone.now() - timedelta(days=31))
+        response = self.client.get("/api/chants/changes/", {"since": perime})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()["full_resync"])
+        self.assertEqual(self._depuis(_encode_jeton_sync(timezone.now() - timedelta(days=29)))["deleted"], [9002])
+
+
+@override_settings(CACHES=CACHE_MEMOIRE, CATALOGUE_BUNDLE_ASYNC=False)
+class BundleHorsLigneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chants = [
+            chant.objects.create(nom_chant=nom, paroles=f"Paroles de {nom}")
+            for nom in ("Le Bon Vin", "La Bière", "Le Semeur")
+        ]
+
+    def setUp(self):
+        dossier = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(CATALOGUE_BUNDLE_DIR=dossier / "bundles", MEDIA_ROOT=dossier / "media"))
+        caches["catalogue"].clear()
+
+    def test_endpoint_et_304(self):
+        response = self.client.get("/api/export/bundle/")
+        self.assertEqual(response["Content-Type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+            manifest = json.loads(archive.read("manifest.json"))
+            entrees = json.loads(archive.read("chants.json"))
+        self.assertEqual(manifest["nb_chants"], 3)
+        self.assertEqual([e["nom_chant"] for e in entrees], ["La Bière", "Le Bon Vin", "Le Semeur"])
+        self.assertEqual(entrees[0]["paroles"], "Paroles de La Bière")
+
+        response = self.client.get("/api/export/bundle/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_reconstruction_incrementale_avec_miniatures(self):
+        image = io.BytesIO()
+        Image.new("RGB", (800, 600), "red").save(image, "PNG")
+        illustre = self.chants[0]
+        illustre.illustration_chant = SimpleUploadedFile("vin.png", image.getvalue())
+        illustre.save()
+
+        _, nb = construire_bundle(version_catalogue(), miniatures=True)
+        self.assertEqual(nb, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chants[1].paroles = "Nouvelles paroles"
+            self.chants[1].save()
+        chemin, nb = construire_bundle(version_catalogue(), miniatures=True)
+        self.assertEqual(nb, 1)
+
+        with zipfile.ZipFile(chemin) as archive:
+            entrees = {e["id"]: e for e in json.loads(archive.read("chants.json"))}
+            with Image.open(io.BytesIO(archive.read(f"miniatures/{illustre.id}.jpg"))) as miniature:
+                self.assertLessEqual(max(miniature.size), 320)
+        self.assertEqual(entrees[self.chants[1].id]["paroles"], "Nouvelles paroles")
+        self.assertEqual(len(list(chemin.parent.glob("*.zip"))), 1)
+
+    def test_construction_en_cours(self):
+        version = version_instantane()
+        caches["catalogue"].add("catalogue:bundle:simple", True)
+        response = self.client.get("/api/export/bundle/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response["Retry-After"], "10")
+
+        # Bundle d'une version précédente : servi en attendant
+        construire_bundle(version - 1)
+        response = self.client.get("/api/export/bundle/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"bundle-{version - 1}"')
+        self.assertFalse(chemin_bundle(version).exists())
+
+    def test_construction_en_tache_de_fond(self):
+        with override_settings(CATALOGUE_BUNDLE_ASYNC=True), \
+                mock.patch("gui.taches.threading.Thread") as thread, \
+                mock.patch("gui.bundle.construire_bundle") as construire:
+            response = self.client.get("/api/export/bundle/")
+        self.assertEqual(response.status_code, 202)
+        thread.return_value.start.assert_called_once()
+        construire.assert_not_called()
+
+    def test_note_sans_nouveau_bundle(self):
+        u = utilisateur.objects.create(
+            email="bundle@alzin.test", nom="N", prenom="P", pseudo="bundle", password="x",
+            ville="Mons", role=role.objects.create(nom_role="user"),
+        )
+        piste = piste_audio.objects.create(chant=self.chants[0], fichier_mp3="pistes_audio/b.mp3")
+        etag = self.client.get("/api/export/bundle/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            noter.objects.create(utilisateur=u, piste_audio=piste, valeur_note=3)
+        response = self.client.get("/api/export/bundle/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class ChantsTopTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role_user = role.objects.create(nom_role="user")
+        cls.utilisateurs = [
+            utilisateur.objects.create(
+                email=f"fan{i}@alzin.test", nom=f"Fan{i}", prenom="P",
+                pseudo=f"fan{i}", password="x", ville="Liège", role=role_user,
+            )
+            for i in range(3)
+        ]
+        cls.a, cls.b, cls.c = (
+            chant.objects.create(nom_chant=nom, paroles="...")
+            for nom in ("Valeureux Liégeois", "Li Bia Bouquet", "Tchantchès")
+        )
+        appartenir.objects.create(chant=cls.c, categorie=categorie.objects.create(nom_categorie="Liège"))
+
+    def _favori(self, u, c):
+        return self.client.post(
+            "/api/favoris/", {"utilisateur_id": u.id, "chant_id": c.id}, content_type="application/json"
+        )
+
+    def _top(self, **params):
+        return [(x["nom_chant"], x["nb_favoris"]) for x in self.client.get("/api/chants/top/", params).json()["results"]]
+
+    def test_compteurs_et_classement(self):
+        u1, u2, u3 = self.utilisateurs
+        for u, c in ((u1, self.b), (u2, self.b), (u1, self.c), (u2, self.c), (u3, self.a)):
+            self.assertEqual(self._favori(u, c).status_code, 201)
+        self.assertEqual(self._favori(u1, self.b).status_code, 400)
+
+        # Égalité b / c : départagée par l'id
+        self.assertEqual(self._top(), [("Li Bia Bouquet", 2), ("Tchantchès", 2), ("Valeureux Liégeois", 1)])
+        self.assertEqual(self._top(categorie="Liège", limit=5), [("Tchantchès", 2)])
+
+        fav = favoris.objects.get(utilisateur=u2, chant=self.b)
+        self.client.delete(f"/api/favoris/?id={fav.id}")
+        _cleanup_user_relations(u3)
+        self.assertEqual(self._top(), [("Tchantchès", 2), ("Li Bia Bouquet", 1)])
+
+    def test_commande_de_reconciliation(self):
+        favoris.objects.create(utilisateur=self.utilisateurs[0], chant=self.a)
+        chant.objects.filter(id=self.b.id).update(nb_favoris=7)
+        call_command("recalculer_favoris", stdout=io.StringIO())
+        self.assertEqual(
+            dict(chant.objects.values_list("nom_chant", "nb_favoris")),
+            {"Valeureux Liégeois": 1, "Li Bia Bouquet": 0, "Tchantchès": 0},
+        )
+
+
+class TendancesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role_user = role.objects.create(nom_role="user")
+        cls.u1, cls.u2 = (
+            utilisateur.objects.create(
+                email=f"t{i}@alzin.test", nom=f"T{i}", prenom="P",
+                pseudo=f"t{i}", password="x", ville="Namur", role=role_user,
+            )
+            for i in range(2)
+        )
+        cls.a, cls.b = (
+            chant.objects.create(nom_chant=nom, paroles="...") for nom in ("Li Bia Bouquet", "Le Grand Cerf")
+        )
+        cls.jour = timezone.localdate()
+
+    def _scores(self):
+        return dict(tendance_chant.objects.values_list("chant_id", "score"))
+
+    def test_incremental_identique_au_recalcul_complet(self):
+        fav = favoris.objects.create(utilisateur=self.u1, chant=self.a)
+        favoris.objects.filter(id=fav.id).update(date_favori=self.jour - timedelta(days=10))
+        commentaire.objects.create(utilisateur=self.u1, chant=self.b, texte="!")
+
+        recalculer_tendances(self.jour)
+        scores = self._scores()
+        self.assertAlmostEqual(scores[self.a.id], 3 * 0.5 ** (10 / 7))
+        self.assertAlmostEqual(scores[self.b.id], 2)
+        data = self.client.get("/api/chants/trending/").json()["results"]
+        self.assertEqual([c["id"] for c in data], [self.b.id, self.a.id])
+
+        # Le lendemain : une note sur a, tout le reste décroît
+        lendemain = self.jour + timedelta(days=1)
+        piste = piste_audio.objects.create(chant=self.a, fichier_mp3="pistes_audio/test.mp3")
+        note = noter.objects.create(utilisateur=self.u2, piste_audio=piste, valeur_note=5)
+        noter.objects.filter(id=note.id).update(date_rating=lendemain)
+        recalculer_tendances(lendemain)
+        incremental = self._scores()
+        self.assertAlmostEqual(incremental[self.a.id], 3 * 0.5 ** (11 / 7) + 1)
+
+        recalculer_tendances(lendemain, complet=True)
+        complet = self._scores()
+        for chant_id, score in complet.items():
+            self.assertAlmostEqual(incremental[chant_id], score)
+
+    def test_filtre_categorie(self):
+        commentaire.objects.create(utilisateur=self.u1, chant=self.b, texte="!")
+        favoris.objects.create(utilisateur=self.u1, chant=self.a)
+        appartenir.objects.create(chant=self.b, categorie=categorie.objects.create(nom_categorie="Namur"))
+        recalculer_tendances(self.jour)
+        data = self.client.get("/api/chants/trending/", {"categorie": "Namur"}).json()["results"]
+        self.assertEqual([(c["id"], c["score"]) for c in data], [(self.b.id, 2.0)])
+
+
+class ChantsSimilairesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role_user = role.objects.create(nom_role="user")
+        cls.chants = [chant.objects.create(nom_chant=f"Chant {i}", paroles="...") for i in range(4)]
+        a, b, c, d = cls.chants
+        paires = {0: (a, b, c), 1: (a, b), 2: (a, c)}
+        for i, favoris_utilisateur in paires.items():
+            u = utilisateur.objects.create(
+                email=f"s{i}@alzin.test", nom=f"S{i}", prenom="P",
+                pseudo=f"s{i}", password="x", ville="Ath", role=role_user,
+            )
+            for x in favoris_utilisateur:
+                favoris.objects.create(utilisateur=u, chant=x)
+        recalculer_nb_favoris()
+        cat = categorie.objects.create(nom_categorie="Ath")
+        for x in (c, d):
+            appartenir.objects.create(chant=x, categorie=cat)
+
+    def test_cooccurrence_et_categories(self):
+        recalculer_similaires()
+        a, b, c, d = self.chants
+        data = self.client.get(f"/api/chants/{a.id}/similaires/").json()["results"]
+        self.assertEqual([x["id"] for x in data], [b.id, c.id])
+
+        # d, sans favori : complété par les chants populaires de sa catégorie
+        data = self.client.get(f"/api/chants/{d.id}/similaires/", {"limit": 5}).json()["results"]
+        self.assertEqual([(x["id"], x["score"]) for x in data], [(c.id, 0.2)])
+        self.assertEqual(self.client.get("/api/chants/999/similaires/").status_code, 404)
+
+    def test_calcul_pur(self):
+        resultats = calculer_similaires([{1, 2}, {1, 2}, {1, 3}], {}, {}, k=5)
+        self.assertEqual([autre for _, autre in resultats[1]], [2, 3])
+        self.assertAlmostEqual(resultats[2][0][0], 0.8 * 2 / (3 * 2) ** 0.5)
+
+
+STOCKAGE_SIMPLE = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class MediasTestMixin:
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        u = utilisateur.objects.create(
+            email="d@alzin.test", nom="D", prenom="P", pseudo="d",
+            password="x", ville="Ath", role=role.objects.create(nom_role="user"),
+        )
+        self.demande = demande_chant.objects.create(
+            utilisateur=u, nom_chant="Demande", paroles="...",
+            paroles_pdf=SimpleUploadedFile("paroles.pdf", b"%PDF-1.4 contenu"),
+        )
+        demande_chant_audio.objects.create(
+            demande=self.demande,
+            fichier_mp3=SimpleUploadedFile("piste.mp3", b"ID3" + b"\0" * 64),
+        )
+
+
+@override_settings(STORAGES=STOCKAGE_SIMPLE)
+class PromotionFichiersTests(MediasTestMixin, TestCase):
+    def test_lien_physique(self):
+        nouveau = _create_chant_from_demande(self.demande)
+        source, cible = self.demande.paroles_pdf.path, nouveau.paroles_pdf.path
+        self.assertNotEqual(source, cible)
+        self.assertEqual(os.stat(source).st_ino, os.stat(cible).st_ino)
+        piste = nouveau.pistes_audio.get()
+        self.assertEqual(Path(piste.fichier_mp3.path).read_bytes(), b"ID3" + b"\0" * 64)
+
+        # Supprimer le chant ne touche pas au fichier de la demande
+        nouveau.delete()
+        self.assertFalse(os.path.exists(cible))
+        self.assertEqual(Path(source).read_bytes(), b"%PDF-1.4 contenu")
+
+    def test_copie_sans_lien(self):
+        with mock.patch("gui.stockage.os.link", side_effect=OSError):
+            nouveau = _create_chant_from_demande(self.demande)
+        cible = nouveau.paroles_pdf.path
+        self.assertNotEqual(os.stat(self.demande.paroles_pdf.path).st_ino, os.stat(cible).st_ino)
+        self.assertEqual(Path(cible).read_bytes(), b"%PDF-1.4 contenu")
+
+
+class StockageDedupTests(MediasTestMixin, TestCase):
+    def test_promotion_par_reference(self):
+        nom = self.demande.paroles_pdf.name
+        self.assertTrue(nom.startswith("cas/"))
+        with self.captureOnCommitCallbacks(execute=True):
+            nouveau = _create_chant_from_demande(self.demande)
+        self.assertEqual(nouveau.paroles_pdf.name, nom)
+        self.assertEqual(fichier_media.objects.get(nom=nom).nb_references, 2)
+
+        # Le chant supprimé libère sa référence, le fichier reste
+        with self.captureOnCommitCallbacks(execute=True):
+            nouveau.delete()
+        self.assertEqual(fichier_media.objects.get(nom=nom).nb_references, 1)
+        self.assertEqual(Path(self.demande.paroles_pdf.path).read_bytes(), b"%PDF-1.4 contenu")
+
+        # Dernière référence : fichier effacé
+        with self.captureOnCommitCallbacks(execute=True):
+            supprimer_fichier(self.demande.paroles_pdf)
+        self.assertFalse(fichier_media.objects.filter(nom=nom).exists())
+        self.assertFalse(os.path.exists(Path(self.media.name) / nom))
+
+    def test_demande_supprimee_libere_ses_fichiers(self):
+        noms = [self.demande.paroles_pdf.name, self.demande.pistes_audio.get().fichier_mp3.name]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.demande.delete()
+        for nom in noms:
+            self.assertFalse(fichier_media.objects.filter(nom=nom).exists())
+            self.assertFalse(os.path.exists(Path(self.media.name) / nom))
+
+    def test_renvoi_meme_contenu(self):
+        c = chant.objects.create(nom_chant="Piste", paroles="...")
+        piste = piste_audio.objects.create(
+            chant=c, fichier_mp3=SimpleUploadedFile("autre.MP3", b"ID3" + b"\0" * 64),
+        )
+        audio = self.demande.pistes_audio.get()
+        self.assertEqual(piste.fichier_mp3.name, audio.fichier_mp3.name)
+        self.assertEqual(len(list((Path(self.media.name) / "cas").rglob("*.mp3"))), 1)
+        self.assertEqual(fichier_media.objects.get(nom=audio.fichier_mp3.name).nb_references, 2)
+
+    def test_remplacement_libere_l_ancien(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            nouveau = _create_chant_from_demande(self.demande)
+        nom = nouveau.paroles_pdf.name
+        self.assertEqual(fichier_media.objects.get(nom=nom).nb_references, 2)
+
+        # PUT avec un autre PDF : une référence de moins pour l'ancien
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                f"/api/chants/{nouveau.id}/",
+                encode_multipart(BOUNDARY, {"paroles_pdf": SimpleUploadedFile("v2.pdf", b"%PDF-1.4 v2")}),
+                content_type=MULTIPART_CONTENT,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(fichier_media.objects.get(nom=nom).nb_references, 1)
+
+        # Retrait du fichier de la demande : dernière référence, fichier effacé
+        self.demande.paroles_pdf = None
+        with self.captureOnCommitCallbacks(execute=True):
+            self.demande.save()
+        self.assertFalse(fichier_media.objects.filter(nom=nom).exists())
+        self.assertFalse(os.path.exists(Path(self.media.name) / nom))
+
+        nouveau.refresh_from_db()
+        self.assertEqual(nouveau.paroles_pdf.read(), b"%PDF-1.4 v2")
+
+    def test_enregistrement_echoue_sans_reference(self):
+        c = chant.objects.create(nom_chant="Échec", paroles="...")
+        contenu = b"ID3" + b"\1" * 64
+        nom = nom_contenu(hashlib.sha256(contenu).hexdigest(), "echec.mp3")
+        with mock.patch.object(piste_audio, "_do_insert", side_effect=IntegrityError("refusé")):
+            with self.assertRaises(IntegrityError):
+                piste_audio.objects.create(chant=c, fichier_mp3=SimpleUploadedFile("echec.mp3", contenu))
+        self.assertFalse(fichier_media.objects.filter(nom=nom).exists())
+
+    def test_contenu_repris_avant_effacement(self):
+        nom = self.demande.paroles_pdf.name
+        with self.captureOnCommitCallbacks() as effacements:
+            supprimer_fichier(self.demande.paroles_pdf)
+        self.assertEqual(fichier_media.objects.get(nom=nom).nb_references, 0)
+
+        # Même contenu renvoyé avant l'effacement différé : le fichier reste
+        c = chant.objects.create(
+            nom_chant="Repris", paroles="...",
+            paroles_pdf=SimpleUploadedFile("repris.pdf", b"%PDF-1.4 contenu"),
+        )
+        self.assertEqual(c.paroles_pdf.name, nom)
+        for effacer in effacements:
+            effacer()
+        self.assertEqual(fichier_media.objects.get(nom=nom).nb_references, 1)
+        self.assertEqual(Path(c.paroles_pdf.path).read_bytes(), b"%PDF-1.4 contenu")
+
+    def test_migration_fichiers_anterieurs(self):
+        ancien = Path(self.media.name) / "partitions" / "ancienne.pdf"
+        ancien.parent.mkdir()
+        ancien.write_bytes(b"%PDF-1.4 contenu")
+        c = chant.objects.create(nom_chant="Ancien", paroles="...")
+        chant.objects.filter(id=c.id).update(partition="partitions/ancienne.pdf")
+        fichier_media.objects.update(nb_references=7)
+
+        call_command("dedupliquer_medias", stdout=io.StringIO())
+        c.refresh_from_db()
+        self.assertEqual(c.partition.name, self.demande.paroles_pdf.name)
+        self.assertFalse(ancien.exists())
+        self.assertEqual(fichier_media.objects.get(nom=c.partition.name).nb_references, 2)
+
+
+class MediaViewTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.contenu = bytes(range(256)) * 4
+        self.nom = default_storage.save("pistes_audio/piste.mp3", io.BytesIO(self.contenu))
+
+    def test_fichier_complet_et_cache(self):
+        response = self.client.get(f"/media/{self.nom}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.contenu)
+        self.assertEqual(response["Content-Type"], "audio/mpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response = self.client.get(f"/media/{self.nom}", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_declinaisons_immuables_si_signees(self):
+        cle = cle_derives(self.nom)
+        for nom, immuable in (
+            (f"derives/{cle}/320.{SIGNATURE_DERIVES}.webp", True),
+            (f"derives/{cle}/apercu.0123abcd.jpg", True),
+            # Réécrites sur place : revalidées
+            (f"derives/{cle}/320.webp", False),
+            (f"derives/{cle}/apercu.jpg", False),
+        ):
+            chemin = Path(self.media.name) / nom
+            chemin.parent.mkdir(parents=True, exist_ok=True)
+            chemin.write_bytes(b"x")
+            response = self.client.get(f"/media/{nom}")
+            self.assertEqual("immutable" in response["Cache-Control"], immuable, nom)
+
+    def test_plages(self):
+        response = self.client.get(f"/media/{self.nom}", HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(b"".join(response.streaming_content), self.contenu[10:20])
+
+        response = self.client.get(f"/media/{self.nom}", HTTP_RANGE="bytes=-4")
+        self.assertEqual(b"".join(response.streaming_content), self.contenu[-4:])
+
+        response = self.client.get(f"/media/{self.nom}", HTTP_RANGE="bytes=2000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+        # If-Range périmé : fichier complet
+        response = self.client.get(f"/media/{self.nom}", HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"x"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_x_accel_redirect(self):
+        response = self.client.get(f"/media/{self.nom}", HTTP_X_MEDIA_ACCEL="1")
+        self.assertEqual(response["X-Accel-Redirect"], f"/_medias/{self.nom}")
+        self.assertEqual(response.content, b"")
+
+    def test_chemins_refuses(self):
+        for chemin in ("../settings.py", "cas/tmp/x", ".cache", "absent.mp3"):
+            self.assertEqual(self.client.get(f"/media/{chemin}").status_code, 404)
+
+
+@override_settings(IMAGES_DERIVES_ASYNC=False)
+class DeclinaisonsImagesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def _image(self, taille, mode="RGB"):
+        sortie = io.BytesIO()
+        Image.new(mode, taille, "red").save(sortie, "PNG")
+        return sortie.getvalue()
+
+    def test_declinaisons_a_l_enregistrement(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            c = chant.objects.create(
+                nom_chant="Illustré", paroles="...",
+                illustration_chant=SimpleUploadedFile("grand.png", self._image((1500, 1000), "RGBA")),
+            )
+        revision = c.revision
+        c.refresh_from_db()
+        self.assertGreater(c.revision, revision)
+        derives = c.illustration_derives
+        self.assertEqual(derives["source"], c.illustration_chant.name)
+        self.assertEqual(sorted(derives["jpeg"], key=int), ["320", "640", "1280"])
+        with Image.open(Path(self.media.name) / derives["webp"]["640"]) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (640, 427)))
+
+        data = self.client.get(f"/api/chants/{c.id}/").json()
+        self.assertEqual(
+            data["illustration_srcset"]["jpeg"]["320"],
+            f"http://testserver/media/{derives['jpeg']['320']}",
+        )
+
+        # Illustration retirée : plus de déclinaisons
+        c.illustration_chant = None
+        c.save()
+        c.refresh_from_db()
+        self.assertEqual(c.illustration_derives, {})
+
+    def test_nouveaux_reglages_nouvelles_urls(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            c = chant.objects.create(
+                nom_chant="Réglé", paroles="...",
+                illustration_chant=SimpleUploadedFile("regle.png", self._image((700, 500))),
+            )
+        c.refresh_from_db()
+        avant = c.illustration_derives["webp"]["320"]
+        self.assertTrue(avant.endswith(f".{SIGNATURE_DERIVES}.webp"))
+
+        # Réglages modifiés : rattrapés sans --tout, sous de nouveaux noms
+        with mock.patch("gui.images.SIGNATURE_DERIVES", "0badcafe"), \
+                mock.patch("gui.management.commands.generer_derives_images.SIGNATURE_DERIVES", "0badcafe"):
+            call_command("generer_derives_images", processus=1, stdout=io.StringIO())
+        c.refresh_from_db()
+        apres = c.illustration_derives["webp"]["320"]
+        self.assertTrue(apres.endswith(".0badcafe.webp"))
+        self.assertTrue((Path(self.media.name) / apres).exists())
+
+    def test_petite_image_sans_agrandissement(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            c = chant.objects.create(
+                nom_chant="Petit", paroles="...",
+                illustration_chant=SimpleUploadedFile("petit.png", self._image((100, 50))),
+            )
+        c.refresh_from_db()
+        self.assertEqual(list(c.illustration_derives["jpeg"]), ["100"])
+
+    def test_commande_rattrapage(self):
+        nom = default_storage.save("illustrations/ancien.png", io.BytesIO(self._image((700, 700))))
+        c = chant.objects.create(nom_chant="Ancien", paroles="...")
+        chant.objects.filter(id=c.id).update(illustration_chant=nom)
+
+        call_command("generer_derives_images", processus=2, stdout=io.StringIO())
+        c.refresh_from_db()
+        self.assertEqual(sorted(c.illustration_derives["webp"], key=int), ["320", "640"])
+
+        # --tout réécrit les fichiers existants et efface les largeurs abandonnées
+        ancienne = Path(self.media.name) / c.illustration_derives["jpeg"]["320"]
+        os.utime(ancienne, (0, 0))
+        abandonnee = ancienne.parent / f"160.{SIGNATURE_DERIVES}.jpg"
+        abandonnee.write_bytes(b"ancienne largeur")
+        call_command("generer_derives_images", processus=1, tout=True, stdout=io.StringIO())
+        self.assertGreater(ancienne.stat().st_mtime, 0)
+        self.assertFalse(abandonnee.exists())
+
+
+def fabriquer_mp3(nb_trames=100, xing=None):
+    """MPEG-1 couche III, 128 kbit/s, 44,1 kHz, stéréo, entre tags ID3v2 et ID3v1."""
+    trames = []
+    for i in range(nb_trames):
+        trame = bytearray(417)
+        trame[:4] = b"\xff\xfb\x90\x00"
+        if i == 0 and xing is not None:
+            trame[36:48] = b"Xing" + (1).to_bytes(4, "big") + xing.to_bytes(4, "big")
+        trames.append(bytes(trame))
+    id3v2 = b"ID3\x03\x00\x00" + bytes([0, 0, 0, 20]) + b"\x00" * 20
+    id3v1 = b"TAG" + b"\x00" * 125
+    return id3v2 + b"".join(trames) + id3v1
+
+
+@override_settings(AUDIO_ANALYSE_ASYNC=False)
+class MetadonneesAudioTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.chant = chant.objects.create(nom_chant="Sonore", paroles="...")
+
+    def _analyser(self, contenu):
+        chemin = Path(self.media.name) / "test.mp3"
+        chemin.write_bytes(contenu)
+        return analyser_mp3(chemin)
+
+    def test_parcours_des_trames(self):
+        infos = self._analyser(fabriquer_mp3())
+        self.assertEqual(infos["frequence"], 44100)
+        self.assertEqual(infos["debit"], 128)
+        self.assertAlmostEqual(infos["duree"], 100 * 1152 / 44100, places=3)
+        self.assertEqual(infos["taille"], len(fabriquer_mp3()))
+
+    def test_entete_xing(self):
+        infos = self._analyser(fabriquer_mp3(nb_trames=3, xing=1000))
+        self.assertAlmostEqual(infos["duree"], 1000 * 1152 / 44100, places=3)
+        self.assertIsNone(self._analyser(b"ID3" + b"\0" * 64))
+
+    def test_analyse_a_l_envoi(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            piste_audio.objects.create(
+                chant=self.chant, fichier_mp3=SimpleUploadedFile("son.mp3", fabriquer_mp3()),
+            )
+        piste = self.client.get(f"/api/chants/{self.chant.id}/").json()["pistes_audio"][0]
+        self.assertEqual((piste["debit"], piste["frequence"]), (128, 44100))
+        self.assertAlmostEqual(piste["duree"], 2.612, places=3)
+
+    def test_commande_rattrapage(self):
+        nom = default_storage.save("pistes_audio/ancienne.mp3", io.BytesIO(fabriquer_mp3(50)))
+        piste = piste_audio.objects.create(chant=self.chant)
+        piste_audio.objects.filter(id=piste.id).update(fichier_mp3=nom)
+
+        call_command("analyser_audios", processus=2, stdout=io.StringIO())
+        piste.refresh_from_db()
+        self.assertAlmostEqual(piste.duree, 50 * 1152 / 44100, places=3)
+
+
+def fabriquer_pdf(pages=3, taille=(595, 842)):
+    sortie = io.BytesIO()
+    images = [Image.new("RGB", taille, "white") for _ in range(pages)]
+    images[0].save(sortie, "PDF", save_all=True, append_images=images[1:], resolution=72)
+    return sortie.getvalue()
+
+
+@override_settings(PDF_ANALYSE_ASYNC=False)
+class InfosPdfTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def _analyser(self, contenu):
+        chemin = Path(self.media.name) / "test.pdf"
+        chemin.write_bytes(contenu)
+        return analyser_pdf(chemin)
+
+    def test_pages_et_format(self):
+        self.assertEqual(
+            self._analyser(fabriquer_pdf()),
+            {"pages": 3, "largeur_mm": 209.9, "hauteur_mm": 297.0},
+        )
+        self.assertIsNone(self._analyser(b"pas un pdf"))
+        self.assertIsNone(self._analyser(b""))
+
+    def test_flux_d_objets_compresse(self):
+        objets = (
+            b"2 0 3 52 << /Type /Pages /Count 7 /Kids [3 0 R] >> "
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 842 595] /Rotate 90 >>"
+        )
+        flux = zlib.compress(objets)
+        contenu = (
+            b"%PDF-1.5\n1 0 obj\n<< /Type /ObjStm /N 2 /First 9 /Filter /FlateDecode /Length "
+            + str(len(flux)).encode() + b" >>\nstream\n" + flux + b"\nendstream\nendobj\n%%EOF\n"
+        )
+        self.assertEqual(
+            self._analyser(contenu),
+            {"pages": 7, "largeur_mm": 209.9, "hauteur_mm": 297.0},
+        )
+        # Flux décompressé par petits blocs : même résultat
+        with mock.patch("gui.documents.TAILLE_BLOC_FLUX", 8):
+            self.assertEqual(self._analyser(contenu)["pages"], 7)
+
+    def test_analyse_a_l_envoi_et_promotion(self):
+        u = utilisateur.objects.create(
+            email="p@alzin.test", nom="P", prenom="P", pseudo="p",
+            password="x", ville="Ath", role=role.objects.create(nom_role="user"),
+        )
+        rendu = Image.new("RGB", (595, 842), "blue")
+        with mock.patch("gui.documents._rendre_premiere_page", return_value=rendu), \
+                self.captureOnCommitCallbacks(execute=True):
+            demande = demande_chant.objects.create(
+                utilisateur=u, nom_chant="Paroles", paroles="...",
+                paroles_pdf=SimpleUploadedFile("paroles.pdf", fabriquer_pdf(2)),
+            )
+        demande.refresh_from_db()
+        self.assertEqual(demande.pdf_infos["paroles_pdf"]["pages"], 2)
+
+        # Le chant reprend les infos de la demande sans rouvrir le PDF
+        with mock.patch("gui.documents.decrire_pdf") as decrire, \
+                self.captureOnCommitCallbacks(execute=True):
+            nouveau = _create_chant_from_demande(demande)
+        decrire.assert_not_called()
+
+        data = self.client.get(f"/api/chants/{nouveau.id}/").json()
+        self.assertEqual(data["paroles_pdf_infos"]["pages"], 2)
+        self.assertIsNone(data["partition_infos"])
+        apercu = data["paroles_pdf_infos"]["apercu_url"]
+        with Image.open(Path(self.media.name) / apercu.split("/media/", 1)[1]) as image:
+            self.assertEqual(image.size, (320, 453))
+
+
+class ModificationMultipartTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.chant = chant.objects.create(nom_chant="Ancien", paroles="...")
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024, FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_put_multipart_sans_charger_le_corps(self):
+        # request.body refuserait un corps plus grand que DATA_UPLOAD_MAX_MEMORY_SIZE
+        partition = fabriquer_pdf(1) + b"%" * 20000
+        response = self.client.put(
+            f"/api/chants/{self.chant.id}/",
+            encode_multipart(BOUNDARY, {
+                "nom_chant": "Nouveau",
+                "partition": SimpleUploadedFile("partition.pdf", partition),
+            }),
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.chant.refresh_from_db()
+        self.assertEqual(self.chant.nom_chant, "Nouveau")
+        self.assertEqual(Path(self.chant.partition.path).read_bytes(), partition)
+
+
+class TeleversementsTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(
+            MEDIA_ROOT=self.media.name,
+            TELEVERSEMENTS_DIR=Path(self.media.name) / "televersements",
+            TELEVERSEMENT_BLOC_MAX=8192,
+            AUDIO_ANALYSE_ASYNC=False,
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.user = utilisateur.objects.create(
+            email="t@alzin.test", nom="T", prenom="T", pseudo="t",
+            password="x", ville="Ath", role=role.objects.create(nom_role="user"),
+        )
+        self.chant = chant.objects.create(nom_chant="Long", paroles="...")
+        self.contenu = fabriquer_mp3(10)
+
+    def _declarer(self, **autres):
+        corps = {
+            "cible": "piste_audio",
+            "chant_id": self.chant.id,
+            "nom_fichier": "long.mp3",
+            "taille": len(self.contenu),
+            "sha256": hashlib.sha256(self.contenu).hexdigest(),
+            **autres,
+        }
+        response = self.client.post(
+            "/api/uploads/", json.dumps(corps), content_type="application/json",
+            HTTP_X_USER_EMAIL=self.user.email,
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["id"]
+
+    def _bloc(self, envoi_id, offset, octets):
+        return self.client.patch(
+            f"/api/uploads/{envoi_id}/", octets, content_type="application/offset+octet-stream",
+            HTTP_X_USER_EMAIL=self.user.email, HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_envoi_en_deux_blocs(self):
+        envoi_id = self._declarer()
+        milieu = len(self.contenu) // 2
+
+        response = self._bloc(envoi_id, 0, self.contenu[:milieu])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["offset"], milieu)
+        self.assertFalse(response.json()["termine"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._bloc(envoi_id, milieu, self.contenu[milieu:])
+        self.assertEqual(response.status_code, 201)
+        piste = piste_audio.objects.get(id=response.json()["objet"]["id"])
+        self.assertEqual(piste.utilisateur, self.user)
+        self.assertEqual(Path(piste.fichier_mp3.path).read_bytes(), self.contenu)
+        self.assertTrue(piste.fichier_mp3.name.startswith("cas/"))
+        self.assertAlmostEqual(piste.duree, 10 * 1152 / 44100, places=3)
+
+        # Session et fichier partiel nettoyés
+        self.assertFalse(televersement.objects.exists())
+        self.assertEqual(list((Path(self.media.name) / "televersements").iterdir()), [])
+
+    def test_offset_incorrect_et_reprise(self):
+        envoi_id = self._declarer()
+        self.assertEqual(self._bloc(envoi_id, 0, self.contenu[:1000]).status_code, 200)
+        self.assertEqual(self._bloc(envoi_id, 0, self.contenu[:1000]).status_code, 409)
+
+        # Reprise : le client demande où il en est
+        response = self.client.get(f"/api/uploads/{envoi_id}/", HTTP_X_USER_EMAIL=self.user.email)
+        self.assertEqual(response["Upload-Offset"], "1000")
+        self.assertEqual(self._bloc(envoi_id, 1000, self.contenu[1000:]).status_code, 201)
+
+    def test_bloc_trop_grand(self):
+        grand = fabriquer_mp3(30)
+        envoi_id = self._declarer(taille=len(grand))
+        self.assertEqual(self._bloc(envoi_id, 0, grand).status_code, 413)
+        self.assertEqual(televersement.objects.get().recu, 0)
+
+    def test_empreinte_differente(self):
+        envoi_id = self._declarer(sha256="0" * 64)
+        self.assertEqual(self._bloc(envoi_id, 0, self.contenu).status_code, 422)
+        self.assertFalse(televersement.objects.exists())
+        self.assertFalse(piste_audio.objects.exists())
+
+    def test_envoi_d_un_autre_utilisateur(self):
+        envoi_id = self._declarer()
+        autre = utilisateur.objects.create(
+            email="o@alzin.test", nom="O", prenom="O", pseudo="o",
+            password="x", ville="Ath", role=self.user.role,
+        )
+        response = self.client.delete(f"/api/uploads/{envoi_id}/", HTTP_X_USER_EMAIL=autre.email)
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(televersement.objects.exists())
+
+
+class NettoyageMediasTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(
+            MEDIA_ROOT=self.media.name,
+            TELEVERSEMENTS_DIR=Path(self.media.name) / "televersements",
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.racine = Path(self.media.name)
+
+    def _ecrire(self, nom, contenu=b"x" * 100):
+        chemin = self.racine / nom
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        chemin.write_bytes(contenu)
+        return chemin
+
+    def _nettoyer(self, *options):
+        sortie = io.StringIO()
+        call_command("nettoyer_medias", "--delai", "0", *options, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_orphelins_effaces(self):
+        garde = chant.objects.create(
+            nom_chant="Gardé", paroles="...",
+            partition=SimpleUploadedFile("p.pdf", b"%PDF-1.4 garde"),
+        )
+        # Ancien contenu remplacé sans signal : compteur resté à 1
+        remplace = default_storage.save("partitions/ancienne.pdf", io.BytesIO(b"%PDF-1.4 ancien"))
+        fichier_media.objects.update(date_reference=timezone.now() - timedelta(days=2))
+        vieux = self._ecrire("partitions/vieux.pdf")
+        tmp = self._ecrire("cas/tmp/tmpabc")
+        derive_garde = self._ecrire(f"derives/{cle_derives(garde.partition.name)}/apercu.jpg")
+        derive_orphelin = self._ecrire(f"derives/{'0' * 64}/320.webp")
+        autre = self._ecrire("ailleurs/fichier.bin")
+
+        rapport = self._nettoyer("--simulation")
+        self.assertIn("4 fichier(s) à effacer", rapport)
+        self.assertTrue(vieux.exists() and (self.racine / remplace).exists())
+
+        self._nettoyer("--processus", "2")
+        for chemin in (vieux, tmp, derive_orphelin, self.racine / remplace):
+            self.assertFalse(chemin.exists(), chemin)
+        self.assertFalse(derive_orphelin.parent.exists())
+        self.assertFalse(fichier_media.objects.filter(nom=remplace).exists())
+        for chemin in (Path(garde.partition.path), derive_garde, autre):
+            self.assertTrue(chemin.exists(), chemin)
+
+    def test_reference_recente_gardee(self):
+        nom = default_storage.save("partitions/envoi.pdf", io.BytesIO(b"%PDF-1.4 en cours"))
+        fichier_media.objects.update(date_reference=timezone.now() + timedelta(minutes=5))
+        self.assertIn("1 contenu(s) cas/ gardé(s)", self._nettoyer())
+        self.assertTrue((self.racine / nom).exists())
+
+    def test_envois_par_blocs_abandonnes(self):
+        u = utilisateur.objects.create(
+            email="n@alzin.test", nom="N", prenom="N", pseudo="n",
+            password="x", ville="Ath", role=role.objects.create(nom_role="user"),
+        )
+        envoi = televersement.objects.create(
+            utilisateur=u, cible="piste_audio", nom_fichier="a.mp3", taille=10, sha256="0" * 64,
+        )
+        partiel = self._ecrire(f"televersements/{envoi.id}.part", b"12345")
+        perdu = self._ecrire("televersements/inconnu.part", b"123")
+
+        self._nettoyer()
+        self.assertFalse(televersement.objects.exists())
+        self.assertFalse(partiel.exists() or perdu.exists())
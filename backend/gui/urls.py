@@ -22,7 +22,15 @@ urlpatterns = [
     path("maitres/", views.maitres_api, name="api_maitres"),
     
     path("chants/", views.chants_api, name="api_chants"),
+    path("chants/search/", views.chants_recherche_api, name="api_chants_recherche"),
+    path("chants/autocomplete/", views.chants_autocompletion_api, name="api_chants_autocompletion"),
+    path("chants/batch/", views.chants_batch_api, name="api_chants_batch"),
+    path("chants/top/", views.chants_top_api, name="api_chants_top"),
+    path("chants/trending/", views.chants_tendances_api, name="api_chants_tendances"),
+    path("chants/changes/", views.chants_changements_api, name="api_chants_changements"),
+    path("export/bundle/", views.export_bundle_api, name="api_export_bundle"),
     path("chants/<int:chant_id>/",views.chants_api, name="api_chant_detail"),
+    path("chants/<int:chant_id>/similaires/", views.chants_similaires_api, name="api_chant_similaires"),
     
     path("appartenir/", views.appartenir_api, name="api_appartenir"),
     
@@ -78,6 +86,9 @@ urlpatterns = [
     path("contenir/", views.contenir_api, name="api_contenir"),
     path("fournir/", views.fournir_api, name="api_fournir"),
     path("support/", views.support_api, name="api_support"),
+
+    path("uploads/", views.televersements_api, name="api_televersements"),
+    path("uploads/<uuid:televersement_id>/", views.televersement_api, name="api_televersement"),
     
     
 ]
@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from django.http import HttpResponse, QueryDict
+from django.http import FileResponse, HttpResponse, QueryDict
 from datetime import date
 from django.views.decorators.http import require_http_methods
 from json import JSONDecodeError
@@ -10,22 +10,22 @@ from django.conf import settings
 
 #views pour le site Alzin
 import json
+import base64
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.hashers import check_password, make_password
-from django.forms.models import model_to_dict
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from django.utils import timezone
 from django.db import models, IntegrityError, transaction
 import os
 from json import JSONDecodeError
-from django.db.models import Avg, Prefetch
+from django.db.models import Avg, Count, Exists, F, OuterRef, Prefetch, Q, Sum
 from django.core.exceptions import DisallowedHost
+from django.core.serializers.json import DjangoJSONEncoder
 
 
-from datetime import date
+from datetime import date, datetime, timedelta
 def parse_iso_date(value):
     if not value:
         return None
@@ -47,12 +47,21 @@ def api_root(request):
         ],
     })
 
+
+@require_http_methods(["GET", "HEAD"])
+def media_view(request, chemin):
+    # Remplace static() : Range, ETag, cache long et X-Accel-Redirect (gui/medias.py)
+    return servir_media(request, chemin)
+
 DELETED_USER_LABEL = "Utilisateur supprimé"
 DELETED_USER_EMAIL = "deleted@alzin.local"
 
 from .models import (
     utilisateur,
     chant,
+    chant_similaire,
+    chant_supprime,
+    tendance_chant,
     piste_audio,
     favoris,
     commentaire,
@@ -77,6 +86,38 @@ from .models import (
     demande_chant_audio,
     demande_piste_audio,
     demande_modification_chant,
+    televersement,
+    horizon_chants_supprimes,
+    enregistrer_et_invalider,
+)
+from .audio import CHAMPS_AUDIO
+from .bundle import DELAI_REESSAI_BUNDLE, obtenir_bundle
+from .cache_catalogue import (
+    cache_catalogue,
+    invalider_catalogue,
+    poser_entetes_validation,
+    reponse_conditionnelle,
+    validation_catalogue,
+    version_instantane,
+)
+from .flux_json import ReponseJsonFlux
+from .images import FORMATS as FORMATS_DERIVES
+from .instantane import instantane_catalogue
+from .medias import servir_media
+from .recherche import (
+    autocompleter_chants,
+    extraire_termes,
+    extrait_surligne,
+    rechercher_chants,
+    trouver_doublon_chant,
+    trouver_doublon_demande,
+)
+from .stockage import promouvoir_fichier
+from .televersements import (
+    ErreurTeleversement,
+    ajouter_bloc,
+    creer_televersement,
+    supprimer_televersement,
 )
 
 
@@ -84,20 +125,29 @@ def _extract_body_data(request):
     """
     Django ne remplit pas request.POST/FILES pour PUT/PATCH multipart.
     On parse donc manuellement lorsqu'on reçoit ces méthodes.
+
+    Comme pour POST, le multipart est lu directement sur le flux de la
+    requête : les fichiers passent par les upload handlers (fichier
+    temporaire au-delà de FILE_UPLOAD_MAX_MEMORY_SIZE) sans que le corps
+    entier soit chargé en mémoire.
     """
     if request.method not in ("PUT", "PATCH"):
         return request.POST, request.FILES
 
     content_type = request.META.get("CONTENT_TYPE", "")
     if content_type.startswith("multipart/"):
-        stream = BytesIO(request.body)
+        # Corps déjà lu (request.body) : on repart de la copie en mémoire
+        stream = BytesIO(request._body) if hasattr(request, "_body") else request
         parser = MultiPartParser(
             request.META,
             stream,
             request.upload_handlers,
             request.encoding or settings.DEFAULT_CHARSET,
         )
-        return parser.parse()
+        # Rangés sur la requête : request.close() ferme (et efface) les
+        # fichiers temporaires en fin de réponse, comme pour POST
+        request._post, request._files = parser.parse()
+        return request._post, request._files
 
     encoding = request.encoding or settings.DEFAULT_CHARSET
     body = request.body.decode(encoding or "utf-8")
@@ -110,15 +160,8 @@ def _extract_body_data(request):
 @require_http_methods(["GET", "POST"])
 def utilisateurs_api(request):
     if request.method == "GET":
-        users = utilisateur.objects.all()
-        data = [
-            model_to_dict(
-                u,
-                fields=["id", "email", "nom", "prenom", "pseudo", "ville"]
-            )
-            for u in users
-        ]
-        return JsonResponse(data, safe=False)
+        users = utilisateur.objects.order_by("id").values("id", "email", "nom", "prenom", "pseudo", "ville")
+        return ReponseJsonFlux(users, dict)
 
     # POST : création d'un utilisateur
     try:
@@ -298,8 +341,11 @@ def admin_demandes_chants_api(request, demande_id=None):
     if action == "ACCEPTER":
         if demande.statut != "EN_ATTENTE":
             return JsonResponse({"error": "Demande déjà traitée"}, status=400)
-        if chant.objects.filter(nom_chant__iexact=demande.nom_chant).exists():
-            return JsonResponse({"error": "Un chant avec ce nom existe déjà."}, status=409)
+        doublon = None if _forcer(body.get("forcer")) else trouver_doublon_chant(demande.nom_chant)
+        if doublon:
+            return _conflit_doublon(
+                f"Un chant avec ce nom existe déjà ({doublon.nom_chant}).", "chant_existant", doublon
+            )
 
         new_chant = _create_chant_from_demande(demande)
         demande.statut = "ACCEPTEE"
@@ -501,11 +547,36 @@ def logout_api(request):
 
 def _cleanup_user_relations(user_obj: utilisateur):
 
+    # Chants dont le pseudo affiché va disparaître (ETag à renouveler)
+    chants_touches = set(chant.objects.filter(utilisateur=user_obj).values_list("id", flat=True))
+    chants_touches.update(piste_audio.objects.filter(utilisateur=user_obj).values_list("chant_id", flat=True))
+
+    # Compteurs de favoris des chants mis en favori par l'utilisateur
+    chant.objects.filter(
+        id__in=favoris.objects.filter(utilisateur=user_obj).values("chant_id"),
+        nb_favoris__gt=0,
+    ).update(nb_favoris=F("nb_favoris") - 1)
+
     # Relations SET_NULL
     chant.objects.filter(utilisateur=user_obj).update(utilisateur=None)
     appartenir.objects.filter(utilisateur=user_obj).update(utilisateur=None)
     piste_audio.objects.filter(utilisateur=user_obj).update(utilisateur=None)
 
+    # Retirer les notes de l'utilisateur des agrégats des pistes (une
+    # requête d'agrégat, puis une mise à jour par piste)
+    notes_par_piste = (
+        noter.objects.filter(utilisateur=user_obj)
+        .values("piste_audio_id")
+        .annotate(nb=Count("id"), somme=Sum("valeur_note"))
+    )
+    for ligne in notes_par_piste:
+        piste_audio.objects.filter(id=ligne["piste_audio_id"]).update(
+            nb_notes=F("nb_notes") - ligne["nb"],
+            somme_notes=F("somme_notes") - (ligne["somme"] or 0),
+        )
+
+    enregistrer_et_invalider(chants_touches)
+
     # Relations en cascade (on supprime les objets dépendants)
     demande_chant.objects.filter(utilisateur=user_obj).delete()
     demande_modification_chant.objects.filter(utilisateur=user_obj).delete()
@@ -530,19 +601,16 @@ def admin_users_api(request, user_id=None, action=None):
 
     #GET /api/admin/users/
     if request.method == "GET" and user_id is None:
-        users = utilisateur.objects.all()
-        data = []
-        for u in users:
-            data.append({
-                "id": u.id,
-                "nom": u.nom,
-                "prenom": u.prenom,
-                "pseudo": u.pseudo,
-                "email": u.email,
-                "ville": u.ville,
-                "role": u.role.nom_role if u.role else "user",
-            })
-        return JsonResponse(data, safe=False)
+        users = utilisateur.objects.select_related("role").order_by("id")
+        return ReponseJsonFlux(users, lambda u: {
+            "id": u.id,
+            "nom": u.nom,
+            "prenom": u.prenom,
+            "pseudo": u.pseudo,
+            "email": u.email,
+            "ville": u.ville,
+            "role": u.role.nom_role if u.role else "user",
+        })
 
     if user_id is None:
         return JsonResponse({"error": "Paramètre 'user_id' requis"}, status=400)
@@ -647,6 +715,25 @@ def _resolve_demande_categorie(form_data):
     return None
 
 
+def _forcer(valeur):
+    return valeur in (True, 1, "1", "true")
+
+
+def _conflit_doublon(message, cle, doublon):
+    """
+    409 signalant un doublon probable (nom identique ou proche) ; la même
+    requête avec forcer=1 passe outre (homonymes, variantes légitimes).
+    """
+    return JsonResponse(
+        {
+            "error": message,
+            cle: {"id": doublon.id, "nom_chant": doublon.nom_chant},
+            "forcer_possible": True,
+        },
+        status=409,
+    )
+
+
 ACCEPTED_MODIFICATIONS_PREFETCH = Prefetch(
     "demandes_modifications",
     queryset=demande_modification_chant.objects.filter(statut="ACCEPTEE")
@@ -656,70 +743,279 @@ ACCEPTED_MODIFICATIONS_PREFETCH = Prefetch(
 )
 
 
-def serialize_chant(request, c):
+# ----------- Projection (sparse fieldsets) des chants -----------
+# Clés produites par serialize_chant, dans l'ordre de sortie, avec pour chacune
+# les colonnes de `chant` à charger (.only) et les relations nécessaires.
+CHANT_CHAMPS = {
+    "id": {"colonnes": ()},
+    "nom_chant": {"colonnes": ()},
+    "auteur": {"colonnes": ("auteur",)},
+    "ville_origine": {"colonnes": ("ville_origine",)},
+    "paroles": {"colonnes": ("paroles",)},
+    "description": {"colonnes": ("description",)},
+    "utilisateur_id": {"colonnes": ("utilisateur",)},
+    "utilisateur_pseudo": {"colonnes": ("utilisateur", "utilisateur__pseudo"), "relation": "utilisateur"},
+    "illustration_chant_url": {"colonnes": ("illustration_chant",)},
+    "illustration_srcset": {"colonnes": ("illustration_derives",)},
+    "paroles_pdf_url": {"colonnes": ("paroles_pdf",)},
+    "partition_url": {"colonnes": ("partition",)},
+    "paroles_pdf_infos": {"colonnes": ("pdf_infos",)},
+    "partition_infos": {"colonnes": ("pdf_infos",)},
+    "categories": {"colonnes": (), "relation": "categories"},
+    "pistes_audio": {"colonnes": (), "relation": "pistes_audio"},
+    "a_ete_modifie": {"colonnes": (), "relation": "modifications"},
+}
+
+# Vue "lite" : ce dont ont besoin les listes (sans paroles ni fichiers)
+CHANT_CHAMPS_LITE = ("id", "nom_chant", "auteur", "ville_origine", "categories", "a_ete_modifie")
+
+
+def _lire_champs_chant(request):
+    """
+    Lit ?fields=a,b,c ou ?view=lite.
+    Retourne (champs, erreur) ; champs = None signifie « tous les champs ».
+    """
+    fields = request.GET.get("fields")
+    if fields:
+        champs = [f.strip() for f in fields.split(",") if f.strip()]
+        inconnus = [f for f in champs if f not in CHANT_CHAMPS]
+        if inconnus:
+            return None, JsonResponse(
+                {"error": f"Champ(s) inconnu(s) : {', '.join(inconnus)}"}, status=400
+            )
+        return champs, None
 
-    # ----------- Construction du JSON principal -----------
-    data = {
-        "id": c.id,
-        "nom_chant": c.nom_chant,
-        "auteur": c.auteur or "",
-        "ville_origine": c.ville_origine or "",
-        "paroles": c.paroles,
-        "description": c.description or "",
-        "utilisateur_id": c.utilisateur_id,
-        "utilisateur_pseudo": c.utilisateur.pseudo if c.utilisateur else None,
-
-        # FICHIERS (URLs absolues)
-        "illustration_chant_url": _absolute_media_url(
-            request,
-            c.illustration_chant.url if c.illustration_chant else None
-        ),
-        "paroles_pdf_url": _absolute_media_url(
-            request,
-            c.paroles_pdf.url if c.paroles_pdf else None
-        ),
-        "partition_url": _absolute_media_url(
-            request,
-            c.partition.url if c.partition else None
-        ),
+    view = request.GET.get("view")
+    if view == "lite":
+        return list(CHANT_CHAMPS_LITE), None
+    if view and view != "full":
+        return None, JsonResponse({"error": "Paramètre 'view' invalide"}, status=400)
 
-        # CATÉGORIES
-        "categories": [
-            rel.categorie.nom_categorie
-            for rel in c.categories_associees.all()
-        ],
+    return None, None
 
-        # PISTES AUDIO (avec notes)
-        "pistes_audio": [],
-    }
 
-    # ----------- Ajouter pistes audio + notes -----------
-    for pa in c.pistes_audio.all():
+def _chants_queryset(champs=None, colonnes_en_plus=()):
+    """
+    Queryset de base pour serialize_chant : toutes les relations lues par le
+    sérialiseur sont chargées en un nombre fixe de requêtes, quelle que soit
+    la taille du catalogue.
+    Si `champs` est fourni, seules les colonnes et relations utiles à ces
+    champs sont chargées (les gros TextField ne sont jamais lus), plus
+    `colonnes_en_plus` que la vue lit elle-même.
+    """
+    relations = {"utilisateur", "categories", "pistes_audio", "modifications"}
+    qs = chant.objects.all()
+
+    if champs is not None:
+        colonnes = {"id", "nom_chant", *colonnes_en_plus}
+        relations = set()
+        for cle in champs:
+            colonnes.update(CHANT_CHAMPS[cle]["colonnes"])
+            if "relation" in CHANT_CHAMPS[cle]:
+                relations.add(CHANT_CHAMPS[cle]["relation"])
+        qs = qs.only(*colonnes)
+
+    if "utilisateur" in relations:
+        qs = qs.select_related("utilisateur")
+
+    prefetches = []
+    if "pistes_audio" in relations:
+        prefetches.append(Prefetch(
+            "pistes_audio",
+            queryset=piste_audio.objects.select_related("utilisateur").order_by("id"),
+        ))
+    if "categories" in relations:
+        prefetches.append(Prefetch(
+            "categories_associees",
+            queryset=appartenir.objects.select_related("categorie").order_by("id"),
+        ))
+    if "modifications" in relations:
+        if champs is None:
+            prefetches.append(ACCEPTED_MODIFICATIONS_PREFETCH)
+        else:
+            # Seul le booléen est demandé : une sous-requête EXISTS suffit
+            qs = qs.annotate(modifie=Exists(
+                demande_modification_chant.objects.filter(chant=OuterRef("pk"), statut="ACCEPTEE")
+            ))
 
-        notes_qs = noter.objects.filter(piste_audio=pa)
+    return qs.prefetch_related(*prefetches)
 
-        nb_notes = notes_qs.count()
 
-        note_moyenne = notes_qs.aggregate(
-            Avg("valeur_note")
-        )["valeur_note__avg"] or 0.0
+def _srcset_illustration(request, derives):
+    """{format: {largeur: URL absolue}} des déclinaisons (gui/images.py), ou None."""
+    if not derives:
+        return None
+    return {
+        fmt: {
+            largeur: _absolute_media_url(request, settings.MEDIA_URL + nom)
+            for largeur, nom in derives[fmt].items()
+        }
+        for fmt in FORMATS_DERIVES
+        if derives.get(fmt)
+    } or None
+
+
+def _infos_pdf(request, pdf_infos, champ):
+    """{"pages", "largeur_mm", "hauteur_mm", "apercu_url"} d'un PDF (gui/documents.py), ou None."""
+    infos = (pdf_infos or {}).get(champ)
+    if not infos:
+        return None
+    return {
+        "pages": infos["pages"],
+        "largeur_mm": infos.get("largeur_mm"),
+        "hauteur_mm": infos.get("hauteur_mm"),
+        "apercu_url": _absolute_media_url(
+            request, settings.MEDIA_URL + infos["apercu"] if infos.get("apercu") else None
+        ),
+    }
 
-        data["pistes_audio"].append({
+
+def _serialize_pistes_chant(c):
+    return [
+        {
             "id": pa.id,
             "fichier_mp3": (
                 pa.fichier_mp3.url if pa.fichier_mp3 else None
             ),
             "utilisateur_id": pa.utilisateur_id,
             "utilisateur_pseudo": pa.utilisateur.pseudo if pa.utilisateur else None,
-            "note_moyenne": float(note_moyenne),
-            "nb_notes": nb_notes,
-        })
+            "note_moyenne": float(pa.note_moyenne),
+            "nb_notes": pa.nb_notes,
+            "duree": pa.duree,
+            "debit": pa.debit,
+            "frequence": pa.frequence,
+            "taille": pa.taille,
+        }
+        for pa in c.pistes_audio.all()
+    ]
+
 
+def _chant_a_ete_modifie(c):
+    if hasattr(c, "modifie"):
+        return bool(c.modifie)
     accepted_modifications = getattr(c, "accepted_modifications", None) or []
-    last_modification = accepted_modifications[0] if accepted_modifications else None
-    data["a_ete_modifie"] = bool(last_modification)
+    return bool(accepted_modifications)
+
+
+_CHANT_SERIALISEURS = {
+    "id": lambda request, c: c.id,
+    "nom_chant": lambda request, c: c.nom_chant,
+    "auteur": lambda request, c: c.auteur or "",
+    "ville_origine": lambda request, c: c.ville_origine or "",
+    "paroles": lambda request, c: c.paroles,
+    "description": lambda request, c: c.description or "",
+    "utilisateur_id": lambda request, c: c.utilisateur_id,
+    "utilisateur_pseudo": lambda request, c: c.utilisateur.pseudo if c.utilisateur else None,
+
+    # FICHIERS (URLs absolues)
+    "illustration_chant_url": lambda request, c: _absolute_media_url(
+        request,
+        c.illustration_chant.url if c.illustration_chant else None
+    ),
+    "illustration_srcset": lambda request, c: _srcset_illustration(request, c.illustration_derives),
+    "paroles_pdf_url": lambda request, c: _absolute_media_url(
+        request,
+        c.paroles_pdf.url if c.paroles_pdf else None
+    ),
+    "partition_url": lambda request, c: _absolute_media_url(
+        request,
+        c.partition.url if c.partition else None
+    ),
+    "paroles_pdf_infos": lambda request, c: _infos_pdf(request, c.pdf_infos, "paroles_pdf"),
+    "partition_infos": lambda request, c: _infos_pdf(request, c.pdf_infos, "partition"),
+
+    # CATÉGORIES
+    "categories": lambda request, c: [
+        rel.categorie.nom_categorie
+        for rel in c.categories_associees.all()
+    ],
+
+    # PISTES AUDIO (avec notes)
+    "pistes_audio": lambda request, c: _serialize_pistes_chant(c),
+
+    "a_ete_modifie": lambda request, c: _chant_a_ete_modifie(c),
+}
+
+
+def serialize_chant(request, c, champs=None):
+    """
+    Sérialise un chant. `champs` limite les clés produites (None = toutes) ;
+    il doit correspondre aux champs passés à _chants_queryset.
+    """
+    if champs is None:
+        cles = CHANT_CHAMPS
+    else:
+        cles = [cle for cle in CHANT_CHAMPS if cle in champs]
+    return {cle: _CHANT_SERIALISEURS[cle](request, c) for cle in cles}
+
+
+# ----------- Pagination par curseur (keyset) du catalogue -----------
+CHANTS_PAGE_DEFAUT = 50
+CHANTS_PAGE_MAX = 200
+
+
+def _encode_curseur(c, sens):
+    # sens : "n" = page suivante (après c), "p" = page précédente (avant c)
+    brut = json.dumps([c.nom_chant, c.id, sens], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(brut).decode("ascii").rstrip("=")
+
+
+def _decode_curseur(valeur):
+    try:
+        brut = base64.urlsafe_b64decode(valeur + "=" * (-len(valeur) % 4))
+        nom, chant_id, sens = json.loads(brut.decode("utf-8"))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if not isinstance(nom, str) or not isinstance(chant_id, int) or sens not in ("n", "p"):
+        return None
+    return nom, chant_id, sens
+
+
+def _lire_limite(request, defaut=CHANTS_PAGE_DEFAUT, maximum=CHANTS_PAGE_MAX):
+    try:
+        limite = int(request.GET.get("limit", defaut))
+    except (TypeError, ValueError):
+        return None
+    if limite < 1:
+        return None
+    return min(limite, maximum)
 
-    return data
+
+def _paginer_chants(qs, limite, curseur):
+    """
+    Pagination keyset sur (nom_chant, id) : chaque page est une simple
+    recherche d'intervalle sur l'index de nom_chant, sans OFFSET, donc le
+    coût ne dépend pas de la position dans le catalogue.
+    Retourne (chants, curseur_suivant, curseur_precedent).
+    """
+    if curseur is None:
+        lignes = list(qs.order_by("nom_chant", "id")[:limite + 1])
+        encore = len(lignes) > limite
+        lignes = lignes[:limite]
+        suivant = _encode_curseur(lignes[-1], "n") if encore else None
+        return lignes, suivant, None
+
+    nom, chant_id, sens = curseur
+    if sens == "n":
+        lignes = list(
+            qs.filter(Q(nom_chant__gt=nom) | Q(nom_chant=nom, id__gt=chant_id))
+            .order_by("nom_chant", "id")[:limite + 1]
+        )
+        encore = len(lignes) > limite
+        lignes = lignes[:limite]
+        suivant = _encode_curseur(lignes[-1], "n") if encore else None
+        precedent = _encode_curseur(lignes[0], "p") if lignes else None
+        return lignes, suivant, precedent
+
+    lignes = list(
+        qs.filter(Q(nom_chant__lt=nom) | Q(nom_chant=nom, id__lt=chant_id))
+        .order_by("-nom_chant", "-id")[:limite + 1]
+    )
+    encore = len(lignes) > limite
+    lignes = lignes[:limite][::-1]
+    suivant = _encode_curseur(lignes[-1], "n") if lignes else None
+    precedent = _encode_curseur(lignes[0], "p") if encore else None
+    return lignes, suivant, precedent
 
 
 def _require_authenticated_user(request):
@@ -773,6 +1069,8 @@ def serialize_demande_chant(request, demande):
             request,
             demande.partition.url if demande.partition else None,
         ),
+        "paroles_pdf_infos": _infos_pdf(request, demande.pdf_infos, "paroles_pdf"),
+        "partition_infos": _infos_pdf(request, demande.pdf_infos, "partition"),
         "pistes_audio": [
             {
                 "id": audio.id,
@@ -835,32 +1133,25 @@ def serialize_demande_modification(request, demande):
             request,
             demande.partition.url if demande.partition else None,
         ),
+        "paroles_pdf_infos": _infos_pdf(request, demande.pdf_infos, "paroles_pdf"),
+        "partition_infos": _infos_pdf(request, demande.pdf_infos, "partition"),
         "chant_id": demande.chant_id,
         "chant_nom": demande.chant.nom_chant,
     }
     return data
 
 
-def _clone_field_file(field_file):
-    if not field_file:
-        return None, None
-    try:
-        file_name = os.path.basename(field_file.name)
-    except Exception:
-        file_name = None
-    field_file.open("rb")
-    content = field_file.read()
-    field_file.close()
-    if not content or not file_name:
-        return None, None
-    return ContentFile(content), file_name
+def _reprendre_infos_pdf(demande, cible):
+    # Fichier promu tel quel : inutile de réanalyser le PDF (gui/documents.py)
+    infos = dict(cible.pdf_infos or {})
+    for champ, valeurs in (demande.pdf_infos or {}).items():
+        if valeurs.get("source") == getattr(cible, champ).name:
+            infos[champ] = valeurs
+    cible.pdf_infos = infos
 
 
+@transaction.atomic
 def _create_chant_from_demande(demande):
-    illustration_content, illustration_name = _clone_field_file(demande.illustration_chant)
-    pdf_content, pdf_name = _clone_field_file(demande.paroles_pdf)
-    partition_content, partition_name = _clone_field_file(demande.partition)
-
     new_chant = chant(
         nom_chant=demande.nom_chant,
         auteur=demande.auteur,
@@ -870,12 +1161,10 @@ def _create_chant_from_demande(demande):
         utilisateur=demande.utilisateur,
     )
 
-    if illustration_content:
-        new_chant.illustration_chant.save(illustration_name, illustration_content, save=False)
-    if pdf_content:
-        new_chant.paroles_pdf.save(pdf_name, pdf_content, save=False)
-    if partition_content:
-        new_chant.partition.save(partition_name, partition_content, save=False)
+    # Fichiers de la demande : lien physique ou copie par blocs (gui/stockage.py)
+    for champ in ("illustration_chant", "paroles_pdf", "partition"):
+        promouvoir_fichier(getattr(demande, champ), new_chant, champ)
+    _reprendre_infos_pdf(demande, new_chant)
 
     new_chant.save()
 
@@ -890,32 +1179,32 @@ def _create_chant_from_demande(demande):
         )
 
     for audio in demande.pistes_audio.all():
-        audio_content, audio_name = _clone_field_file(audio.fichier_mp3)
-        if not audio_content:
-            continue
         piste = piste_audio(
             chant=new_chant,
             utilisateur=demande.utilisateur,
+            **{cle: getattr(audio, cle) for cle in CHAMPS_AUDIO},
         )
-        piste.fichier_mp3.save(audio_name, audio_content, save=False)
+        if not promouvoir_fichier(audio.fichier_mp3, piste, "fichier_mp3"):
+            continue
         piste.save()
 
     return new_chant
 
 
+@transaction.atomic
 def _create_piste_audio_from_demande_audio(demande):
-    audio_content, audio_name = _clone_field_file(demande.fichier_mp3)
-    if not audio_content or not audio_name:
-        return None
     piste = piste_audio(
         chant=demande.chant,
         utilisateur=demande.utilisateur,
+        **{cle: getattr(demande, cle) for cle in CHAMPS_AUDIO},
     )
-    piste.fichier_mp3.save(audio_name, audio_content, save=False)
+    if not promouvoir_fichier(demande.fichier_mp3, piste, "fichier_mp3"):
+        return None
     piste.save()
     return piste
 
 
+@transaction.atomic
 def _apply_modification_to_chant(demande):
     chant_obj = demande.chant
     chant_obj.nom_chant = demande.nom_chant
@@ -925,16 +1214,9 @@ def _apply_modification_to_chant(demande):
     chant_obj.description = demande.description
     chant_obj.utilisateur = demande.utilisateur
 
-    illustration_content, illustration_name = _clone_field_file(demande.illustration_chant)
-    pdf_content, pdf_name = _clone_field_file(demande.paroles_pdf)
-    partition_content, partition_name = _clone_field_file(demande.partition)
-
-    if illustration_content:
-        chant_obj.illustration_chant.save(illustration_name, illustration_content, save=False)
-    if pdf_content:
-        chant_obj.paroles_pdf.save(pdf_name, pdf_content, save=False)
-    if partition_content:
-        chant_obj.partition.save(partition_name, partition_content, save=False)
+    for champ in ("illustration_chant", "paroles_pdf", "partition"):
+        promouvoir_fichier(getattr(demande, champ), chant_obj, champ)
+    _reprendre_infos_pdf(demande, chant_obj)
 
     chant_obj.save()
 
@@ -957,9 +1239,7 @@ def _apply_modification_to_chant(demande):
 
 
 def delete_file_field(instance, field_name):
-    field = getattr(instance, field_name, None)
-    if field and hasattr(field, "path") and os.path.exists(field.path):
-        os.remove(field.path)
+    # L'ancien fichier est libéré à l'enregistrement (gui/models.py)
     setattr(instance, field_name, None)
     instance.save()
 
@@ -1004,10 +1284,19 @@ def demandes_chants_api(request, demande_id=None):
     if not nom_chant:
         return JsonResponse({"error": "nom_chant requis"}, status=400)
 
-    if chant.objects.filter(nom_chant__iexact=nom_chant).exists():
-        return JsonResponse({"error": "Un chant avec ce nom existe déjà."}, status=409)
-    if demande_chant.objects.filter(nom_chant__iexact=nom_chant, statut="EN_ATTENTE").exists():
-        return JsonResponse({"error": "Une demande avec ce nom est déjà en attente."}, status=409)
+    if not _forcer(form_data.get("forcer")):
+        doublon = trouver_doublon_chant(nom_chant)
+        if doublon:
+            return _conflit_doublon(
+                f"Un chant avec ce nom existe déjà ({doublon.nom_chant}).", "chant_existant", doublon
+            )
+        doublon = trouver_doublon_demande(nom_chant)
+        if doublon:
+            return _conflit_doublon(
+                f"Une demande avec ce nom est déjà en attente ({doublon.nom_chant}).",
+                "demande_existante",
+                doublon,
+            )
 
     categorie_obj = _resolve_demande_categorie(form_data)
 
@@ -1157,27 +1446,46 @@ def demandes_modification_chant_api(request, demande_id=None):
     return JsonResponse(serialize_demande_modification(request, demande), status=201)
 
 
+def _json_liste_chants(request, champs=None):
+    """
+    JSON (bytes) de la liste complète des chants ; sert aussi à construire
+    l'instantané précompressé (gui/instantane.py).
+    """
+    qs = _chants_queryset(champs).order_by("nom_chant", "id")
+    return json.dumps(
+        [serialize_chant(request, c, champs) for c in qs],
+        cls=DjangoJSONEncoder,
+    ).encode("utf-8")
+
+
 @csrf_exempt
+@instantane_catalogue(_json_liste_chants)
+@cache_catalogue
 def chants_api(request, chant_id=None):
 
     #                     DETAIL (chant_id donné)
     if chant_id:
+        # GET conditionnel : la révision suffit, sans sérialiser le chant
+        if request.method == "GET":
+            meta = chant.objects.filter(id=chant_id).values_list("revision", "date_modification").first()
+            if meta is None:
+                return JsonResponse({"error": "Chant introuvable"}, status=404)
+            etag = f'"chant-{chant_id}-r{meta[0]}"'
+            last_modified = int(meta[1].timestamp())
+            response = reponse_conditionnelle(request, etag, last_modified)
+            if response is not None:
+                return response
+
         try:
-            c = (
-                chant.objects
-                .prefetch_related(
-                    "pistes_audio",
-                    "categories_associees__categorie",
-                    ACCEPTED_MODIFICATIONS_PREFETCH,
-                )
-                .get(id=chant_id)
-            )
+            c = _chants_queryset().get(id=chant_id)
         except chant.DoesNotExist:
             return JsonResponse({"error": "Chant introuvable"}, status=404)
 
         # ---------- GET ----------
         if request.method == "GET":
-            return JsonResponse(serialize_chant(request, c))
+            return poser_entetes_validation(
+                JsonResponse(serialize_chant(request, c)), etag, last_modified
+            )
         
         #        DELETE D'UN FICHIER SPÉCIFIQUE (field=xxx)
         if request.method == "DELETE" and request.GET.get("field"):
@@ -1196,7 +1504,7 @@ def chants_api(request, chant_id=None):
             f = getattr(c, file_field)
 
             if f:
-                f.delete()
+                # L'ancien fichier est libéré à l'enregistrement (gui/models.py)
                 setattr(c, file_field, None)
                 c.save()
 
@@ -1266,19 +1574,44 @@ def chants_api(request, chant_id=None):
     #                     LISTE DES CHANTS
     # ============================================================
     if request.method == "GET":
-        qs = (
-            chant.objects
-            .all()
-            .prefetch_related(
-                "pistes_audio",
-                "categories_associees__categorie",
-                ACCEPTED_MODIFICATIONS_PREFETCH,
+        # ?all=1 : ancien format (liste complète non paginée)
+        champs, error = _lire_champs_chant(request)
+        if error:
+            return error
+
+        # ETag dérivé de la version du catalogue : 304 sans requête SQL
+        etag, last_modified = validation_catalogue(request)
+        response = reponse_conditionnelle(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        if request.GET.get("all") in ("1", "true"):
+            return poser_entetes_validation(
+                HttpResponse(_json_liste_chants(request, champs), content_type="application/json"),
+                etag,
+                last_modified,
             )
-            .order_by("nom_chant")
-        )
-        return JsonResponse(
-            [serialize_chant(request, c) for c in qs],
-            safe=False
+
+        limite = _lire_limite(request)
+        if limite is None:
+            return JsonResponse({"error": "Paramètre 'limit' invalide"}, status=400)
+
+        curseur = None
+        if request.GET.get("cursor"):
+            curseur = _decode_curseur(request.GET["cursor"])
+            if curseur is None:
+                return JsonResponse({"error": "Curseur invalide"}, status=400)
+
+        page, suivant, precedent = _paginer_chants(_chants_queryset(champs), limite, curseur)
+        return poser_entetes_validation(
+            JsonResponse({
+                "results": [serialize_chant(request, c, champs) for c in page],
+                "next": suivant,
+                "prev": precedent,
+                "limit": limite,
+            }),
+            etag,
+            last_modified,
         )
 
     # ============================================================
@@ -1337,9 +1670,365 @@ def chants_api(request, chant_id=None):
 
     return JsonResponse({"error": "Méthode non autorisée"}, status=405)
 #------------------------------------------------------------------------
+#                       RECHERCHE PLEIN TEXTE
+#------------------------------------------------------------------------
+@csrf_exempt
+@require_http_methods(["GET"])
+def chants_recherche_api(request):
+    """
+    GET /api/chants/search/?q=...&categorie=...&limit=&offset=
+    Résultats triés par pertinence (nom, auteur, ville, paroles), avec un
+    extrait des paroles où les termes trouvés sont entourés de <mark>.
+    """
+    q = (request.GET.get("q") or "").strip()
+    termes = extraire_termes(q)
+    if not termes:
+        return JsonResponse({"error": "Paramètre 'q' requis"}, status=400)
+
+    limite = _lire_limite(request, defaut=20, maximum=50)
+    if limite is None:
+        return JsonResponse({"error": "Paramètre 'limit' invalide"}, status=400)
+    try:
+        decalage = max(0, int(request.GET.get("offset", 0)))
+    except ValueError:
+        return JsonResponse({"error": "Paramètre 'offset' invalide"}, status=400)
+
+    categories = [c for c in request.GET.getlist("categorie") if c]
+
+    resultats = rechercher_chants(termes, categories, limite + 1, decalage)
+    encore = len(resultats) > limite
+    resultats = resultats[:limite]
+
+    champs = list(CHANT_CHAMPS_LITE)
+    chants_par_id = {
+        c.id: c
+        for c in _chants_queryset(champs + ["paroles"]).filter(id__in=[cid for cid, _ in resultats])
+    }
+
+    data = []
+    for chant_id, score in resultats:
+        c = chants_par_id.get(chant_id)
+        if c is None:
+            continue
+        item = serialize_chant(request, c, champs)
+        item["score"] = round(score, 4)
+        item["extrait"] = extrait_surligne(c.paroles, termes)
+        data.append(item)
+
+    return JsonResponse({
+        "query": q,
+        "results": data,
+        "next": decalage + limite if encore else None,
+        "prev": max(0, decalage - limite) if decalage else None,
+        "limit": limite,
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def chants_autocompletion_api(request):
+    """
+    GET /api/chants/autocomplete/?q=...&limit=
+    Insensible aux accents, à la casse, à la ponctuation et aux petites
+    fautes de frappe.
+    """
+    q = (request.GET.get("q") or "").strip()
+    if not q:
+        return JsonResponse({"error": "Paramètre 'q' requis"}, status=400)
+
+    limite = _lire_limite(request, defaut=10, maximum=25)
+    if limite is None:
+        return JsonResponse({"error": "Paramètre 'limit' invalide"}, status=400)
+
+    return JsonResponse(autocompleter_chants(q, limite), safe=False)
+
+
+# Nombre maximum d'identifiants par requête batch
+CHANTS_BATCH_MAX = 500
+
+
+def _lire_ids_batch(request):
+    """
+    Identifiants demandés, dans l'ordre et sans doublon :
+    GET ?ids=1,2,3 ou POST {"ids": [1, 2, 3]}.
+    Retourne (ids, erreur).
+    """
+    if request.method == "POST":
+        try:
+            brut = json.loads(request.body.decode("utf-8")).get("ids")
+        except (JSONDecodeError, UnicodeDecodeError, AttributeError):
+            return None, JsonResponse({"error": "JSON invalide"}, status=400)
+        if not isinstance(brut, list):
+            return None, JsonResponse({"error": "Champ 'ids' requis (liste)"}, status=400)
+    else:
+        brut = [v for valeur in request.GET.getlist("ids") for v in valeur.split(",") if v.strip()]
+
+    # Borne vérifiée avant toute conversion : doublons compris
+    if len(brut) > CHANTS_BATCH_MAX:
+        return None, JsonResponse(
+            {"error": f"Maximum {CHANTS_BATCH_MAX} identifiants par requête"}, status=400
+        )
+
+    ids = {}
+    for valeur in brut:
+        try:
+            ids[int(valeur)] = None
+        except (TypeError, ValueError):
+            return None, JsonResponse({"error": f"Identifiant invalide : {valeur}"}, status=400)
+
+    if not ids:
+        return None, JsonResponse({"error": "Paramètre 'ids' requis"}, status=400)
+    return list(ids), None
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@cache_catalogue
+def chants_batch_api(request):
+    """
+    GET  /api/chants/batch/?ids=1,2,3[&fields=...|&view=lite]
+    POST /api/chants/batch/ {"ids": [...]} pour les longues listes
+    Chants renvoyés dans l'ordre demandé, en un seul id__in ;
+    les identifiants inexistants sont listés dans "missing".
+    """
+    ids, error = _lire_ids_batch(request)
+    if error:
+        return error
+    champs, error = _lire_champs_chant(request)
+    if error:
+        return error
+
+    chants_par_id = {c.id: c for c in _chants_queryset(champs).filter(id__in=ids)}
+
+    return JsonResponse({
+        "results": [
+            serialize_chant(request, chants_par_id[chant_id], champs)
+            for chant_id in ids if chant_id in chants_par_id
+        ],
+        "missing": [chant_id for chant_id in ids if chant_id not in chants_par_id],
+    })
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def chants_top_api(request):
+    """
+    GET /api/chants/top/?limit=&categorie=
+    Chants les plus mis en favoris (compteur chant.nb_favoris, lu dans
+    l'ordre de son index) ; à égalité, le plus ancien chant d'abord.
+    """
+    limite = _lire_limite(request, defaut=10, maximum=100)
+    if limite is None:
+        return JsonResponse({"error": "Paramètre 'limit' invalide"}, status=400)
+
+    champs = list(CHANT_CHAMPS_LITE)
+    qs = _chants_queryset(champs, colonnes_en_plus=("nb_favoris",)).filter(nb_favoris__gt=0)
+
+    categories = [c for c in request.GET.getlist("categorie") if c]
+    if categories:
+        qs = qs.filter(Exists(appartenir.objects.filter(
+            chant=OuterRef("pk"), categorie__nom_categorie__in=categories
+        )))
+
+    data = []
+    for c in qs.order_by("-nb_favoris", "id")[:limite]:
+        item = serialize_chant(request, c, champs)
+        item["nb_favoris"] = c.nb_favoris
+        data.append(item)
+
+    return JsonResponse({"results": data, "limit": limite})
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def chants_tendances_api(request):
+    """
+    GET /api/chants/trending/?limit=&categorie=
+    Chants en tendance (favoris, notes et commentaires récents), lus dans la
+    table précalculée tendance_chant (commande recalculer_tendances).
+    """
+    limite = _lire_limite(request, defaut=10, maximum=100)
+    if limite is None:
+        return JsonResponse({"error": "Paramètre 'limit' invalide"}, status=400)
+
+    qs = tendance_chant.objects.order_by("-score", "chant_id")
+    categories = [c for c in request.GET.getlist("categorie") if c]
+    if categories:
+        qs = qs.filter(Exists(appartenir.objects.filter(
+            chant_id=OuterRef("chant_id"), categorie__nom_categorie__in=categories
+        )))
+    classement = list(qs.values_list("chant_id", "score")[:limite])
+
+    champs = list(CHANT_CHAMPS_LITE)
+    chants_par_id = _chants_queryset(champs).in_bulk([chant_id for chant_id, _ in classement])
+
+    data = []
+    for chant_id, score in classement:
+        c = chants_par_id.get(chant_id)
+        if c is None:
+            continue
+        item = serialize_chant(request, c, champs)
+        item["score"] = round(score, 4)
+        data.append(item)
+
+    return JsonResponse({"results": data, "limit": limite})
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def chants_similaires_api(request, chant_id):
+    """
+    GET /api/chants/<id>/similaires/?limit=
+    « Ceux qui ont mis ce chant en favori ont aussi aimé », lus dans la table
+    précalculée chant_similaire (commande recalculer_similaires).
+    """
+    limite = _lire_limite(request, defaut=10, maximum=50)
+    if limite is None:
+        return JsonResponse({"error": "Paramètre 'limit' invalide"}, status=400)
+    if not chant.objects.filter(id=chant_id).exists():
+        return JsonResponse({"error": "Chant introuvable"}, status=404)
+
+    voisins = list(
+        chant_similaire.objects.filter(chant_id=chant_id)
+        .order_by("rang")
+        .values_list("similaire_id", "score")[:limite]
+    )
+    champs = list(CHANT_CHAMPS_LITE)
+    chants_par_id = _chants_queryset(champs).in_bulk([similaire_id for similaire_id, _ in voisins])
+
+    data = []
+    for similaire_id, score in voisins:
+        c = chants_par_id.get(similaire_id)
+        if c is None:
+            continue
+        item = serialize_chant(request, c, champs)
+        item["score"] = round(score, 4)
+        data.append(item)
+
+    return JsonResponse({"results": data, "limit": limite})
+
+
+# ----------- Synchronisation incrémentale -----------
+# Le jeton renvoyé recule de cette marge : une transaction plus lente que
+# la marge, horodatée avant sa validation, n'est pas manquée (un client
+# peut recevoir deux fois le même chant, ce qui est sans effet).
+SYNC_MARGE = timedelta(seconds=30)
+
+
+def _encode_jeton_sync(instant):
+    return base64.urlsafe_b64encode(instant.isoformat().encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_jeton_sync(valeur):
+    try:
+        brut = base64.urlsafe_b64decode(valeur + "=" * (-len(valeur) % 4)).decode("ascii")
+        instant = datetime.fromisoformat(brut)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if timezone.is_naive(instant):
+        return None
+    return instant
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def chants_changements_api(request):
+    """
+    GET /api/chants/changes/?since=<jeton>[&fields=...|&view=lite]
+    Chants créés ou modifiés (y compris catégories, pistes, notes) et
+    identifiants des chants supprimés depuis `since`, plus le jeton à
+    renvoyer à la prochaine synchronisation. Sans `since` : tout le
+    catalogue ("full": true). Jeton antérieur à la rétention des chants
+    supprimés : 410, le client doit tout resynchroniser (sans `since`).
+    """
+    champs, error = _lire_champs_chant(request)
+    if error:
+        return error
+
+    depuis = None
+    if request.GET.get("since"):
+        depuis = _decode_jeton_sync(request.GET["since"])
+        if depuis is None:
+            return JsonResponse({"error": "Paramètre 'since' invalide"}, status=400)
+        if depuis < horizon_chants_supprimes():
+            return JsonResponse(
+                {"error": "Jeton expiré : synchronisation complète requise", "full_resync": True},
+                status=410,
+            )
+
+    # Borne lue avant les données : rien de validé après n'est perdu
+    jeton = _encode_jeton_sync(timezone.now() - SYNC_MARGE)
+
+    qs = _chants_queryset(champs).order_by("date_modification", "id")
+    supprimes = []
+    if depuis is not None:
+        qs = qs.filter(date_modification__gt=depuis)
+        supprimes = list(
+            chant_supprime.objects
+            .filter(date_suppression__gt=depuis)
+            .order_by("chant_id")
+            .values_list("chant_id", flat=True)
+            .distinct()
+        )
+
+    return JsonResponse({
+        "changed": [serialize_chant(request, c, champs) for c in qs],
+        "deleted": supprimes,
+        "token": jeton,
+        "full": depuis is None,
+    })
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def export_bundle_api(request):
+    """
+    GET /api/export/bundle/[?miniatures=1]
+    Archive zip de tout le catalogue pour un usage hors ligne (gui/bundle.py),
+    construite en tâche de fond une fois par version de l'instantané du
+    catalogue. Pendant la construction, le bundle précédent est servi, ou
+    une 202 avec Retry-After s'il n'y en a pas encore.
+    """
+    miniatures = request.GET.get("miniatures") in ("1", "true")
+
+    def validation(version):
+        etag = f'"bundle-{version}{"-m" if miniatures else ""}"'
+        return etag, version // 1_000_000_000
+
+    for _ in range(2):
+        version = version_instantane()
+        response = reponse_conditionnelle(request, *validation(version))
+        if response is not None:
+            return response
+
+        bundle = obtenir_bundle(version, miniatures)
+        if bundle is None:
+            response = JsonResponse({"message": "Bundle en cours de construction"}, status=202)
+            response["Retry-After"] = str(DELAI_REESSAI_BUNDLE)
+            return response
+        version_servie, chemin = bundle
+        etag, last_modified = validation(version_servie)
+        if version_servie != version:
+            response = reponse_conditionnelle(request, etag, last_modified)
+            if response is not None:
+                return response
+
+        try:
+            fichier = open(chemin, "rb")
+        except FileNotFoundError:
+            # Remplacé entre-temps par le bundle d'une version plus récente
+            continue
+        response = FileResponse(
+            fichier, as_attachment=True, filename=chemin.name, content_type="application/zip"
+        )
+        return poser_entetes_validation(response, etag, last_modified)
+
+    return JsonResponse({"error": "Bundle indisponible, réessayer"}, status=503)
+
+#------------------------------------------------------------------------
 #                           CATEGORIES
 #------------------------------------------------------------------------
 @csrf_exempt
+@cache_catalogue
 def categories_api(request):
 
     # -------- GET : liste --------
@@ -1487,17 +2176,13 @@ def pistes_audio_api(request, piste_id=None):
 
         data = []
         for p in qs:
-            notes = noter.objects.filter(piste_audio=p)
-            avg = notes.aggregate(avg=Avg("valeur_note"))["avg"] or 0
-            count = notes.count()
-
             data.append({
                 "id": p.id,
                 "fichier_mp3": p.fichier_mp3.url if p.fichier_mp3 else None,
                 "chant_id": p.chant_id,
                 "utilisateur_id": p.utilisateur_id,
-                "note_moyenne": round(avg, 2),
-                "nb_notes": count,
+                "note_moyenne": round(p.note_moyenne, 2),
+                "nb_notes": p.nb_notes,
             })
 
         return JsonResponse(data, safe=False)
@@ -1509,17 +2194,13 @@ def pistes_audio_api(request, piste_id=None):
         except piste_audio.DoesNotExist:
             return JsonResponse({"error": "Not found"}, status=404)
 
-        notes = noter.objects.filter(piste_audio=p)
-        avg = notes.aggregate(avg=Avg("valeur_note"))["avg"] or 0
-        count = notes.count()
-
         return JsonResponse({
             "id": p.id,
             "fichier_mp3": p.fichier_mp3.url if p.fichier_mp3 else None,
             "chant_id": p.chant_id,
             "utilisateur_id": p.utilisateur_id,
-            "note_moyenne": round(avg, 2),
-            "nb_notes": count,
+            "note_moyenne": round(p.note_moyenne, 2),
+            "nb_notes": p.nb_notes,
         })
 
     # ---------- POST UPLOAD ----------
@@ -1576,6 +2257,15 @@ def pistes_audio_api(request, piste_id=None):
 #----------------------------------------------------------------------------
                                 #NOTER
 #---------------------------------------------------------------------------
+def _ajuster_stats_notes(piste_id, delta_nb, delta_somme):
+    # Mise à jour atomique côté SQL des agrégats dénormalisés de la piste
+    piste_audio.objects.filter(id=piste_id).update(
+        nb_notes=F("nb_notes") + delta_nb,
+        somme_notes=F("somme_notes") + delta_somme,
+    )
+    invalider_catalogue(instantane=False)
+
+
 @csrf_exempt
 def noter_api(request, note_id=None):
 
@@ -1588,25 +2278,24 @@ def noter_api(request, note_id=None):
         if piste_id:
             qs = qs.filter(piste_audio_id=piste_id)
 
-        notes_list = [
-            {
+        stats = qs.aggregate(moyenne=models.Avg("valeur_note"), nb_notes=models.Count("id"))
+        moyenne = stats["moyenne"]
+
+        return ReponseJsonFlux(
+            qs.order_by("id"),
+            lambda n: {
                 "id": n.id,
                 "utilisateur_id": n.utilisateur_id,
                 "piste_audio_id": n.piste_audio_id,
                 "valeur_note": n.valeur_note,
                 "date_rating": n.date_rating.isoformat(),
-            }
-            for n in qs
-        ]
-
-        moyenne = qs.aggregate(models.Avg("valeur_note"))["valeur_note__avg"]
-        nb_notes = qs.count()
-
-        return JsonResponse({
-            "notes": notes_list,
-            "moyenne": round(moyenne, 2) if moyenne else 0,
-            "nb_notes": nb_notes
-        })
+            },
+            entete={
+                "moyenne": round(moyenne, 2) if moyenne else 0,
+                "nb_notes": stats["nb_notes"],
+            },
+            cle="notes",
+        )
 
     # ---------- POST (créer ou modifier note) ----------
     if request.method == "POST":
@@ -1616,12 +2305,29 @@ def noter_api(request, note_id=None):
         piste_id = body["piste_audio_id"]
         valeur = body["valeur_note"]
 
-        # update_or_create = AUTO : met à jour si existe, sinon crée
-        note, created = noter.objects.update_or_create(
-            utilisateur_id=user_id,
-            piste_audio_id=piste_id,
-            defaults={"valeur_note": valeur}
-        )
+        with transaction.atomic():
+            # Verrou de la piste (ses agrégats sont mis à jour plus bas) : deux
+            # premières notes simultanées du même utilisateur sont sérialisées
+            list(piste_audio.objects.select_for_update().filter(id=piste_id).values_list("id", flat=True))
+            ancienne_valeur = (
+                noter.objects.select_for_update()
+                .filter(utilisateur_id=user_id, piste_audio_id=piste_id)
+                .values_list("valeur_note", flat=True)
+                .first()
+            )
+
+            # update_or_create = AUTO : met à jour si existe, sinon crée
+            note, created = noter.objects.update_or_create(
+                utilisateur_id=user_id,
+                piste_audio_id=piste_id,
+                defaults={"valeur_note": valeur}
+            )
+
+            if created or ancienne_valeur is None:
+                # Note créée par une requête concurrente : comptée comme création
+                _ajuster_stats_notes(note.piste_audio_id, 1, int(note.valeur_note))
+            else:
+                _ajuster_stats_notes(note.piste_audio_id, 0, int(note.valeur_note) - ancienne_valeur)
 
         return JsonResponse({
             "id": note.id,
@@ -1637,12 +2343,14 @@ def noter_api(request, note_id=None):
         if not note_id:
             return JsonResponse({"error": "ID requis"}, status=400)
 
-        try:
-            note = noter.objects.get(id=note_id)
-        except noter.DoesNotExist:
-            return JsonResponse({"error": "Note introuvable"}, status=404)
+        with transaction.atomic():
+            try:
+                note = noter.objects.select_for_update().get(id=note_id)
+            except noter.DoesNotExist:
+                return JsonResponse({"error": "Note introuvable"}, status=404)
 
-        note.delete()
+            _ajuster_stats_notes(note.piste_audio_id, -1, -note.valeur_note)
+            note.delete()
         return JsonResponse({"success": True})
 
     return JsonResponse({"error": "Méthode non autorisée"}, status=405)
@@ -1650,6 +2358,14 @@ def noter_api(request, note_id=None):
 #-----------------------------------------------------------
 #                          FAVORIS
 #-----------------------------------------------------------
+def _ajuster_nb_favoris(chant_id, delta):
+    # Compteur dénormalisé de chant, mis à jour atomiquement côté SQL
+    qs = chant.objects.filter(id=chant_id)
+    if delta < 0:
+        qs = qs.filter(nb_favoris__gte=-delta)
+    qs.update(nb_favoris=F("nb_favoris") + delta)
+
+
 @csrf_exempt
 @require_http_methods(["GET", "POST", "DELETE"])
 def favoris_api(request):
@@ -1664,18 +2380,14 @@ def favoris_api(request):
         if user_id:
             qs = qs.filter(utilisateur_id=user_id)
 
-        data = [
-            {
-                "id": f.id,
-                "utilisateur_id": f.utilisateur_id,
-                "chant_id": f.chant_id,
-                "date_favori": f.date_favori.isoformat(),
-                "utilisateur": str(f.utilisateur),
-                "chant": str(f.chant),
-            }
-            for f in qs
-        ]
-        return JsonResponse(data, safe=False)
+        return ReponseJsonFlux(qs.order_by("id"), lambda f: {
+            "id": f.id,
+            "utilisateur_id": f.utilisateur_id,
+            "chant_id": f.chant_id,
+            "date_favori": f.date_favori.isoformat(),
+            "utilisateur": str(f.utilisateur),
+            "chant": str(f.chant),
+        })
 
     # -------------------------
     #  DELETE : supprimer favoris
@@ -1686,7 +2398,11 @@ def favoris_api(request):
         if not fav_id:
             return JsonResponse({"error": "ID manquant"}, status=400)
 
-        deleted, _ = favoris.objects.filter(id=fav_id).delete()
+        with transaction.atomic():
+            chant_id = favoris.objects.filter(id=fav_id).values_list("chant_id", flat=True).first()
+            deleted, _ = favoris.objects.filter(id=fav_id).delete()
+            if deleted:
+                _ajuster_nb_favoris(chant_id, -1)
 
         if deleted == 0:
             return JsonResponse({"error": "Favori introuvable"}, status=404)
@@ -1709,11 +2425,19 @@ def favoris_api(request):
     if not date_favori:
         date_favori = timezone.now().date()
 
-    fav = favoris.objects.create(
-        utilisateur_id=user_id,
-        chant_id=chant_id,
-        date_favori=date_favori,
-    )
+    try:
+        with transaction.atomic():
+            fav = favoris.objects.create(
+                utilisateur_id=user_id,
+                chant_id=chant_id,
+                date_favori=date_favori,
+            )
+            _ajuster_nb_favoris(fav.chant_id, 1)
+    except IntegrityError:
+        # Doublon créé en parallèle (unique_together) ou clé étrangère invalide
+        if favoris.objects.filter(utilisateur_id=user_id, chant_id=chant_id).exists():
+            return JsonResponse({"error": "Déjà dans les favoris"}, status=400)
+        return JsonResponse({"error": "Utilisateur ou chant introuvable"}, status=404)
 
     return JsonResponse({
         "id": fav.id,
@@ -2015,6 +2739,7 @@ def chansonnier_perso_detail_api(request, chansonnier_id):
 
 @csrf_exempt
 @csrf_exempt
+@cache_catalogue
 def templates_chansonniers_api(request):
     # -------- GET : liste des templates avec les ids des chants ----------
     if request.method == "GET":
@@ -2342,17 +3067,11 @@ def commandes_api(request):
 @require_http_methods(["GET", "POST"])
 def details_commande_api(request):
     if request.method == "GET":
-        qs = details_commande.objects.select_related("commande", "chansonnier_perso")
-        data = [
-            {
-                "id": l.id,
-                "commande_id": l.commande_id,
-                "chansonnier_perso_id": l.chansonnier_perso_id,
-                "quantite": l.quantite,
-            }
-            for l in qs
-        ]
-        return JsonResponse(data, safe=False)
+        # Seules les clés étrangères sont lues : pas de jointure
+        qs = details_commande.objects.order_by("id").values(
+            "id", "commande_id", "chansonnier_perso_id", "quantite"
+        )
+        return ReponseJsonFlux(qs, dict)
 
     body = json.loads(request.body.decode("utf-8"))
 
@@ -2490,6 +3209,7 @@ def mes_commandes_detail_api(request, commande_id):
 #----------------------------------------------------------------
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@cache_catalogue
 def evenements_api(request):
     # ----------- GET : liste des évènements -----------
     if request.method == "GET":
@@ -2540,6 +3260,7 @@ def evenements_api(request):
 
 @csrf_exempt
 @require_http_methods(["GET", "PUT", "DELETE"])
+@cache_catalogue
 def evenement_detail_api(request, id):
     try:
         e = evenement.objects.get(id=id)
@@ -2557,13 +3278,8 @@ def evenement_detail_api(request, id):
             "histoire": e.histoire,
         }
         chants_qs = (
-            chant.objects
+            _chants_queryset()
             .filter(chanter__evenement=e)
-            .prefetch_related(
-                "pistes_audio",
-                "categories_associees__categorie",
-                ACCEPTED_MODIFICATIONS_PREFETCH,
-            )
             .order_by("nom_chant")
             .distinct()
         )
@@ -2627,7 +3343,7 @@ def chanter_api(request):
 
     # --- GET : /api/chanter/ ou filtré ---
     if request.method == "GET":
-        qs = chanter.objects.select_related("chant", "evenement")
+        qs = chanter.objects.order_by("id").values("id", "chant_id", "evenement_id")
 
         evenement_id = request.GET.get("evenement_id")
         chant_id = request.GET.get("chant_id")
@@ -2637,15 +3353,7 @@ def chanter_api(request):
         if chant_id:
             qs = qs.filter(chant_id=chant_id)
 
-        data = [
-            {
-                "id": c.id,
-                "chant_id": c.chant_id,
-                "evenement_id": c.evenement_id,
-            }
-            for c in qs
-        ]
-        return JsonResponse(data, safe=False)
+        return ReponseJsonFlux(qs, dict)
 
     # --- POST : /api/chanter/ ---
     # body JSON : { "chant_id": 1, "evenement_id": 2 }
@@ -2718,17 +3426,15 @@ def contenir_api(request):
 @require_http_methods(["GET", "POST"])
 def fournir_api(request):
     if request.method == "GET":
-        qs = fournir.objects.select_related("fournisseur", "chansonnier_perso")
-        data = [
-            {
-                "id": f.id,
-                "fournisseur_id": f.fournisseur_id,
-                "chansonnier_perso_id": f.chansonnier_perso_id,
-                "date_fourniture": f.date_fourniture.isoformat(),
-            }
-            for f in qs
-        ]
-        return JsonResponse(data, safe=False)
+        qs = fournir.objects.order_by("id").only(
+            "id", "fournisseur_id", "chansonnier_perso_id", "date_fourniture"
+        )
+        return ReponseJsonFlux(qs, lambda f: {
+            "id": f.id,
+            "fournisseur_id": f.fournisseur_id,
+            "chansonnier_perso_id": f.chansonnier_perso_id,
+            "date_fourniture": f.date_fourniture.isoformat(),
+        })
 
     try:
         body = json.loads(request.body.decode("utf-8"))
@@ -3013,3 +3719,88 @@ def admin_support_api(request, ticket_id=None):
         return JsonResponse({"success": True})
 
     return JsonResponse({"error": "Méthode non autorisée"}, status=405)
+
+
+# -----------------------------------------------------------
+#              ENVOIS PAR BLOCS (gros médias)
+# -----------------------------------------------------------
+def _etat_televersement(envoi):
+    return {
+        "id": str(envoi.id),
+        "cible": envoi.cible,
+        "offset": envoi.recu,
+        "taille": envoi.taille,
+        "taille_bloc_max": settings.TELEVERSEMENT_BLOC_MAX,
+    }
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def televersements_api(request):
+    """
+    POST : déclare un envoi par blocs (voir gui/televersements.py).
+    Corps JSON : cible, nom_fichier, taille, sha256, chant_id / demande_id.
+    """
+    user, error = _require_authenticated_user(request)
+    if error:
+        return error
+
+    try:
+        donnees = json.loads(request.body.decode("utf-8") or "{}")
+    except (UnicodeDecodeError, JSONDecodeError):
+        return JsonResponse({"error": "JSON invalide"}, status=400)
+    if not isinstance(donnees, dict):
+        return JsonResponse({"error": "JSON invalide"}, status=400)
+
+    try:
+        envoi = creer_televersement(user, donnees)
+    except ErreurTeleversement as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse(_etat_televersement(envoi), status=201)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "PATCH", "DELETE"])
+def televersement_api(request, televersement_id):
+    """
+    GET    : offset reçu (reprise après coupure)
+    PATCH  : ajoute le bloc (corps brut) à l'offset donné par l'en-tête
+             Upload-Offset ; au dernier bloc, crée l'objet cible (201)
+    DELETE : abandonne l'envoi
+    """
+    user, error = _require_authenticated_user(request)
+    if error:
+        return error
+
+    if request.method == "PATCH":
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+            longueur = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return JsonResponse({"error": "En-tête Upload-Offset invalide"}, status=400)
+
+        try:
+            # Corps lu directement sur le flux : jamais chargé en mémoire
+            envoi, objet = ajouter_bloc(televersement_id, user, request, offset, longueur)
+        except ErreurTeleversement as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+
+        data = _etat_televersement(envoi)
+        data["termine"] = objet is not None
+        if objet is not None:
+            data["objet"] = {"type": envoi.cible, "id": objet.pk}
+        response = JsonResponse(data, status=201 if objet is not None else 200)
+        response["Upload-Offset"] = str(envoi.recu)
+        return response
+
+    envoi = televersement.objects.filter(id=televersement_id, utilisateur=user).first()
+    if envoi is None:
+        return JsonResponse({"error": "Envoi introuvable"}, status=404)
+
+    if request.method == "DELETE":
+        supprimer_televersement(envoi)
+        return JsonResponse({"success": True})
+
+    response = JsonResponse(_etat_televersement(envoi))
+    response["Upload-Offset"] = str(envoi.recu)
+    return response
@@ -90,7 +90,7 @@ export default function AlzinPersoPage() {
         // 1) templates + chants + catégories
         const [resTpl, resChants, resCats] = await Promise.all([
           fetch(apiUrl("/api/templates-chansonniers/")),
-          fetch(apiUrl("/api/chants/")),
+          fetch(apiUrl("/api/chants/?all=1")),
           fetch(apiUrl("/api/categories/")),
         ]);
 
@@ -65,7 +65,7 @@ export default function ChantsListe() {
 
   // Charger chants
   useEffect(() => {
-    fetch(apiUrl(API_CHANTS))
+    fetch(apiUrl(`${API_CHANTS}?all=1`))
       .then((r) => r.json())
       .then(setChants);
 
@@ -50,7 +50,7 @@ export default function EvenementsList() {
       const [resEvents, resLinks, resChants] = await Promise.all([
         fetch(API_EVENT),
         fetch(API_CHANTER),
-        fetch(API_CHANTS),
+        fetch(`${API_CHANTS}?all=1`),
       ]);
 
       if (!resEvents.ok || !resLinks.ok || !resChants.ok) {
@@ -43,7 +43,7 @@ export default function FavorisPage() {
     const loadChants = async () => {
       setChantsLoaded(false);
       try {
-        const res = await fetch(API_CHANTS);
+        const res = await fetch(`${API_CHANTS}?all=1`);
         const data = await res.json();
         setAllChants(data);
       } finally {
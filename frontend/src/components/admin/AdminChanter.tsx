@@ -43,7 +43,7 @@ export default function AdminChanter() {
 
       const [resLinks, resChants, resEvents] = await Promise.all([
         fetch(apiUrl(API_CHANTER)),
-        fetch(apiUrl(API_CHANTS)),
+        fetch(apiUrl(`${API_CHANTS}?all=1`)),
         fetch(apiUrl(API_EVENTS)),
       ]);
 
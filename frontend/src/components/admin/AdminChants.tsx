@@ -72,7 +72,7 @@ export default function AdminChants() {
   const [order, setOrder] = useState("AZ");
 
   const loadData = () => {
-    fetch(apiUrl(API_CHANTS))
+    fetch(apiUrl(`${API_CHANTS}?all=1`))
       .then((r) => r.json())
       .then(setChants);
 
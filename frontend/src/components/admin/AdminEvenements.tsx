@@ -57,7 +57,7 @@ export default function AdminEvenements() {
 
   /** Charger tous les chants (pour le sélecteur) */
   const loadChants = async () => {
-    const res = await fetch(apiUrl(API_CHANTS));
+    const res = await fetch(apiUrl(`${API_CHANTS}?all=1`));
     const data = await res.json();
     setChants(data);
   };
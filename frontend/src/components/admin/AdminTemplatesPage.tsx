@@ -64,7 +64,7 @@ export default function AdminTemplatesPage() {
 
         const [resTpl, resChants, resCats] = await Promise.all([
           fetch(apiUrl("/api/templates-chansonniers/")),
-          fetch(apiUrl("/api/chants/")),
+          fetch(apiUrl("/api/chants/?all=1")),
           fetch(apiUrl("/api/categories/")),
         ]);
 